@@ -1,11 +1,28 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import numpy_financial as npf
 from datetime import date
-from dateutil.relativedelta import relativedelta
+import contextlib
+import hashlib
+import io
+import os
+from pathlib import Path
 import plotly.graph_objects as go
 
+from fundos import Carteira, DefinicaoFundo, ParametrosFundo
+from fundos.carteira import TIPOS as TIPOS_ATIVO, TIPO_CRI_PULVERIZADO, VALORES_PERMITIDOS, COLUNAS_INTEIRAS
+from fundos.sensibilidade import INDICADORES, grade_sensibilidade, ler_valor, tornado, variaveis_numericas
+from fundos.cenarios import ModeloTaxas, simular_cenarios
+from fundos.tir import CONVERGIU, DESCRICAO_STATUS, FORA_DA_FAIXA
+from fundos.cache import CacheLRU, CacheProjecao, hash_canonico
+from fundos.relatorios import montar_dre, resumo_investidor
+from fundos.exportacao import exportar_excel
+from fundos.perfil import Perfil, etapa
+from fundos.otimizacao import METRICAS, buscar_metas, otimizar
+from fundos.banco import BancoCenarios
+from fundos.curvas import TIPOS_CURVA, curvas_anuais, ler_curvas
+from fundos.recebiveis import carregar_recebiveis
+
 st.set_page_config(layout="wide")
 
 st.title("Análise de Viabilidade de Fundos de Investimento")
@@ -16,6 +33,50 @@ if 'simulacao_rodada' not in st.session_state:
 def rodar_simulacao():
     st.session_state.simulacao_rodada = True
 
+@st.cache_resource
+def obter_cache_projecao():
+    # Compartilhado entre sessões e reruns: projeções e cronogramas por hash das entradas
+    return CacheProjecao()
+cache_projecao = obter_cache_projecao()
+
+@st.cache_resource
+def obter_cache_monte_carlo():
+    # Separado das projeções: uma simulação grande não desaloja as projeções determinísticas do cache delas
+    return CacheLRU(max_entradas=8, max_bytes=64 * 1024**2)
+cache_monte_carlo = obter_cache_monte_carlo()
+
+CAMINHO_BANCO_CENARIOS = os.environ.get('FUNDOS_BANCO_CENARIOS', 'cenarios.db')
+@st.cache_resource
+def obter_banco_cenarios():
+    # Projeções guardadas em disco por hash das entradas: sobrevivem ao recarregamento e viram consulta se repetidas.
+    # Só é aberto (e o arquivo criado) quando o usuário liga a gravação ou já existe um banco
+    return BancoCenarios(CAMINHO_BANCO_CENARIOS)
+
+# A carteira fica em formato colunar e é editada numa grade paginada; o editor é recriado
+# (nova versão na chave) quando linhas entram ou saem, para não reaplicar as mesmas inclusões
+def substituir_carteira(carteira):
+    st.session_state.carteira = carteira
+    st.session_state.versao_editor_ativos += 1
+def aplicar_edicoes_ativos(chave, inicio, tamanho):
+    edicoes = st.session_state[chave]
+    st.session_state.carteira = st.session_state.carteira.aplicar_edicoes(inicio, tamanho, edicoes)
+    if edicoes.get('added_rows') or edicoes.get('deleted_rows'): st.session_state.versao_editor_ativos += 1
+
+# Fitas de recebíveis gravadas pelo conteúdo: outro arquivo vira outro caminho, e os cronogramas em cache acompanham
+def guardar_fita_recebiveis(arquivo):
+    conteudo = arquivo.getvalue()
+    pasta = Path(os.environ.get('FUNDOS_PASTA_RECEBIVEIS', 'recebiveis'))
+    pasta.mkdir(parents=True, exist_ok=True)
+    caminho = pasta / f"{hashlib.sha256(conteudo).hexdigest()[:16]}{Path(arquivo.name).suffix.lower()}"
+    if not caminho.exists(): caminho.write_bytes(conteudo)
+    return str(caminho)
+
+CONFIG_COLUNAS_ATIVOS = {'tipo': st.column_config.SelectboxColumn("Tipo", options=list(TIPOS_ATIVO), required=True)}
+opcoes_por_coluna = {}
+for (_, coluna), opcoes in VALORES_PERMITIDOS.items(): opcoes_por_coluna.setdefault(coluna, {}).update(dict.fromkeys(opcoes))
+for coluna, opcoes in opcoes_por_coluna.items(): CONFIG_COLUNAS_ATIVOS[coluna] = st.column_config.SelectboxColumn(coluna, options=list(opcoes))
+for coluna in COLUNAS_INTEIRAS: CONFIG_COLUNAS_ATIVOS[coluna] = st.column_config.NumberColumn(coluna, min_value=0, step=1, format="%d")
+
 # --- PAINEL DE CONFIGURAÇÕES ---
 with st.expander("Painel de Configurações da Simulação", expanded=True):
     tab_geral, tab_capital, tab_ativos, tab_despesas, tab_distribuicao = st.tabs([
@@ -34,6 +95,49 @@ with st.expander("Painel de Configurações da Simulação", expanded=True):
         col1, col2 = st.columns(2)
         with col1: projecao_cdi = st.number_input("Projeção CDI", value=10.0, step=0.5)
         with col2: projecao_ipca = st.number_input("Projeção IPCA", value=4.5, step=0.25)
+        if 'curvas' not in st.session_state: st.session_state.curvas = {}
+        curvas = {}
+        if st.toggle("Usar curvas por índice", value=False, help="Índices com curva usam uma taxa por mês; os demais ficam planos na projeção acima e o IGP-M sem curva segue o IPCA"):
+            arquivo_curvas = st.file_uploader("Importar curvas (CSV ou Excel com 'Mês' ou 'Data' e colunas CDI/IPCA/IGP-M em % a.a.)", type=['csv', 'xlsx', 'xls'])
+            tipo_arquivo = st.radio("Taxas do arquivo", list(TIPOS_CURVA), format_func=TIPOS_CURVA.get, horizontal=True)
+            if arquivo_curvas is not None and st.button("Importar Curvas"):
+                try:
+                    st.session_state.curvas.update(ler_curvas(arquivo_curvas, tipo=tipo_arquivo, data_inicio=data_inicio, nome=arquivo_curvas.name))
+                    st.session_state.versao_editor_curvas = st.session_state.get('versao_editor_curvas', 0) + 1
+                except Exception as erro:
+                    st.error(f"Não foi possível ler as curvas: {erro}")
+            versao_curvas = st.session_state.get('versao_editor_curvas', 0)
+            for coluna, (indice, plana) in zip(st.columns(3), (('CDI', projecao_cdi), ('IPCA', projecao_ipca), ('IGP-M', projecao_ipca))):
+                with coluna:
+                    guardada = st.session_state.curvas.get(indice)
+                    if not st.checkbox(f"Curva de {indice}", value=guardada is not None, key=f"usar_curva_{indice}_{versao_curvas}"): continue
+                    guardada = guardada or {'tipo': 'estrutura', 'pontos': [[12, plana], [duracao_anos * 12, plana]]}
+                    tipo = st.selectbox("Tipo", list(TIPOS_CURVA), index=list(TIPOS_CURVA).index(guardada.get('tipo', 'estrutura')),
+                                        format_func=TIPOS_CURVA.get, key=f"tipo_curva_{indice}")
+                    pontos = st.data_editor(pd.DataFrame(guardada['pontos'], columns=['Mês', 'Taxa (% a.a.)']), num_rows="dynamic",
+                                            hide_index=True, width='stretch', key=f"pontos_curva_{indice}_{versao_curvas}")
+                    curvas[indice] = {'tipo': tipo, 'pontos': pontos.dropna().to_numpy(dtype=float).tolist()}
+            st.session_state.curvas = dict(curvas)
+            try:
+                st.line_chart(curvas_anuais(ParametrosFundo(data_inicio=data_inicio, duracao_anos=duracao_anos, projecao_cdi=projecao_cdi,
+                                                            projecao_ipca=projecao_ipca, curvas=curvas)), height=220)
+            except ValueError as erro:
+                st.error(f"Curvas inválidas: {erro}")
+        st.header("Cenários Estocásticos (Monte Carlo)")
+        n_cenarios, vol_cdi, vol_ipca, correlacao_indices, semente_cenarios = 10000, 2.0, 1.5, 0.3, 42
+        modo_estocastico = st.toggle("Simular cenários de CDI/IPCA", value=False)
+        if modo_estocastico:
+            col1, col2, col3, col4, col5 = st.columns(5)
+            with col1: n_cenarios = st.number_input("Nº de Cenários", value=10000, min_value=100, max_value=100000, step=1000)
+            with col2: vol_cdi = st.number_input("Volatilidade CDI (p.p. a.a.)", value=2.0, min_value=0.0, step=0.25)
+            with col3: vol_ipca = st.number_input("Volatilidade IPCA (p.p. a.a.)", value=1.5, min_value=0.0, step=0.25)
+            with col4: correlacao_indices = st.number_input("Correlação CDI x IPCA", value=0.3, min_value=-1.0, max_value=1.0, step=0.1)
+            with col5: semente_cenarios = st.number_input("Semente", value=42, min_value=0)
+        st.header("Diagnóstico")
+        col1, col2 = st.columns(2)
+        with col1: diagnostico = st.toggle("Medir etapas da execução", value=False, help="Refaz a projeção sem cache a cada execução e mostra o tempo de cada etapa num painel abaixo dos resultados")
+        with col2: medir_memoria = st.checkbox("Incluir pico de memória (tracemalloc, deixa a execução mais lenta)", value=False, disabled=not diagnostico)
+        guardar_cenarios = st.toggle("Guardar cada projeção no banco de cenários", value=False, help=f"Banco SQLite local em '{CAMINHO_BANCO_CENARIOS}'; cenários idênticos a um já guardado são lidos do banco em vez de recalculados")
 
     with tab_capital:
         st.header("Aportes e Amortizações Adicionais")
@@ -55,50 +159,70 @@ with st.expander("Painel de Configurações da Simulação", expanded=True):
     
     with tab_ativos:
         st.header("Modelagem de Ativos do Fundo")
-        if 'lista_ativos' not in st.session_state: st.session_state.lista_ativos = []
-        tipo_ativo_novo = st.selectbox("Selecione o tipo de ativo para adicionar:", ["Imobiliário - Renda", "CRI / CCI", "Genérico"])
-        if st.button(f"Adicionar {tipo_ativo_novo}"):
-            novo_ativo = {'tipo': tipo_ativo_novo}
-            if tipo_ativo_novo == "Imobiliário - Renda":
-                novo_ativo.update({'Nome': f"Imóvel {len(st.session_state.lista_ativos) + 1}", 'Valor Compra': 5000000.0, 'Mês Compra': 1, 'Receita Aluguel': 40000.0, 'Vacancia': 5.0, 'Indice Reajuste': 'IPCA', 'Custos Mensais': 2000.0, 'Cap Rate Saida': 7.0})
-            elif tipo_ativo_novo == "CRI / CCI":
-                novo_ativo.update({'Nome': f"CRI {len(st.session_state.lista_ativos) + 1}", 'Principal': 3000000.0, 'Mês Investimento': 1, 'Benchmark': 'IPCA', 'Tipo Taxa': 'Spread', 'Taxa': 6.0, 'Prazo': 120, 'Amortizacao': 'Price', 'Carencia': 0, 'Tranche': 'Sênior', 'Perda': 0.0})
-            else: novo_ativo.update({'Nome': f"Ativo Genérico {len(st.session_state.lista_ativos) + 1}", 'Valor': 2000000.0, 'Mês Investimento': 1, 'Benchmark': 'IPCA', 'Spread': 7.0})
-            st.session_state.lista_ativos.append(novo_ativo)
+        if 'carteira' not in st.session_state: st.session_state.carteira = Carteira()
+        if 'versao_editor_ativos' not in st.session_state: st.session_state.versao_editor_ativos = 0
+        col_novo, col_fita = st.columns([1, 2])
+        with col_novo:
+            tipo_ativo_novo = st.selectbox("Selecione o tipo de ativo para adicionar:", list(TIPOS_ATIVO))
+            if st.button(f"Adicionar {tipo_ativo_novo}"):
+                n_ativos = len(st.session_state.carteira)
+                novo_ativo = {'tipo': tipo_ativo_novo}
+                if tipo_ativo_novo == "Imobiliário - Renda":
+                    novo_ativo.update({'Nome': f"Imóvel {n_ativos + 1}", 'Valor Compra': 5000000.0, 'Mês Compra': 1, 'Receita Aluguel': 40000.0, 'Vacancia': 5.0, 'Indice Reajuste': 'IPCA', 'Custos Mensais': 2000.0, 'Cap Rate Saida': 7.0})
+                elif tipo_ativo_novo == "CRI / CCI":
+                    novo_ativo.update({'Nome': f"CRI {n_ativos + 1}", 'Principal': 3000000.0, 'Mês Investimento': 1, 'Benchmark': 'IPCA', 'Tipo Taxa': 'Spread', 'Taxa': 6.0, 'Prazo': 120, 'Amortizacao': 'Price', 'Carencia': 0, 'Tranche': 'Sênior', 'Perda': 0.0})
+                elif tipo_ativo_novo == TIPO_CRI_PULVERIZADO:
+                    fita = st.session_state.get('fita_recebiveis')
+                    saldo_lastro = carregar_recebiveis(fita).resumo()['Saldo'] if fita else 0.0
+                    novo_ativo.update({'Nome': f"CRI Pulverizado {n_ativos + 1}", 'Principal': round(saldo_lastro * 0.8, 2), 'Mês Investimento': 1, 'Arquivo Recebiveis': fita, 'Benchmark': 'IPCA', 'Tipo Taxa': 'Spread', 'Taxa': 6.0, 'Tranche': 'Sênior', 'Subordinacao': 20.0, 'CPR': 8.0, 'CDR': 2.0, 'Severidade': 40.0, 'Rampa': 30})
+                else: novo_ativo.update({'Nome': f"Ativo Genérico {n_ativos + 1}", 'Valor': 2000000.0, 'Mês Investimento': 1, 'Benchmark': 'IPCA', 'Spread': 7.0})
+                substituir_carteira(st.session_state.carteira.concatenar([novo_ativo]))
+            if len(st.session_state.carteira) and st.button("Limpar Carteira"): substituir_carteira(Carteira())
+        with col_fita:
+            arquivo_fita = st.file_uploader("Importar fita de ativos (CSV ou Excel, uma linha por ativo)", type=['csv', 'xlsx', 'xls'])
+            modo_fita = st.radio("Ao importar", ["Acrescentar à carteira", "Substituir a carteira"], horizontal=True)
+            if arquivo_fita is not None and st.button("Importar Fita"):
+                try:
+                    fita = Carteira.de_arquivo(arquivo_fita, arquivo_fita.name)
+                except Exception as erro:
+                    st.error(f"Não foi possível ler a fita: {erro}")
+                else:
+                    erros_fita = fita.validar()
+                    if len(erros_fita):
+                        st.error(f"A fita tem {len(erros_fita)} erro(s) de validação; nenhum ativo foi importado.")
+                        st.dataframe(erros_fita.head(500), hide_index=True, width='stretch')
+                    else:
+                        substituir_carteira(fita if modo_fita == "Substituir a carteira" else st.session_state.carteira.concatenar(fita))
+                        st.success(f"{len(fita)} ativos importados.")
+            arquivo_recebiveis = st.file_uploader("Fita de recebíveis do CRI Pulverizado (um contrato por linha: Saldo, Taxa, Prazo, Amortizacao, Indexador, Idade)", type=['csv', 'xlsx', 'xls'])
+            if arquivo_recebiveis is not None:
+                caminho_fita = guardar_fita_recebiveis(arquivo_recebiveis)
+                try:
+                    resumo_fita = carregar_recebiveis(caminho_fita).resumo()
+                except Exception as erro:
+                    st.error(f"Não foi possível usar a fita de recebíveis: {erro}")
+                else:
+                    st.session_state.fita_recebiveis = caminho_fita
+                    st.caption(f"{resumo_fita['Contratos']} contratos · saldo R$ {resumo_fita['Saldo']:,.2f} · taxa média {resumo_fita['Taxa Média (% a.a.)']:.2f}% a.a. · "
+                               f"prazo médio {resumo_fita['Prazo Médio (meses)']:.0f} meses; novos CRIs pulverizados usam esta fita ('{caminho_fita}')")
         st.markdown("---")
-        cols = st.columns(len(st.session_state.lista_ativos)) if st.session_state.lista_ativos else []
-        for i, ativo in enumerate(st.session_state.lista_ativos):
-            with cols[i]:
-                st.markdown(f"**{ativo.get('Nome')}**"); ativo['Nome'] = st.text_input("Nome", value=ativo.get('Nome', ''), key=f"nome_{i}", label_visibility="collapsed")
-                tipo_ativo_atual = ativo.get('tipo')
-                if tipo_ativo_atual == "Imobiliário - Renda":
-                    st.write("Parâmetros do Imóvel:")
-                    ativo['Valor Compra'] = st.number_input("Valor de Compra (R$)", value=ativo.get('Valor Compra', 0.0), key=f"val_compra_{i}")
-                    ativo['Mês Compra'] = st.number_input("Mês da Compra", value=ativo.get('Mês Compra', 1), key=f"mes_compra_{i}")
-                    ativo['Receita Aluguel'] = st.number_input("Aluguel Mensal (R$)", value=ativo.get('Receita Aluguel', 0.0), key=f"aluguel_{i}")
-                    ativo['Vacancia'] = st.number_input("Vacância (%)", value=ativo.get('Vacancia', 0.0), key=f"vacancia_{i}")
-                    ativo['Indice Reajuste'] = st.selectbox("Índice de Reajuste Anual", options=['IPCA', 'IGP-M'], key=f"indice_{i}")
-                    st.write("Custos e Saída:")
-                    ativo['Custos Mensais'] = st.number_input("Custos Fixos Mensais (R$)", value=ativo.get('Custos Mensais', 0.0), key=f"custos_fixos_{i}")
-                    ativo['Cap Rate Saida'] = st.number_input("Cap Rate de Saída (%)", value=ativo.get('Cap Rate Saida', 0.0), key=f"cap_rate_{i}")
-                elif tipo_ativo_atual == "CRI / CCI":
-                    st.write("Parâmetros do Título:")
-                    ativo['Principal'] = st.number_input("Principal (R$)", value=ativo.get('Principal', 0.0), key=f"principal_{i}")
-                    ativo['Mês Investimento'] = st.number_input("Mês do Invest.", value=ativo.get('Mês Investimento', 1), key=f"mes_invest_cri_{i}")
-                    ativo['Prazo'] = st.number_input("Prazo (meses)", value=ativo.get('Prazo', 1), key=f"prazo_{i}")
-                    ativo['Benchmark'] = st.selectbox("Benchmark", options=['IPCA', 'CDI', 'Pré-fixado'], key=f"bench_cri_{i}")
-                    ativo['Tipo Taxa'] = st.selectbox("Tipo de Taxa", options=['Spread', '% do Benchmark'], key=f"tipo_taxa_cri_{i}")
-                    ativo['Taxa'] = st.number_input("Taxa", value=ativo.get('Taxa', 0.0), key=f"taxa_cri_{i}")
-                    ativo['Amortizacao'] = st.selectbox("Amortização", options=['SAC', 'Price', 'Bullet'], key=f"amort_cri_{i}")
-                    ativo['Carencia'] = st.number_input("Carência de Amort. (meses)", value=ativo.get('Carencia', 0), key=f"carencia_cri_{i}")
-                    ativo['Tranche'] = st.selectbox("Série (Tranche)", options=['Sênior', 'Subordinada'], key=f"tranche_cri_{i}")
-                    ativo['Perda'] = st.number_input("Perda Esperada (% a.a.)", value=ativo.get('Perda', 0.0), key=f"perda_cri_{i}")
-                else: 
-                    st.write("Parâmetros do Ativo Genérico:")
-                    ativo['Valor'] = st.number_input(f"Valor (R$)", value=float(ativo.get('Valor', 0.0)), step=100000.0, key=f"valor_{i}")
-                    ativo['Mês Investimento'] = st.number_input(f"Mês Invest.", value=ativo.get('Mês Investimento', 1), min_value=1, max_value=duracao_anos*12, key=f"mes_{i}")
-                    ativo['Benchmark'] = st.selectbox(f"Benchmark", options=['IPCA', 'CDI'], index=0 if ativo.get('Benchmark', 'IPCA') == 'IPCA' else 1, key=f"bench_{i}")
-                    ativo['Spread'] = st.number_input(f"Spread (% a.a.)", value=ativo.get('Spread', 0.0), step=0.5, key=f"spread_{i}")
+
+        carteira = st.session_state.carteira
+        contagem = carteira.dados['tipo'].value_counts()
+        st.caption(f"{len(carteira)} ativos na carteira" + "".join(f" · {tipo}: {n}" for tipo, n in contagem.items()))
+        col_pagina, col_tamanho = st.columns([3, 1])
+        with col_tamanho: tamanho_pagina = st.selectbox("Ativos por página", [25, 50, 100, 250], index=1)
+        n_paginas = max(1, -(-len(carteira) // tamanho_pagina))
+        with col_pagina: pagina = st.number_input(f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, value=1)
+        inicio_pagina = (pagina - 1) * tamanho_pagina
+        chave_editor = f"editor_ativos_{st.session_state.versao_editor_ativos}_{inicio_pagina}_{tamanho_pagina}"
+        st.data_editor(carteira.pagina(inicio_pagina, tamanho_pagina), key=chave_editor, num_rows="dynamic", hide_index=True,
+                       width='stretch', column_config=CONFIG_COLUNAS_ATIVOS,
+                       on_change=aplicar_edicoes_ativos, args=(chave_editor, inicio_pagina, tamanho_pagina))
+        erros_carteira = st.session_state.carteira.validar()
+        if len(erros_carteira):
+            st.warning(f"{len(erros_carteira)} problema(s) na carteira; corrija-os antes de gerar a projeção.")
+            st.dataframe(erros_carteira.head(500), hide_index=True, width='stretch')
     
     with tab_despesas:
         st.header("Despesas Recorrentes do Fundo")
@@ -115,11 +239,13 @@ with st.expander("Painel de Configurações da Simulação", expanded=True):
     with tab_distribuicao:
         col1, col2 = st.columns(2)
         with col1:
+            dist_percentual, dist_frequencia = 95.0, 'Semestral'
             st.header("Distribuição de Dividendos"); calc_dividendos = st.toggle("Calcular Distribuição", value=True)
             if calc_dividendos:
                 dist_percentual = st.number_input("Percentual do Lucro Caixa a Distribuir (%)", value=95.0, min_value=0.0, max_value=100.0)
                 dist_frequencia = st.selectbox("Frequência da Distribuição", options=['Mensal', 'Semestral', 'Anual'], index=1)
         with col2:
+            perf_benchmark, perf_spread, perf_percentual, perf_carencia, perf_periodo, perf_hwm = 'CDI', 0.0, 20.0, 12, 'Anual', True
             st.header("Taxa de Performance"); calc_performance = st.toggle("Calcular Taxa de Performance", value=True)
             if calc_performance:
                 perf_benchmark = st.selectbox("Benchmark da Performance", options=['CDI', 'IPCA'], index=0)
@@ -130,267 +256,354 @@ with st.expander("Painel de Configurações da Simulação", expanded=True):
                 perf_hwm = st.checkbox("Com Linha d'Água (High-Water Mark)", value=True)
 
     st.markdown("---")
-    st.button("Gerar Projeção", on_click=rodar_simulacao, type="primary", use_container_width=True)
+    st.button("Gerar Projeção", on_click=rodar_simulacao, type="primary", width='stretch')
 
 # --- Abas de RESULTADO ---
-tab_fluxo, tab_dashboard, tab_dre = st.tabs(["Fluxo de Caixa Detalhado", "Dashboard & Indicadores", "DRE"])
+# Cada aba é um fragmento: interagir com ela reexecuta só a aba, sobre a projeção guardada na sessão
+LIMITE_PONTOS_GRAFICO = 240
+def reamostrar_para_grafico(dados, agregacao):
+    # Horizontes longos viram trimestres (ou anos) nos gráficos: fluxos somam, saldos ficam com o fim do período
+    if len(dados) <= LIMITE_PONTOS_GRAFICO: return dados
+    return dados.resample('QE' if len(dados) <= 3 * LIMITE_PONTOS_GRAFICO else 'YE').agg(agregacao)
 
-if not st.session_state.simulacao_rodada:
-    with tab_fluxo:
-        st.info("⬆️ Configure os parâmetros no painel acima e clique em 'Gerar Projeção' para iniciar a análise.")
-else:
-    # --- 2. MOTOR DE CÁLCULO (ATUALIZADO PARA DETALHAMENTO) ---
-    taxa_cdi_mensal = (1 + projecao_cdi / 100)**(1/12) - 1
-    taxa_ipca_mensal = (1 + projecao_ipca / 100)**(1/12) - 1
-    taxa_igpm_mensal = taxa_ipca_mensal
-    meses_total = duracao_anos * 12
-    datas_projecao = pd.to_datetime([data_inicio + relativedelta(months=i) for i in range(meses_total + 1)])
-    
-    valor_individual_ativos = [0.0] * len(st.session_state.lista_ativos)
-    aluguel_atual_imoveis = [0.0] * len(st.session_state.lista_ativos)
-    saldo_devedor_cris = [0.0] * len(st.session_state.lista_ativos)
-    pmt_cris = [0.0] * len(st.session_state.lista_ativos)
-
-    high_water_mark = aporte_inicial
-    pl_inicio_periodo_perf = aporte_inicial
-    lucro_caixa_acumulado = 0.0
-    lista_fluxos = []
-    
-    fluxo_mes_0 = {'Mês': 0, 'PL Início': 0, '(+) Aportes': aporte_inicial, '(-) Amortizações': 0, '(-) Dividendos': 0, 'Caixa_Volume': aporte_inicial, 'Caixa_Rend_R$': 0, 'Total Despesas': 0, 'PL Final': aporte_inicial, '(-) Taxa de Performance': 0.0, '(-) Perdas em Ativos': 0.0}
-    for i, ativo in enumerate(st.session_state.lista_ativos):
-        fluxo_mes_0[f'Ativo_{i+1}_Volume'] = 0.0
-        fluxo_mes_0[f'Ativo_{i+1}_Rend_R$'] = 0.0
-    for despesa in st.session_state.lista_despesas: fluxo_mes_0[f"(-) {despesa['Nome']}"] = 0
-    lista_fluxos.append(fluxo_mes_0)
-    
-    for mes in range(1, meses_total + 1):
-        fluxo_anterior = lista_fluxos[-1]
-        aporte_mes = sum(a['Valor'] for a in st.session_state.lista_aportes if a['Mês'] == mes)
-        amortizacao_mes = sum(a['Valor'] for a in st.session_state.lista_amortizacoes if a['Mês'] == mes)
-        pl_inicio_mes = fluxo_anterior['PL Final']; caixa_inicio_mes = fluxo_anterior['Caixa_Volume']
-        caixa_pos_aportes = caixa_inicio_mes + aporte_mes; pl_pos_aportes = pl_inicio_mes + aporte_mes
-        novos_investimentos_mes = 0; perdas_mes = 0
-
-        fluxo_atual_ativos = {}
-        rend_total_ativos_mes = 0
-
-        for i, ativo in enumerate(st.session_state.lista_ativos):
-            rend_ativo_i = 0
-            tipo_ativo = ativo.get('tipo')
-            
-            if tipo_ativo == "CRI / CCI":
-                if mes >= ativo['Mês Investimento'] and saldo_devedor_cris[i] > 0:
-                    perda_mensal = saldo_devedor_cris[i] * ((1 + ativo.get('Perda', 0.0) / 100.0)**(1/12) - 1)
-                    perdas_mes += perda_mensal
-                    
-                    if ativo['Benchmark'] == 'Pré-fixado': taxa_rem_anual = ativo['Taxa'] / 100.0
-                    else: taxa_bench_anual = projecao_ipca/100 if ativo['Benchmark'] == 'IPCA' else projecao_cdi/100
-                    if ativo['Tipo Taxa'] == 'Spread': taxa_rem_anual = (1+taxa_bench_anual)*(1+ativo['Taxa']/100)-1
-                    else: taxa_rem_anual = taxa_bench_anual * (ativo['Taxa']/100)
-                    taxa_mensal = (1 + taxa_rem_anual)**(1/12) - 1
-                    
-                    juros_mes = saldo_devedor_cris[i] * taxa_mensal
-                    amort_mes = 0
-                    if mes > ativo['Mês Investimento'] + ativo['Carencia']:
-                        if ativo['Amortizacao'] == 'SAC': amort_mes = ativo['Principal']/(ativo['Prazo']-ativo['Carencia'])
-                        elif ativo['Amortizacao'] == 'Price': amort_mes = pmt_cris[i] - juros_mes
-                        elif ativo['Amortizacao'] == 'Bullet' and (mes - ativo['Mês Investimento']) == ativo['Prazo'] -1: amort_mes = saldo_devedor_cris[i]
-                    
-                    amort_mes = min(amort_mes, saldo_devedor_cris[i])
-                    perda_realizada = min(perda_mensal, saldo_devedor_cris[i] - amort_mes)
-                    if ativo['Tranche'] == 'Subordinada':
-                        saldo_devedor_cris[i] -= perda_realizada
-                    
-                    saldo_devedor_cris[i] -= amort_mes
-                    rend_ativo_i = juros_mes + amort_mes
-                    valor_individual_ativos[i] = saldo_devedor_cris[i]
-
-            elif tipo_ativo == "Imobiliário - Renda":
-                if mes >= ativo['Mês Compra']:
-                    if (mes - ativo['Mês Compra']) % 12 == 0 and mes > ativo['Mês Compra']:
-                        indice_reajuste = taxa_ipca_mensal if ativo['Indice Reajuste'] == 'IPCA' else taxa_igpm_mensal
-                        aluguel_atual_imoveis[i] *= (1 + indice_reajuste * 12)
-                    receita_bruta_imovel = aluguel_atual_imoveis[i]
-                    receita_liquida_imovel = receita_bruta_imovel * (1 - ativo['Vacancia'] / 100.0)
-                    custos_imovel = ativo['Custos Mensais'] + (receita_bruta_imovel * (ativo.get('Outros Custos % Receita', 0) / 100.0))
-                    rend_ativo_i = receita_liquida_imovel - custos_imovel
-                    valor_individual_ativos[i] += rend_ativo_i
-                if mes == meses_total:
-                    noi_anual = (aluguel_atual_imoveis[i] * (1 - ativo['Vacancia'] / 100.0) - ativo['Custos Mensais']) * 12
-                    valor_venda = noi_anual / (ativo['Cap Rate Saida'] / 100.0) if ativo['Cap Rate Saida'] > 0 else 0
-                    rend_ativo_i += valor_venda
-                    valor_individual_ativos[i] = 0
-            else:
-                if valor_individual_ativos[i] > 0:
-                    spread_mensal = (1 + ativo.get('Spread', 0) / 100)**(1/12) - 1
-                    taxa_ativo = (1 + (taxa_cdi_mensal if ativo.get('Benchmark') == 'CDI' else taxa_ipca_mensal)) * (1 + spread_mensal) - 1
-                    rend_ativo_i = valor_individual_ativos[i] * taxa_ativo
-                    valor_individual_ativos[i] += rend_ativo_i
-
-            if tipo_ativo == "Imobiliário - Renda": mes_inv, val_inv = ativo.get('Mês Compra'), ativo.get('Valor Compra')
-            elif tipo_ativo == "CRI / CCI": mes_inv, val_inv = ativo.get('Mês Investimento'), ativo.get('Principal')
-            else: mes_inv, val_inv = ativo.get('Mês Investimento'), ativo.get('Valor')
-            if mes == mes_inv:
-                novos_investimentos_mes += val_inv
-                if tipo_ativo == "CRI / CCI":
-                    saldo_devedor_cris[i] = val_inv; valor_individual_ativos[i] = val_inv
-                    if ativo['Amortizacao'] == 'Price':
-                        if ativo['Benchmark'] == 'Pré-fixado': taxa_anual = ativo['Taxa'] / 100.0
-                        else: taxa_bench = projecao_ipca/100 if ativo['Benchmark'] == 'IPCA' else projecao_cdi/100
-                        if ativo['Tipo Taxa'] == 'Spread': taxa_anual = (1+taxa_bench)*(1+ativo['Taxa']/100)-1
-                        else: taxa_anual = taxa_bench * (ativo['Taxa']/100)
-                        taxa_m = (1+taxa_anual)**(1/12)-1; nper = ativo['Prazo'] - ativo['Carencia']
-                        if taxa_m > 0 and nper > 0: pmt_cris[i] = npf.pmt(taxa_m, nper, -val_inv)
-                elif tipo_ativo == "Imobiliário - Renda":
-                    valor_individual_ativos[i] = val_inv; aluguel_atual_imoveis[i] = ativo['Receita Aluguel']
-                else: valor_individual_ativos[i] += val_inv
-            
-            fluxo_atual_ativos[f'Ativo_{i+1}_Volume'] = valor_individual_ativos[i]
-            fluxo_atual_ativos[f'Ativo_{i+1}_Rend_R$'] = rend_ativo_i
-            rend_total_ativos_mes += rend_ativo_i
-
-        caixa_pos_investimento = caixa_pos_aportes - novos_investimentos_mes
-        rend_caixa_mes = max(0, caixa_pos_investimento) * taxa_cdi_mensal
-        
-        total_despesas_regulares = 0; despesas_mes_dict = {}
-        for despesa in st.session_state.lista_despesas:
-            valor_despesa = pl_pos_aportes * (despesa['Valor'] / 100 / 12) if despesa['Tipo'] == '% do PL' else despesa['Valor']
-            despesas_mes_dict[f"(-) {despesa['Nome']}"] = valor_despesa
-            total_despesas_regulares += valor_despesa
-        pl_pre_performance = pl_pos_aportes + rend_total_ativos_mes + rend_caixa_mes - total_despesas_regulares - perdas_mes
-        taxa_performance_mes = 0
-        total_despesas_mes = total_despesas_regulares + taxa_performance_mes
-        rend_pos_desp = rend_total_ativos_mes + rend_caixa_mes - total_despesas_mes
-        lucro_caixa_acumulado += (rend_pos_desp - perdas_mes)
-        dividendo_mes = 0
-        if calc_dividendos:
-            if dist_frequencia == 'Mensal': meses_frequencia = 1
-            elif dist_frequencia == 'Semestral': meses_frequencia = 6
-            else: meses_frequencia = 12
-            if (mes % meses_frequencia == 0 or mes == meses_total):
-                dividendo_mes = max(0, lucro_caixa_acumulado * (dist_percentual / 100.0)); lucro_caixa_acumulado = 0
-        caixa_final_mes = caixa_pos_investimento + rend_caixa_mes - total_despesas_mes - amortizacao_mes - dividendo_mes
-        vol_ativos_final_mes = sum(valor_individual_ativos)
-        pl_final_mes = vol_ativos_final_mes + caixa_final_mes
-        
-        fluxo_atual = {'Mês': mes, 'PL Início': pl_inicio_mes, '(+) Aportes': aporte_mes, '(-) Amortizações': amortizacao_mes, '(-) Dividendos': dividendo_mes, 'Caixa_Volume': caixa_final_mes, 'Caixa_Rend_R$': rend_caixa_mes, 'Total Despesas': total_despesas_mes, 'PL Final': pl_final_mes, '(-) Taxa de Performance': taxa_performance_mes, '(-) Perdas em Ativos': perdas_mes}
-        fluxo_atual.update(fluxo_atual_ativos)
-        fluxo_atual.update(despesas_mes_dict)
-        lista_fluxos.append(fluxo_atual)
+def formatos_colunas(n_colunas, formato, inteiras=()):
+    # Formatação por coluna feita no navegador (posição 0 é o índice), sem um Styler sobre todas as células
+    return {j + 1: st.column_config.NumberColumn(format="%d" if j in inteiras else formato) for j in range(n_colunas)}
 
-    df = pd.DataFrame(lista_fluxos)
+@st.fragment
+def aba_fluxo():
+    resultado = st.session_state.projecao['resultado']
+    st.header("Fluxo de Caixa Detalhado")
+    # Visão em dois níveis sobre a própria tabela do resultado, sem copiar colunas
+    df_display_final = resultado.visao_exibicao()
+    n_colunas = df_display_final.shape[1]
+    with etapa('tabela do fluxo', 'interface', linhas=len(df_display_final), colunas=n_colunas):
+        st.dataframe(df_display_final, column_config=formatos_colunas(n_colunas, "R$ %,.0f", inteiras=(0, n_colunas - 1)))
+    # Os arquivos só são gerados quando o botão é clicado
+    nome = resultado.parametros.nome_fundo
+    def gerar_excel():
+        return exportar_excel(io.BytesIO(), resultado).getvalue()
+    col_excel, col_parquet = st.columns(2)
+    col_excel.download_button("Baixar Excel (fluxo, DRE e indicadores)", gerar_excel, file_name=f"{nome}.xlsx",
+                              mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", on_click="ignore")
+    col_parquet.download_button("Baixar fluxo em Parquet", lambda: resultado.para_dataframe().to_parquet(), file_name=f"{nome}_fluxo.parquet",
+                                mime="application/octet-stream", on_click="ignore")
+
+@st.fragment
+def aba_dashboard():
+    df = st.session_state.projecao['df']
+    st.header("Análise do Investidor")
     if not df.empty:
-        df.index = datas_projecao; df['Ano'] = df.index.year
-        df['Ativos_Volume'] = sum(df[f'Ativo_{i+1}_Volume'] for i, ativo in enumerate(st.session_state.lista_ativos))
-        df['Ativos_Rend_R$'] = sum(df[f'Ativo_{i+1}_Rend_R$'] for i, ativo in enumerate(st.session_state.lista_ativos))
-        df['Rend. Pré-Desp_R$'] = df['Ativos_Rend_R$'] + df['Caixa_Rend_R$']
-        df['Rend. Pós-Desp_R$'] = df['Rend. Pré-Desp_R$'] - df['Total Despesas']
-        df.fillna(0, inplace=True); df.replace([float('inf'), -float('inf')], 0, inplace=True)
-        df['Ativos_% Alocado'] = df['Ativos_Volume'] / df['PL Final'].where(df['PL Final'] != 0)
-        df['Caixa_% Alocado'] = df['Caixa_Volume'] / df['PL Final'].where(df['PL Final'] != 0)
-        df.fillna(0, inplace=True); df.replace([float('inf'), -float('inf')], 0, inplace=True)
+        df_investidor = pd.DataFrame(index=df.index)
+        df_investidor['Investimento'] = df['(+) Aportes'] * -1
+        df_investidor['Distribuições'] = df['(-) Amortizações'] + df['(-) Dividendos']
+        
+        # Os mesmos indicadores do Excel, da sensibilidade e do Monte Carlo
+        with etapa('TIR', 'tir', linhas=1, colunas=len(df)):
+            resumo = resumo_investidor(st.session_state.projecao['resultado'])
+        tir_anual, payback = resumo['TIR'], resumo['Payback (meses)']
+        convergiu = resumo['TIR Status'] == DESCRICAO_STATUS[CONVERGIU]
+        sem_tir = "Fora da faixa" if resumo['TIR Status'] == DESCRICAO_STATUS[FORA_DA_FAIXA] else "N/A"
 
-    with tab_fluxo:
-        st.header("Fluxo de Caixa Detalhado")
-        col_map = {'Ano': ('Período', 'Ano'), 'Mês': ('Período', 'Mês'), 'PL Início': ('Geral', 'PL Início'), '(+) Aportes': ('Geral', '(+) Aportes'), '(-) Amortizações': ('Geral', '(-) Amortizações'), '(-) Dividendos': ('Geral', '(-) Dividendos'), 'PL Final': ('Geral', 'PL Final'), 'Caixa_Volume': ('Caixa', 'Volume'), 'Caixa_Rend_R$': ('Caixa', 'Rend R$')}
-        for i, ativo in enumerate(st.session_state.lista_ativos):
-            nome_amigavel = ativo.get('Nome', f'Ativo {i+1}').replace(" ", "_")
-            col_map[f'Ativo_{i+1}_Volume'] = (f'Ativo: {nome_amigavel}', 'Volume')
-            col_map[f'Ativo_{i+1}_Rend_R$'] = (f'Ativo: {nome_amigavel}', 'Rend R$')
-        col_map_resto = {'Total Despesas': ('Despesas', 'Total'), '(-) Taxa de Performance': ('Despesas', 'Performance'), '(-) Perdas em Ativos': ('Resultado', '(-) Perdas')}
-        for desp in st.session_state.lista_despesas: col_map[f"(-) {desp['Nome']}"] = ('Despesas', f"(-) {desp['Nome']}")
-        col_map.update(col_map_resto)
+        st.subheader("Indicadores de Performance")
+        cols = st.columns(5)
+        cols[0].metric("TIR Anualizada", f"{tir_anual:.2%}" if not pd.isna(tir_anual) else sem_tir, help=None if convergiu else resumo['TIR Status'])
+        cols[1].metric("MOIC (Total)", f"{resumo['MOIC']:.2f}x", help="Múltiplo Total = (Distribuído + PL Final) / Investido")
+        cols[2].metric("DPI (Distribuído)", f"{resumo['DPI']:.2f}x", help="Múltiplo do Retorno em Caixa = Distribuído / Investido")
+        cols[3].metric("RVPI (Residual)", f"{resumo['RVPI']:.2f}x", help="Múltiplo do Valor Residual = PL Final / Investido")
+        cols[4].metric("Payback (meses)", f"{payback:.0f}" if not pd.isna(payback) else "Não atinge", help="Meses desde o início até o fluxo acumulado do investidor ficar positivo")
+        if resumo['TIR Ambígua']:
+            st.warning("O fluxo do investidor troca de sinal mais de uma vez e pode ter mais de uma TIR; o valor exibido é a raiz mais próxima de 1% a.m.")
         
-        df_display = df.rename(columns=col_map)
-        ordem_final = [col for col in df.columns if col in col_map]
-        df_display_final = pd.DataFrame()
-        for col in ordem_final:
-            df_display_final[col_map[col]] = df_display[col_map[col]]
-
-        df_display_final.columns = pd.MultiIndex.from_tuples(df_display_final.columns)
-        st.dataframe(df_display_final.style.format("R$ {:,.0f}", na_rep="-"))
-
-    with tab_dashboard:
-        st.header("Análise do Investidor")
-        if not df.empty:
-            df_investidor = pd.DataFrame(index=df.index)
-            df_investidor['Investimento'] = df['(+) Aportes'] * -1
-            df_investidor['Distribuições'] = df['(-) Amortizações'] + df['(-) Dividendos']
-            
-            fluxo_investidor_final = df_investidor['Investimento'] + df_investidor['Distribuições']
-            fluxo_investidor_final.iloc[-1] += df['PL Final'].iloc[-1]
-            try: tir_anual = (1 + npf.irr(fluxo_investidor_final))**12 - 1
-            except: tir_anual = float('nan')
-            
-            total_investido = df['(+) Aportes'].sum()
-            total_retornado_caixa = df_investidor['Distribuições'].sum()
-            total_retornado_final = total_retornado_caixa + df['PL Final'].iloc[-1]
-            moic = total_retornado_final / total_investido if total_investido != 0 else 0
-            dpi = total_retornado_caixa / total_investido if total_investido != 0 else 0
-            rvpi = df['PL Final'].iloc[-1] / total_investido if total_investido != 0 else 0
-            fluxo_acumulado = (df_investidor['Investimento'] + df_investidor['Distribuições']).cumsum()
-            payback_mes = (fluxo_acumulado >= 0).idxmax().month if (fluxo_acumulado >= 0).any() else "Não atinge"
-
-            st.subheader("Indicadores de Performance")
-            cols = st.columns(5)
-            cols[0].metric("TIR Anualizada", f"{tir_anual:.2%}" if not pd.isna(tir_anual) else "N/A")
-            cols[1].metric("MOIC (Total)", f"{moic:.2f}x", help="Múltiplo Total = (Distribuído + PL Final) / Investido")
-            cols[2].metric("DPI (Distribuído)", f"{dpi:.2f}x", help="Múltiplo do Retorno em Caixa = Distribuído / Investido")
-            cols[3].metric("RVPI (Residual)", f"{rvpi:.2f}x", help="Múltiplo do Valor Residual = PL Final / Investido")
-            cols[4].metric("Payback (meses)", f"{payback_mes}")
-            
-            st.markdown("---")
+        st.markdown("---")
+        if len(df) > LIMITE_PONTOS_GRAFICO: st.caption("Horizonte longo: os gráficos agrupam os meses em trimestres ou anos.")
+        with etapa('gráficos do dashboard', 'interface', linhas=len(df)):
             st.subheader("Fluxo de Caixa do Investidor")
-            st.bar_chart(df_investidor)
+            st.bar_chart(reamostrar_para_grafico(df_investidor, 'sum'))
             st.subheader("Distribuição de Dividendos ao Longo do Tempo")
-            st.bar_chart(df['(-) Dividendos'])
+            st.bar_chart(reamostrar_para_grafico(df['(-) Dividendos'], 'sum'))
             st.markdown("---")
             st.subheader("Análise do Fundo")
             col1, col2 = st.columns(2)
             with col1:
-                st.write("**Evolução do Patrimônio Líquido**"); st.line_chart(df['PL Final'])
+                st.write("**Evolução do Patrimônio Líquido**"); st.line_chart(reamostrar_para_grafico(df['PL Final'], 'last'))
             with col2:
-                st.write("**Composição do Patrimônio**"); st.area_chart(df[['Ativos_Volume', 'Caixa_Volume']].rename(columns={'Ativos_Volume': 'Ativos', 'Caixa_Volume': 'Caixa'}))
-
-    with tab_dre:
-        # (código da aba de DRE - sem alterações)
-        st.header("Demonstração de Resultados (DRE)")
-        if not df.empty and df['Ano'].nunique() > 0:
-            df_anual = df.groupby('Ano').sum()
-            dre_data = []
-            index_dre = []
-            for ano in df_anual.index:
-                if ano == df['Ano'].min(): continue
-                receita_ativos = df_anual.loc[ano, 'Ativos_Rend_R$']
-                receita_caixa = df_anual.loc[ano, 'Caixa_Rend_R$']
-                receita_bruta = receita_ativos + receita_caixa
-                despesas_anual = {}
-            for desp in st.session_state.lista_despesas:
-                despesas_anual[f"(-) {desp['Nome']}"] = df_anual.loc[ano, f"(-) {desp['Nome']}"]
-                taxa_perf = df_anual.loc[ano, '(-) Taxa de Performance']
-                total_despesas = df_anual.loc[ano, 'Total Despesas']
-                resultado_operacional = receita_bruta - total_despesas
-                dividendos = df_anual.loc[ano, '(-) Dividendos']
-                resultado_liquido = resultado_operacional - dividendos
-                if not dre_data:
-                    index_dre.extend(["(+) Receita de Ativos", "(+) Receita de Caixa", "(=) Receita Bruta", "--- Despesas ---"])
-            for nome_despesa in despesas_anual.keys(): index_dre.append(nome_despesa)
-            index_dre.extend(["(-) Taxa de Performance", "(=) Total Despesas", "(=) Resultado Operacional (Lucro Caixa)", "(-) Dividendos Distribuídos", "(=) Resultado Líquido Retido"])
-            coluna_ano = [receita_ativos, receita_caixa, receita_bruta, None]
-            coluna_ano.extend(list(despesas_anual.values()))
-            coluna_ano.extend([taxa_perf, total_despesas, resultado_operacional, dividendos, resultado_liquido])
-            dre_data.append(coluna_ano)
-            if dre_data:
-                df_dre_vertical = pd.DataFrame(dre_data, columns=index_dre)
-                df_dre_vertical.index = [ano for ano in df_anual.index if ano != df['Ano'].min()]
-                st.subheader("DRE Anual Detalhada")
-                st.dataframe(df_dre_vertical.T.style.format("R$ {:,.2f}", na_rep="-"))
-                st.subheader("Análise Visual do Resultado (Gráfico de Cascata)")
-                ano_selecionado = st.selectbox("Selecione o Ano para Análise", options=df_dre_vertical.index)
-            if ano_selecionado:
-                    dados_cascata = df_dre_vertical.loc[ano_selecionado]
-                    text_values = [f"R$ {v:,.0f}" if v is not None else "" for v in dados_cascata]
-                    fig = go.Figure(go.Waterfall(name = str(ano_selecionado), orientation = "v", measure = ["relative", "relative", "total", "relative"] + ["relative"] * (len(st.session_state.lista_despesas) + 1) + ["total", "relative", "relative", "total"], x = index_dre, y = dados_cascata, text = text_values, connector = {"line":{"color":"rgb(63, 63, 63)"}},))
-                    fig.update_layout(title=f"Composição do Resultado - {ano_selecionado}", showlegend=True)
-                    st.plotly_chart(fig, use_container_width=True)
-    
+                st.write("**Composição do Patrimônio**"); st.area_chart(reamostrar_para_grafico(df[['Ativos_Volume', 'Caixa_Volume']].rename(columns={'Ativos_Volume': 'Ativos', 'Caixa_Volume': 'Caixa'}), 'last'))
+
+        modo_estocastico, modelo_taxas, n_cenarios, semente_cenarios = st.session_state.config_monte_carlo
+        if modo_estocastico:
+            st.markdown("---")
+            st.subheader("Distribuição dos Indicadores (Monte Carlo)")
+            entradas_mc = st.session_state.projecao['definicao'].entradas()
+            chave_mc = hash_canonico('monte_carlo', *entradas_mc, modelo_taxas, n_cenarios, semente_cenarios)
+            with st.spinner(f"Simulando {n_cenarios:,} cenários..."), etapa('Monte Carlo', 'motor', linhas=n_cenarios):
+                monte_carlo = cache_monte_carlo.obter_ou_calcular(chave_mc, lambda: simular_cenarios(
+                    *entradas_mc, modelo=modelo_taxas, n_cenarios=int(n_cenarios), semente=int(semente_cenarios)))
+            cols = st.columns(4)
+            cols[0].metric("TIR Mediana", f"{np.nanmedian(monte_carlo.indicadores['TIR']):.2%}")
+            cols[1].metric("VaR 95% (TIR)", f"{monte_carlo.var('TIR', 0.95):.2%}", help="TIR no percentil 5: só 5% dos cenários ficam abaixo")
+            cols[2].metric("VaR 95% (MOIC)", f"{monte_carlo.var('MOIC', 0.95):.2f}x")
+            cols[3].metric("Prob. TIR < 0", f"{monte_carlo.prob_abaixo('TIR', 0.0):.1%}")
+            formatos = {'TIR': "{:.2%}", 'MOIC': "{:.2f}x", 'DPI': "{:.2f}x", 'RVPI': "{:.2f}x", 'Payback (meses)': "{:.0f}"}
+            resumo_mc = monte_carlo.resumo()
+            st.dataframe(resumo_mc.style.format(formatos, na_rep="-").format("{:.1%}", subset=pd.IndexSlice['% Cenários Válidos', :]))
+            indicador_hist = st.selectbox("Indicador do Histograma", options=list(formatos.keys()))
+            fig_hist = go.Figure(go.Histogram(x=monte_carlo.indicadores[indicador_hist], nbinsx=60))
+            fig_hist.add_vline(x=monte_carlo.var(indicador_hist, 0.95), line_dash="dash", annotation_text="P5")
+            fig_hist.update_layout(title=f"Distribuição de {indicador_hist} em {monte_carlo.n_cenarios:,} cenários", showlegend=False)
+            st.plotly_chart(fig_hist, width='stretch')
+
+@st.fragment
+def aba_dre():
+    df_dre_vertical = st.session_state.projecao['dre']
+    st.header("Demonstração de Resultados (DRE)")
+    index_dre = list(df_dre_vertical.columns)
+    if not df_dre_vertical.empty:
+        st.subheader("DRE Anual Detalhada")
+        with etapa('tabela da DRE', 'interface', linhas=df_dre_vertical.shape[1], colunas=len(df_dre_vertical)):
+            st.dataframe(df_dre_vertical.T, column_config=formatos_colunas(len(df_dre_vertical), "R$ %,.2f"))
+        st.subheader("Análise Visual do Resultado (Gráfico de Cascata)")
+        ano_selecionado = st.selectbox("Selecione o Ano para Análise", options=df_dre_vertical.index)
+        if ano_selecionado:
+            dados_cascata = df_dre_vertical.loc[ano_selecionado]
+            text_values = [f"R$ {v:,.0f}" if not pd.isna(v) else "" for v in dados_cascata]
+            with etapa('cascata (Plotly)', 'interface', colunas=len(index_dre)):
+                fig = go.Figure(go.Waterfall(name = str(ano_selecionado), orientation = "v", measure = ["relative", "relative", "total", "relative"] + ["relative"] * (len(index_dre) - 8) + ["total", "relative", "relative", "total"], x = index_dre, y = dados_cascata, text = text_values, connector = {"line":{"color":"rgb(63, 63, 63)"}},))
+                fig.update_layout(title=f"Composição do Resultado - {ano_selecionado}", showlegend=True)
+                st.plotly_chart(fig, width='stretch')
+
+@st.fragment
+def aba_sensibilidade():
+    st.header("Análise de Sensibilidade")
+    definicao = st.session_state.projecao['definicao']
+    variaveis = variaveis_numericas(definicao)
+    caminhos = list(variaveis.keys())
+    st.subheader("Grade de Sensibilidade")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        var_x = st.selectbox("Variável X", options=caminhos, index=caminhos.index('projecao_cdi'), format_func=variaveis.get, key="sens_var_x")
+        base_x = float(ler_valor(definicao, var_x))
+        x_min = st.number_input("Mínimo X", value=base_x * 0.5, key=f"sens_x_min_{var_x}")
+        x_max = st.number_input("Máximo X", value=base_x * 1.5 if base_x else 1.0, key=f"sens_x_max_{var_x}")
+        n_x = st.number_input("Pontos X", value=20, min_value=2, max_value=200, key="sens_n_x")
+    with col2:
+        opcoes_y = [None] + caminhos
+        var_y = st.selectbox("Variável Y (opcional)", options=opcoes_y, index=opcoes_y.index('projecao_ipca'),
+                             format_func=lambda c: "— Nenhuma —" if c is None else variaveis[c], key="sens_var_y")
+        if var_y is not None:
+            base_y = float(ler_valor(definicao, var_y))
+            y_min = st.number_input("Mínimo Y", value=base_y * 0.5, key=f"sens_y_min_{var_y}")
+            y_max = st.number_input("Máximo Y", value=base_y * 1.5 if base_y else 1.0, key=f"sens_y_max_{var_y}")
+            n_y = st.number_input("Pontos Y", value=20, min_value=2, max_value=200, key="sens_n_y")
+    with col3:
+        indicador_sens = st.selectbox("Indicador", options=list(INDICADORES), key="sens_indicador")
+        rodar_grade = st.button("Rodar Grade", type="primary", width='stretch')
+
+    if rodar_grade:
+        valores_x = np.linspace(x_min, x_max, int(n_x))
+        valores_y = np.linspace(y_min, y_max, int(n_y)) if var_y is not None else None
+        progresso = st.progress(0.0, text="Calculando grade...")
+        area_grafico = st.empty()
+        ultima_exibicao = [0.0, 0]
+
+        def desenhar_grade(grade, concluidos=None, total=None):
+            if concluidos is not None:
+                progresso.progress(concluidos / total, text=f"{concluidos}/{total} pontos")
+                # Redesenha a cada ~10% para não gastar o tempo da grade em renderização
+                if concluidos < total and concluidos / total - ultima_exibicao[0] < 0.1:
+                    return
+                ultima_exibicao[0] = concluidos / total
+            superficie = grade.superficies[indicador_sens]
+            if grade.variavel_y is None:
+                fig = go.Figure(go.Scatter(x=grade.valores_x, y=superficie, mode="lines+markers"))
+                fig.update_layout(xaxis_title=variaveis[var_x], yaxis_title=indicador_sens)
+            else:
+                fig = go.Figure(go.Heatmap(x=grade.valores_x, y=grade.valores_y, z=superficie, colorbar={"title": indicador_sens}))
+                fig.update_layout(xaxis_title=variaveis[var_x], yaxis_title=variaveis[var_y])
+            ultima_exibicao[1] += 1
+            area_grafico.plotly_chart(fig, width='stretch', key=f"grade_sens_{ultima_exibicao[1]}")
+
+        grade = grade_sensibilidade(definicao, var_x, valores_x, var_y, valores_y, ao_concluir=desenhar_grade)
+        progresso.empty()
+        desenhar_grade(grade)
+        st.dataframe(grade.para_dataframe(indicador_sens))
+
+    st.markdown("---")
+    st.subheader("Gráfico de Tornado")
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        padrao_tornado = [c for c in caminhos if c in ('projecao_cdi', 'projecao_ipca', 'dist_percentual')]
+        vars_tornado = st.multiselect("Variáveis", options=caminhos, default=padrao_tornado, format_func=variaveis.get, key="tornado_vars")
+    with col2: variacao_tornado = st.number_input("Variação (±%)", value=10.0, min_value=0.1, step=5.0, key="tornado_variacao")
+    with col3: indicador_tornado = st.selectbox("Indicador", options=list(INDICADORES), key="tornado_indicador")
+    if st.button("Rodar Tornado", width='stretch') and vars_tornado:
+        with st.spinner("Avaliando variáveis..."):
+            df_tornado = tornado(definicao, vars_tornado, variacao_tornado / 100, indicador=indicador_tornado)
+        base_tornado = df_tornado['Base'].iloc[0]
+        rotulos = [variaveis[c] for c in df_tornado['Variável']][::-1]
+        fig = go.Figure()
+        fig.add_trace(go.Bar(y=rotulos, x=(df_tornado[f'{indicador_tornado} Baixo'] - base_tornado)[::-1], base=base_tornado, orientation='h', name=f"-{variacao_tornado:.0f}%"))
+        fig.add_trace(go.Bar(y=rotulos, x=(df_tornado[f'{indicador_tornado} Alto'] - base_tornado)[::-1], base=base_tornado, orientation='h', name=f"+{variacao_tornado:.0f}%"))
+        fig.update_layout(barmode='overlay', title=f"Impacto em {indicador_tornado} (base {base_tornado:.4g})")
+        st.plotly_chart(fig, width='stretch')
+        if df_tornado['Limitado'].any():
+            limitadas = ", ".join(variaveis[c] for c in df_tornado.loc[df_tornado['Limitado'], 'Variável'])
+            st.caption(f"Choques limitados à faixa válida da entrada: {limitadas}.")
+        st.dataframe(df_tornado)
+
+@st.fragment
+def aba_metas():
+    st.header("Metas & Otimização")
+    definicao = st.session_state.projecao['definicao']
+    variaveis = variaveis_numericas(definicao)
+    caminhos = list(variaveis.keys())
+    st.subheader("Busca de Meta")
+    st.caption("Para cada entrada escolhida, o valor que leva o indicador ao alvo com as demais entradas fixas. As buscas rodam em paralelo.")
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1: vars_meta = st.multiselect("Entradas", options=caminhos, default=['dist_percentual'], format_func=variaveis.get, key="meta_vars")
+    with col2: indicador_meta = st.selectbox("Indicador", options=['TIR', 'MOIC'], key="meta_indicador")
+    with col3:
+        alvo_meta = st.number_input("Alvo (% a.a.)" if indicador_meta == 'TIR' else "Alvo (x)", value=12.0 if indicador_meta == 'TIR' else 1.5,
+                                    step=0.5 if indicador_meta == 'TIR' else 0.1, key=f"meta_alvo_{indicador_meta}")
+    if st.button("Buscar Meta", type="primary", width='stretch') and vars_meta:
+        alvo = alvo_meta / 100 if indicador_meta == 'TIR' else alvo_meta
+        with st.spinner("Buscando..."):
+            buscas = buscar_metas(definicao, [{'caminho': c, 'alvo': alvo, 'indicador': indicador_meta} for c in vars_meta])
+        st.dataframe(pd.DataFrame([{'Entrada': variaveis[b.caminho], 'Valor Atual': float(ler_valor(definicao, b.caminho)), 'Valor Encontrado': b.valor,
+                                    indicador_meta: b.obtido, 'Avaliações': b.avaliacoes, 'Status': b.status} for b in buscas]),
+                     width='stretch', hide_index=True)
+        with st.expander("Valores testados"):
+            for b in buscas:
+                st.caption(variaveis[b.caminho])
+                st.dataframe(b.historico, width='stretch')
+
+    st.markdown("---")
+    st.subheader("Otimização com Restrições")
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        vars_otim = st.multiselect("Entradas livres", options=caminhos, default=['dist_percentual'], format_func=variaveis.get, key="otim_vars")
+        faixas = {}
+        for c in vars_otim:
+            base = float(ler_valor(definicao, c))
+            col_min, col_max = st.columns(2)
+            with col_min: minimo = st.number_input(f"Mínimo · {variaveis[c]}", value=base * 0.5, key=f"otim_min_{c}")
+            with col_max: maximo = st.number_input(f"Máximo · {variaveis[c]}", value=base * 1.5 if base else 1.0, key=f"otim_max_{c}")
+            faixas[c] = (minimo, maximo)
+    with col2:
+        objetivo = st.selectbox("Objetivo", options=list(METRICAS), index=METRICAS.index('Total Distribuído'), key="otim_objetivo")
+        maximizar = st.radio("Sentido", ["Maximizar", "Minimizar"], horizontal=True, key="otim_sentido") == "Maximizar"
+        usar_tir = st.checkbox("TIR mínima", value=True, key="otim_usar_tir")
+        tir_minima = st.number_input("TIR mínima (% a.a.)", value=10.0, step=0.5, key="otim_tir", disabled=not usar_tir)
+        usar_caixa = st.checkbox("Caixa mínimo", value=True, key="otim_usar_caixa")
+        caixa_minimo = st.number_input("Caixa mínimo (R$)", value=0.0, step=100000.0, format="%.0f", key="otim_caixa", disabled=not usar_caixa)
+    if st.button("Otimizar", type="primary", width='stretch') and faixas:
+        restricoes = {}
+        if usar_tir: restricoes['TIR'] = (tir_minima / 100, None)
+        if usar_caixa: restricoes['Caixa Mínimo'] = (caixa_minimo, None)
+        with st.spinner("Otimizando..."):
+            otimo = otimizar(definicao, faixas, objetivo=objetivo, maximizar=maximizar, restricoes=restricoes)
+        if otimo.viavel: st.success(f"{objetivo}: {otimo.metricas[objetivo]:,.4g} em {otimo.avaliacoes} avaliações ({otimo.status})")
+        else: st.warning(f"Nenhum ponto avaliado atende às restrições ({otimo.avaliacoes} avaliações); abaixo, o de menor violação.")
+        col1, col2 = st.columns(2)
+        col1.dataframe(pd.DataFrame({'Entrada': [variaveis[c] for c in otimo.valores], 'Atual': [float(ler_valor(definicao, c)) for c in otimo.valores],
+                                     'Ótimo': list(otimo.valores.values())}), width='stretch', hide_index=True)
+        col2.dataframe(pd.Series(otimo.metricas, name='Valor'), width='stretch')
+        fig = go.Figure(go.Scatter(y=otimo.historico[objetivo].where(otimo.historico['Violação'] == 0), mode="markers", name="Viável"))
+        fig.update_layout(xaxis_title="Avaliação", yaxis_title=objetivo, title="Pontos avaliados (viáveis)")
+        st.plotly_chart(fig, width='stretch')
+
+@st.fragment
+def aba_cenarios():
+    st.header("Cenários Salvos")
+    chave_atual = st.session_state.projecao['chave']
+    if CAMINHO_BANCO_CENARIOS != ':memory:' and not Path(CAMINHO_BANCO_CENARIOS).exists():
+        st.info("Nenhum cenário guardado ainda. Ligue 'Guardar cada projeção no banco de cenários' na aba 'Geral & Curvas' para guardar as projeções.")
+        return
+    banco_cenarios = obter_banco_cenarios()
+    st.caption(f"{len(banco_cenarios):,} cenários em '{banco_cenarios.caminho}'")
+    nome_atual = banco_cenarios.nome(chave_atual)
+    if nome_atual is not None:
+        col1, col2 = st.columns([3, 1])
+        with col1: novo_nome = st.text_input("Nome do cenário atual", value=nome_atual, key=f"nome_cenario_{chave_atual}")
+        with col2:
+            st.write("")
+            if st.button("Renomear", width='stretch'): banco_cenarios.renomear(chave_atual, novo_nome)
+    else:
+        st.info("A projeção atual não está no banco. Ligue 'Guardar cada projeção no banco de cenários' na aba 'Geral & Curvas' para guardá-la.")
+    busca = st.text_input("Filtrar por nome", key="cenarios_busca")
+    lista = banco_cenarios.listar(busca=busca or None, limite=500)
+    if lista.empty: return
+    st.dataframe(lista.drop(columns='Hash'), hide_index=True, width='stretch',
+                 column_config={'TIR': st.column_config.NumberColumn(format="percent"), 'Bytes': st.column_config.NumberColumn(format="bytes")})
+    rotulos = dict(zip(lista['Hash'], lista['Nome'] + " · " + lista['Criado em']))
+    padrao = [c for c in [chave_atual, *lista['Hash']] if c in rotulos][:5]
+    selecionados = st.multiselect("Comparar", options=list(rotulos), default=list(dict.fromkeys(padrao)), format_func=rotulos.get, key="cenarios_comparar")
+    if not selecionados: return
+    series = banco_cenarios.series(selecionados)
+    graficos = [('PL Final', series['PL Final'], 'last', "R$"), ('Dividendos Acumulados', series['Dividendos'].cumsum(), 'last', "R$"),
+                ('TIR Acumulada', series['TIR Acumulada'], 'last', "% a.a.")]
+    for titulo, dados, agregacao, unidade in graficos:
+        dados = reamostrar_para_grafico(dados, agregacao)
+        fig = go.Figure([go.Scatter(x=dados.index, y=dados[coluna], mode='lines', name=coluna) for coluna in dados.columns])
+        fig.update_layout(title=titulo, yaxis_title=unidade, yaxis_tickformat=".1%" if unidade == "% a.a." else None, hovermode="x unified")
+        st.plotly_chart(fig, width='stretch')
+    if st.button("Excluir selecionados do banco"):
+        banco_cenarios.remover(selecionados)
+        st.rerun()
+
+tab_fluxo, tab_dashboard, tab_dre, tab_sensibilidade, tab_metas, tab_cenarios = st.tabs(["Fluxo de Caixa Detalhado", "Dashboard & Indicadores", "DRE", "Sensibilidade", "Metas & Otimização", "Cenários Salvos"])
+
+if not st.session_state.simulacao_rodada:
+    with tab_fluxo:
+        st.info("⬆️ Configure os parâmetros no painel acima e clique em 'Gerar Projeção' para iniciar a análise.")
+else:
+    # --- 2. MOTOR DE CÁLCULO ---
+    parametros = ParametrosFundo(
+        nome_fundo=nome_fundo, data_inicio=data_inicio, duracao_anos=duracao_anos, aporte_inicial=aporte_inicial,
+        projecao_cdi=projecao_cdi, projecao_ipca=projecao_ipca, curvas=curvas,
+        calc_dividendos=calc_dividendos, dist_percentual=dist_percentual, dist_frequencia=dist_frequencia,
+        calc_performance=calc_performance, perf_benchmark=perf_benchmark, perf_spread=perf_spread,
+        perf_percentual=perf_percentual, perf_carencia=perf_carencia, perf_periodo=perf_periodo, perf_hwm=perf_hwm)
+    if len(st.session_state.carteira.validar()):
+        with tab_fluxo: st.error("A carteira de ativos tem erros de validação. Corrija-os na aba 'Ativos' e gere a projeção novamente.")
+        st.stop()
+    # Cópias das listas editadas pelos widgets: a projeção guardada não muda se elas mudarem depois
+    definicao = DefinicaoFundo(parametros, st.session_state.carteira, [dict(d) for d in st.session_state.lista_despesas],
+                               [dict(a) for a in st.session_state.lista_aportes], [dict(a) for a in st.session_state.lista_amortizacoes])
+    # Com o diagnóstico ligado a projeção é refeita sem cache, para medir cada etapa de verdade
+    perfil = Perfil(memoria=medir_memoria) if diagnostico else None
+    with perfil or contextlib.nullcontext():
+        chave_projecao = cache_projecao.chave(*definicao.entradas())
+        if diagnostico or st.session_state.get('projecao', {}).get('chave') != chave_projecao:
+            if diagnostico: resultado = definicao.projetar()
+            elif guardar_cenarios: resultado, _ = obter_banco_cenarios().projetar(definicao, cache_projecao)
+            else: resultado = cache_projecao.projetar(*definicao.entradas())
+            df = resultado.para_dataframe()
+            st.session_state.projecao = {'chave': chave_projecao, 'definicao': definicao, 'resultado': resultado, 'df': df,
+                                         'dre': montar_dre(df, resultado.nomes_despesas)}
+        st.session_state.config_monte_carlo = (modo_estocastico, ModeloTaxas(vol_cdi=vol_cdi, vol_ipca=vol_ipca, correlacao=correlacao_indices),
+                                               int(n_cenarios), int(semente_cenarios))
+        estatisticas_cache = cache_projecao.estatisticas()
+        st.caption(f"Cache de projeções: {estatisticas_cache['resultados']['acertos']} acertos / {estatisticas_cache['resultados']['falhas']} falhas · "
+                   f"cronogramas de ativos: {estatisticas_cache['cronogramas']['acertos']} acertos / {estatisticas_cache['cronogramas']['falhas']} falhas")
+
+        with tab_fluxo: aba_fluxo()
+        with tab_dashboard: aba_dashboard()
+        with tab_dre: aba_dre()
+        with tab_sensibilidade: aba_sensibilidade()
+        with tab_metas: aba_metas()
+        with tab_cenarios: aba_cenarios()
+
+    if perfil is not None:
+        with st.expander("Diagnóstico de desempenho", expanded=True):
+            registros = perfil.para_dataframe()
+            total_ms = registros.loc[registros['nivel'] == 0, 'duracao'].sum() * 1000
+            st.caption(f"{len(registros)} etapas medidas · {total_ms:,.1f} ms nas etapas de primeiro nível"
+                       + (" · tempos inflados pelo tracemalloc" if perfil.memoria else ""))
+            resumo_perfil = perfil.resumo()
+            if not perfil.memoria: resumo_perfil = resumo_perfil.drop(columns='Pico de Memória (MB)')
+            st.dataframe(resumo_perfil.round(2), width='stretch')
+            col1, col2 = st.columns(2)
+            col1.download_button("Baixar registros (JSON)", perfil.serializar('json'), file_name="perfil.json", mime="application/json", on_click="ignore")
+            col2.download_button("Baixar trace do Chrome", perfil.serializar('chrome'), file_name="perfil_trace.json", mime="application/json",
+                                 on_click="ignore", help="Abra em chrome://tracing ou ui.perfetto.dev")
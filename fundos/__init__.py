@@ -0,0 +1,20 @@
+"""Núcleo de cálculo da análise de fundos, utilizável sem o Streamlit."""
+from fundos.motor import (
+    ParametrosFundo, DefinicaoFundo, ResultadoProjecao, ResultadoLote, CronogramaAtivo, projetar_fundo, projetar_lote,
+    cronograma_ativo, cronogramas_carteira, agregar_fundo, taxas_mensais, TIPO_CRI, TIPO_CRI_PULVERIZADO, TIPO_IMOVEL,
+    TIPO_GENERICO,
+)
+from fundos.carteira import Carteira
+from fundos.recebiveis import Recebiveis, carregar_recebiveis, cascata
+from fundos.curvas import TabelaIndices, curvas_anuais, ler_curvas, taxas_de_curvas
+from fundos.indicadores import indicadores_investidor, fluxo_investidor, tir_acumulada
+from fundos.cenarios import ModeloTaxas, ResultadoMonteCarlo, simular_cenarios
+from fundos.tir import ResultadoTIR, tir_lote, xtir_lote, tir, anualizar
+from fundos.cache import CacheLRU, CacheProjecao, hash_canonico
+from fundos.sensibilidade import grade_sensibilidade, tornado, avaliar
+from fundos.otimizacao import ResultadoMeta, ResultadoOtimizacao, buscar_meta, buscar_metas, otimizar
+from fundos.relatorios import montar_dre, resumo_investidor
+from fundos.exportacao import exportar_excel, exportar_parquet
+from fundos.banco import BancoCenarios
+from fundos.perfil import Perfil, etapa
+from fundos.arquivos import carregar_definicoes, definicao_de_dict, definicao_para_dict
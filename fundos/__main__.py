@@ -0,0 +1,5 @@
+import sys
+
+from fundos.cli import main
+
+sys.exit(main())
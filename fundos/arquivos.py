@@ -0,0 +1,114 @@
+"""Leitura e escrita de definições de fundos em JSON/YAML.
+
+O formato espelha o que a interface coleta:
+
+    {"parametros": {"nome_fundo": "...", "data_inicio": "2024-01-01", ...},
+     "ativos": [...], "despesas": [...], "aportes": [...], "amortizacoes": [...]}
+
+Carteiras grandes podem vir de uma fita CSV/Excel com `"arquivo_ativos": "fita.csv"`
+(caminho relativo ao arquivo da definição); ativos listados em `ativos` são
+acrescentados depois dos da fita. Da mesma forma, `"arquivo_curvas": "curvas.csv"`
+lê as curvas de CDI/IPCA/IGP-M (ver `fundos.curvas`), que têm precedência sobre
+`parametros.curvas` nos índices que trouxer. A `Arquivo Recebiveis` dos CRIs
+pulverizados também é relativa ao arquivo da definição. Um arquivo pode trazer um fundo, uma lista de
+fundos ou {"fundos": [...]}.
+"""
+import dataclasses
+import json
+from datetime import date
+from pathlib import Path
+
+from fundos.carteira import Carteira
+from fundos.curvas import ler_curvas, validar_curvas
+from fundos.motor import DefinicaoFundo, ParametrosFundo
+
+EXTENSOES = ('.json', '.yaml', '.yml')
+_CAMPOS_PARAMETROS = {f.name for f in dataclasses.fields(ParametrosFundo)}
+
+
+def definicao_de_dict(dados, origem=None, pasta=None, validar=True):
+    """Monta uma `DefinicaoFundo`, rejeitando parâmetros desconhecidos e ativos inválidos, da fita ou listados.
+
+    `validar=False` pula a validação dos ativos, para restaurar definições já projetadas.
+    """
+    parametros = dict(dados.get('parametros', {}))
+    desconhecidos = set(parametros) - _CAMPOS_PARAMETROS
+    if desconhecidos:
+        raise ValueError(f"{origem or 'definição'}: parâmetros desconhecidos {sorted(desconhecidos)}")
+    if isinstance(parametros.get('data_inicio'), str):
+        parametros['data_inicio'] = date.fromisoformat(parametros['data_inicio'])
+    if 'arquivo_curvas' in dados:
+        lidas = ler_curvas(Path(pasta or '.') / dados['arquivo_curvas'], tipo=dados.get('tipo_curvas', 'forward'),
+                           data_inicio=parametros.get('data_inicio', ParametrosFundo.data_inicio))
+        parametros['curvas'] = {**parametros.get('curvas', {}), **lidas}
+    try:
+        validar_curvas(parametros.get('curvas', {}))
+    except ValueError as erro:
+        raise ValueError(f"{origem or 'definição'}: {erro}") from erro
+    kwargs = {'parametros': ParametrosFundo(**parametros)}
+    for lista in ('ativos', 'despesas', 'aportes', 'amortizacoes'):
+        if lista in dados:
+            kwargs[lista] = [dict(item) for item in dados[lista]]
+    if 'arquivo_ativos' in dados:
+        carteira = Carteira.de_arquivo(Path(pasta or '.') / dados['arquivo_ativos'])
+        kwargs['ativos'] = carteira.concatenar(kwargs.get('ativos', []))
+    if pasta is not None and 'ativos' in kwargs:
+        kwargs['ativos'] = _resolver_fitas_recebiveis(kwargs['ativos'], pasta)
+    if validar and 'ativos' in kwargs:
+        # Ativos da fita e ativos listados na própria definição passam pela mesma validação
+        erros = Carteira.de(kwargs['ativos']).validar()
+        if len(erros):
+            primeiro = erros.iloc[0]
+            raise ValueError(f"{origem or 'definição'}: {len(erros)} erro(s) nos ativos, o primeiro na linha "
+                             f"{primeiro['Linha']}, coluna '{primeiro['Coluna']}': {primeiro['Mensagem']}")
+    return DefinicaoFundo(**kwargs)
+
+
+def _resolver_fitas_recebiveis(ativos, pasta):
+    carteira = Carteira.de(ativos)
+    alteracoes = [(i, 'Arquivo Recebiveis', str(Path(pasta) / caminho))
+                  for i, caminho in enumerate(carteira.dados['Arquivo Recebiveis'])
+                  if caminho is not None and not Path(caminho).is_absolute()]
+    return carteira.com_valores(alteracoes) if alteracoes else ativos
+
+
+def definicao_para_dict(definicao):
+    parametros = dataclasses.asdict(definicao.parametros)
+    parametros['data_inicio'] = definicao.parametros.data_inicio.isoformat()
+    return {'parametros': parametros, 'ativos': list(definicao.ativos), 'despesas': definicao.despesas,
+            'aportes': definicao.aportes, 'amortizacoes': definicao.amortizacoes}
+
+
+def _ler(caminho):
+    texto = Path(caminho).read_text(encoding='utf-8')
+    if Path(caminho).suffix.lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError as erro:
+            raise ImportError("Leitura de YAML requer o pacote 'pyyaml'") from erro
+        return yaml.safe_load(texto)
+    return json.loads(texto)
+
+
+def carregar_definicoes(caminho):
+    """Lista de `DefinicaoFundo` contidas num arquivo JSON/YAML."""
+    dados = _ler(caminho)
+    if isinstance(dados, dict) and 'fundos' in dados:
+        dados = dados['fundos']
+    itens = dados if isinstance(dados, list) else [dados]
+    return [definicao_de_dict(item, origem=f"{caminho}[{i}]", pasta=Path(caminho).parent) for i, item in enumerate(itens)]
+
+
+def listar_arquivos(entradas):
+    """Expande arquivos e diretórios (não recursivo) em arquivos de definição."""
+    arquivos = []
+    for entrada in map(Path, entradas):
+        if entrada.is_dir():
+            arquivos.extend(sorted(p for p in entrada.iterdir() if p.suffix.lower() in EXTENSOES))
+        else:
+            arquivos.append(entrada)
+    return arquivos
+
+
+def salvar_definicao(definicao, caminho):
+    Path(caminho).write_text(json.dumps(definicao_para_dict(definicao), ensure_ascii=False, indent=2), encoding='utf-8')
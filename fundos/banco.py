@@ -0,0 +1,248 @@
+"""Banco local (SQLite) de cenários projetados, indexados pelo hash do conteúdo.
+
+A chave de um cenário é a mesma do `CacheProjecao`: o hash canônico de todas
+as entradas. Projetar de novo um cenário já guardado vira uma consulta. Cada
+cenário ocupa quatro tabelas, para que listar e comparar não leiam blobs que
+não usam:
+
+- `cenarios`: uma linha pequena com nome, data e indicadores escalares,
+  indexada por data e nome (a listagem de dezenas de milhares de execuções só
+  lê esta tabela);
+- `series`: PL Final, Dividendos e TIR acumulada, as séries da comparação;
+- `resultados`: a tabela completa do `ResultadoProjecao`;
+- `definicoes`: a definição em JSON, para refazer ou editar o cenário.
+
+As matrizes são gravadas coluna a coluna, com os bytes de cada float agrupados
+por posição antes do zlib (o mesmo embaralhamento do Blosc), o que costuma
+comprimir bem mais que os floats crus.
+"""
+import json
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from fundos.arquivos import definicao_de_dict, definicao_para_dict
+from fundos.cache import CacheProjecao
+from fundos.indicadores import tir_acumulada
+from fundos.motor import ResultadoProjecao
+from fundos.perfil import etapa
+from fundos.relatorios import resumo_investidor
+
+SERIES_COMPARACAO = ('PL Final', 'Dividendos', 'TIR Acumulada')
+VERSAO_ESQUEMA = 1
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cenarios (
+    hash TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    fundo TEXT NOT NULL,
+    criado_em TEXT NOT NULL,
+    data_inicio TEXT NOT NULL,
+    meses INTEGER NOT NULL,
+    ativos INTEGER NOT NULL,
+    parametros TEXT NOT NULL,
+    tir REAL, moic REAL, dpi REAL, total_investido REAL, total_distribuido REAL, pl_final REAL,
+    bytes INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cenarios_criado_em ON cenarios (criado_em);
+CREATE INDEX IF NOT EXISTS cenarios_nome ON cenarios (nome);
+CREATE TABLE IF NOT EXISTS series (hash TEXT PRIMARY KEY REFERENCES cenarios ON DELETE CASCADE, dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS resultados (
+    hash TEXT PRIMARY KEY REFERENCES cenarios ON DELETE CASCADE,
+    nomes TEXT NOT NULL,
+    tabela BLOB NOT NULL,
+    investimentos BLOB
+);
+CREATE TABLE IF NOT EXISTS definicoes (hash TEXT PRIMARY KEY REFERENCES cenarios ON DELETE CASCADE, dados BLOB NOT NULL);
+"""
+
+_COLUNAS_LISTAGEM = {'hash': 'Hash', 'nome': 'Nome', 'fundo': 'Fundo', 'criado_em': 'Criado em', 'data_inicio': 'Início',
+                     'meses': 'Meses', 'ativos': 'Ativos', 'tir': 'TIR', 'moic': 'MOIC', 'dpi': 'DPI',
+                     'total_investido': 'Total Investido', 'total_distribuido': 'Total Distribuído',
+                     'pl_final': 'PL Final', 'bytes': 'Bytes'}
+
+
+def empacotar(matriz):
+    """Matriz (linhas, colunas) de floats em bytes comprimidos, coluna a coluna e com os bytes embaralhados."""
+    matriz = np.asarray(matriz, dtype=np.float64).reshape(len(matriz), -1)
+    bytes_floats = np.ascontiguousarray(matriz.T).view(np.uint8).reshape(-1, 8)
+    return zlib.compress(bytes_floats.T.tobytes(), 6)
+
+
+def desempacotar(blob, linhas):
+    """Inverso de `empacotar`: matriz (linhas, colunas) em ordem de coluna, somente leitura."""
+    planos = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(8, -1)
+    matriz = np.ascontiguousarray(planos.T).view(np.float64).reshape(-1, linhas).T
+    matriz.flags.writeable = False
+    return matriz
+
+
+class BancoCenarios:
+    """Cenários e resultados guardados num arquivo SQLite (`:memory:` para um banco temporário).
+
+    Uma conexão é compartilhada entre threads com uma trava; vários processos
+    podem gravar no mesmo arquivo (modo WAL, com espera pela trava do SQLite).
+    """
+
+    def __init__(self, caminho='cenarios.db'):
+        self.caminho = str(caminho)
+        if self.caminho != ':memory:':
+            Path(self.caminho).parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+        self._trava = threading.RLock()
+        with self._trava, self._conexao:
+            self._conexao.execute('PRAGMA journal_mode=WAL')
+            self._conexao.execute('PRAGMA synchronous=NORMAL')
+            self._conexao.execute('PRAGMA foreign_keys=ON')
+            versao = self._conexao.execute('PRAGMA user_version').fetchone()[0]
+            if versao not in (0, VERSAO_ESQUEMA):
+                raise ValueError(f"{self.caminho}: banco de cenários na versão {versao}; esta versão lê a {VERSAO_ESQUEMA}")
+            self._conexao.executescript(_ESQUEMA)
+            self._conexao.execute(f'PRAGMA user_version={VERSAO_ESQUEMA}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+        return False
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
+
+    def __len__(self):
+        with self._trava:
+            return self._conexao.execute('SELECT COUNT(*) FROM cenarios').fetchone()[0]
+
+    def __contains__(self, chave):
+        with self._trava:
+            return self._conexao.execute('SELECT 1 FROM cenarios WHERE hash = ?', (chave,)).fetchone() is not None
+
+    @staticmethod
+    def chave(definicao):
+        return CacheProjecao.chave(*definicao.entradas())
+
+    def _linhas(self, chave, definicao, resultado, nome):
+        """Linhas das quatro tabelas para um cenário; a parte cara (compressão e TIR acumulada) fica fora da trava."""
+        series = (resultado.aportes, resultado.amortizacoes, resultado.dividendos, resultado.pl_final)
+        resumo = resumo_investidor(resultado)
+        tabela = empacotar(resultado.tabela)
+        comparacao = empacotar(np.column_stack([resultado.pl_final, resultado.dividendos, tir_acumulada(*series)]))
+        investimentos = None if resultado.investimentos is None else empacotar(resultado.investimentos)
+        dados_definicao = definicao_para_dict(definicao)
+        texto_definicao = zlib.compress(json.dumps(dados_definicao, ensure_ascii=False).encode('utf-8'), 6)
+        parametros = dados_definicao['parametros']
+        tamanho = len(tabela) + len(comparacao) + len(texto_definicao) + len(investimentos or b'')
+        return (
+            (chave, nome or parametros['nome_fundo'], parametros['nome_fundo'], datetime.now().isoformat(timespec='seconds'),
+             parametros['data_inicio'], len(resultado.tabela) - 1, len(definicao.ativos), json.dumps(parametros, ensure_ascii=False),
+             resumo['TIR'], resumo['MOIC'], resumo['DPI'], resumo['Total Investido'], resumo['Total Distribuído'],
+             resumo['PL Final'], tamanho),
+            (chave, comparacao),
+            (chave, json.dumps({'ativos': list(map(str, resultado.nomes_ativos)), 'despesas': list(resultado.nomes_despesas)},
+                               ensure_ascii=False), tabela, investimentos),
+            (chave, texto_definicao),
+        )
+
+    def salvar_lote(self, itens):
+        """Guarda (definição, resultado, nome) numa só transação; cenários já guardados são ignorados. Devolve as chaves."""
+        chaves, linhas = [], []
+        with etapa('banco: preparo dos blobs', 'banco', linhas=len(itens)):
+            for definicao, resultado, nome in itens:
+                chave = self.chave(definicao)
+                chaves.append(chave)
+                if chave not in self:
+                    linhas.append(self._linhas(chave, definicao, resultado, nome))
+        with etapa('banco: gravação', 'banco', linhas=len(linhas)), self._trava, self._conexao:
+            for comando, indice in (('INSERT OR IGNORE INTO cenarios VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', 0),
+                                    ('INSERT OR IGNORE INTO series VALUES (?, ?)', 1),
+                                    ('INSERT OR IGNORE INTO resultados VALUES (?, ?, ?, ?)', 2),
+                                    ('INSERT OR IGNORE INTO definicoes VALUES (?, ?)', 3)):
+                self._conexao.executemany(comando, [linha[indice] for linha in linhas])
+        return chaves
+
+    def salvar(self, definicao, resultado, nome=None):
+        return self.salvar_lote([(definicao, resultado, nome)])[0]
+
+    def carregar(self, chave):
+        """`ResultadoProjecao` guardado com a chave, ou None."""
+        with etapa('banco: leitura do resultado', 'banco'), self._trava:
+            linha = self._conexao.execute(
+                'SELECT c.parametros, c.meses, r.nomes, r.tabela, r.investimentos FROM cenarios c '
+                'JOIN resultados r ON r.hash = c.hash WHERE c.hash = ?', (chave,)).fetchone()
+        if linha is None:
+            return None
+        parametros, meses, nomes, tabela, investimentos = linha
+        nomes = json.loads(nomes)
+        return ResultadoProjecao(definicao_de_dict({'parametros': json.loads(parametros)}).parametros, nomes['despesas'],
+                                 nomes['ativos'], desempacotar(tabela, meses + 1),
+                                 None if investimentos is None else desempacotar(investimentos, meses + 1)[:, 0])
+
+    def carregar_definicao(self, chave):
+        with self._trava:
+            linha = self._conexao.execute('SELECT dados FROM definicoes WHERE hash = ?', (chave,)).fetchone()
+        return None if linha is None else definicao_de_dict(json.loads(zlib.decompress(linha[0])), origem=chave, validar=False)
+
+    def projetar(self, definicao, cache=None, nome=None, salvar=True):
+        """(resultado, veio do banco): consulta pela chave e, se o cenário for novo, projeta (pelo `cache`, se houver) e guarda."""
+        chave = self.chave(definicao)
+        resultado = self.carregar(chave)
+        if resultado is not None:
+            return resultado, True
+        resultado = cache.projetar(*definicao.entradas()) if cache is not None else definicao.projetar()
+        if salvar:
+            self.salvar(definicao, resultado, nome)
+        return resultado, False
+
+    def nome(self, chave):
+        """Nome do cenário guardado com a chave, ou None se ele não estiver no banco."""
+        with self._trava:
+            linha = self._conexao.execute('SELECT nome FROM cenarios WHERE hash = ?', (chave,)).fetchone()
+        return None if linha is None else linha[0]
+
+    def renomear(self, chave, nome):
+        with self._trava, self._conexao:
+            self._conexao.execute('UPDATE cenarios SET nome = ? WHERE hash = ?', (nome, chave))
+
+    def remover(self, chaves):
+        with self._trava, self._conexao:
+            self._conexao.executemany('DELETE FROM cenarios WHERE hash = ?', [(c,) for c in chaves])
+
+    def listar(self, busca=None, limite=200, deslocamento=0):
+        """Cenários mais recentes primeiro, só com as colunas escalares; `busca` filtra por trecho do nome."""
+        filtro, argumentos = ('WHERE nome LIKE ?', [f"%{busca}%"]) if busca else ('', [])
+        with etapa('banco: listagem', 'banco'), self._trava:
+            cursor = self._conexao.execute(
+                f"SELECT {', '.join(_COLUNAS_LISTAGEM)} FROM cenarios {filtro} ORDER BY criado_em DESC, nome "
+                f"LIMIT ? OFFSET ?", argumentos + [-1 if limite is None else limite, deslocamento])
+            linhas = cursor.fetchall()
+        return pd.DataFrame(linhas, columns=list(_COLUNAS_LISTAGEM.values()))
+
+    def series(self, chaves):
+        """{série: DataFrame (datas x cenários)} de PL Final, Dividendos e TIR Acumulada, numa única consulta.
+
+        As colunas são rotuladas pelo nome do cenário (com o início do hash quando
+        o nome se repete); cenários de prazos diferentes ficam com NaN fora do seu período.
+        """
+        chaves = list(dict.fromkeys(chaves))
+        with etapa('banco: séries da comparação', 'banco', colunas=len(chaves)), self._trava:
+            linhas = self._conexao.execute(
+                'SELECT c.hash, c.nome, c.data_inicio, c.meses, s.dados FROM cenarios c JOIN series s ON s.hash = c.hash '
+                'WHERE c.hash IN (SELECT value FROM json_each(?))', (json.dumps(chaves),)).fetchall()
+        linhas.sort(key=lambda linha: chaves.index(linha[0]))
+        repetidos = pd.Series([linha[1] for linha in linhas]).duplicated(keep=False).tolist()
+        colunas = {nome: {} for nome in SERIES_COMPARACAO}
+        for (chave, nome, inicio, meses, dados), repetido in zip(linhas, repetidos):
+            rotulo = f"{nome} ({chave[:8]})" if repetido else nome
+            inicio = datetime.fromisoformat(inicio).date()
+            datas = pd.to_datetime([inicio + relativedelta(months=i) for i in range(meses + 1)])
+            for nome_serie, valores in zip(SERIES_COMPARACAO, desempacotar(dados, meses + 1).T):
+                colunas[nome_serie][rotulo] = pd.Series(valores, index=datas)
+        return {nome: pd.DataFrame(series) for nome, series in colunas.items()}
@@ -0,0 +1,281 @@
+"""Benchmark do motor com fundos sintéticos, comparação com uma referência e saídas douradas.
+
+Uso:
+    python -m fundos.benchmark --repeticoes 5 --saida bench.json
+    python -m fundos.benchmark --atualizar-referencia
+    python -m fundos.benchmark --cenarios padrao longo --referencia benchmarks/referencia.json --limite 1.3
+    python -m fundos.benchmark --atualizar-douradas
+
+Cada cenário gera um fundo determinístico (duração, quantidade e mix de ativos,
+despesas e eventos de capital) e mede separadamente as etapas do caminho da
+interface: projeção, montagem do DataFrame, DRE por `groupby('Ano')`, TIR e
+preparo da tabela de exibição. O resultado é gravado em JSON. Tempos só valem
+na máquina que os mediu, então a referência não fica no repositório: cada um
+grava a sua com `--atualizar-referencia` (em `--referencia` ou, sem ela, em
+`benchmarks/referencia.json`) e a compara passando `--referencia`. A execução
+então falha se a mediana de uma etapa que leva ao menos `--minimo-ms` na
+referência ficar mais lenta que `--limite` vezes a dela. As saídas douradas
+(PL, dividendos e indicadores do investidor) ficam no repositório, em
+`benchmarks/saidas_douradas.json`, e são verificadas pelos testes, sem
+depender de tempos.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fundos.carteira import TIPO_CRI, TIPO_GENERICO, TIPO_IMOVEL, Carteira
+from fundos.motor import DefinicaoFundo, ParametrosFundo
+from fundos.relatorios import montar_dre, resumo_investidor
+
+REFERENCIA_PADRAO = Path('benchmarks') / 'referencia.json'
+DOURADAS_PADRAO = Path('benchmarks') / 'saidas_douradas.json'
+
+# Cenários padrão: do fundo de um ano ao de 50 anos, e carteiras grandes ou só de CRIs
+CENARIOS = {
+    'curto': {'anos': 1, 'ativos': 5, 'despesas': 2, 'eventos': 2},
+    'padrao': {'anos': 10, 'ativos': 20, 'despesas': 3, 'eventos': 4},
+    'longo': {'anos': 50, 'ativos': 50, 'despesas': 5, 'eventos': 10},
+    'carteira_grande': {'anos': 30, 'ativos': 200, 'despesas': 5, 'eventos': 10},
+    'so_cri': {'anos': 20, 'ativos': 100, 'despesas': 3, 'eventos': 4, 'mix': {TIPO_CRI: 1}},
+}
+
+
+def fundo_sintetico(anos=10, ativos=20, despesas=3, eventos=4, mix=None, amortizacoes=('SAC', 'Price', 'Bullet'),
+                    tranches=('Sênior', 'Subordinada'), semente=0):
+    """`DefinicaoFundo` determinística para a mesma configuração e semente.
+
+    `mix` dá o peso de cada tipo de ativo (padrão: os três igualmente); os CRIs
+    sorteiam amortização e tranche entre `amortizacoes` e `tranches`. Os
+    eventos de capital se dividem entre aportes e amortizações.
+    """
+    rng = np.random.default_rng(semente)
+    meses = anos * 12
+    mix = mix or {TIPO_IMOVEL: 1, TIPO_CRI: 1, TIPO_GENERICO: 1}
+    pesos = np.array(list(mix.values()), dtype=float)
+    tipos = rng.choice(list(mix), size=ativos, p=pesos / pesos.sum())
+
+    registros = []
+    for i, tipo in enumerate(tipos):
+        mes = int(rng.integers(1, max(meses // 2, 1) + 1))
+        if tipo == TIPO_IMOVEL:
+            registros.append({'tipo': tipo, 'Nome': f"Imóvel {i + 1}", 'Valor Compra': float(rng.uniform(1e6, 5e6)),
+                              'Mês Compra': mes, 'Receita Aluguel': float(rng.uniform(1e4, 5e4)),
+                              'Vacancia': float(rng.uniform(0, 15)), 'Indice Reajuste': str(rng.choice(['IPCA', 'IGP-M'])),
+                              'Custos Mensais': float(rng.uniform(0, 5000)), 'Cap Rate Saida': float(rng.choice([7.0, 8.5]))})
+        elif tipo == TIPO_CRI:
+            prazo = int(rng.integers(12, 241))
+            benchmark = str(rng.choice(['IPCA', 'CDI', 'Pré-fixado']))
+            tipo_taxa = 'Spread' if benchmark != 'CDI' else str(rng.choice(['Spread', '% do Benchmark']))
+            registros.append({'tipo': tipo, 'Nome': f"CRI {i + 1}", 'Principal': float(rng.uniform(1e6, 5e6)),
+                              'Mês Investimento': mes, 'Benchmark': benchmark, 'Tipo Taxa': tipo_taxa,
+                              'Taxa': float(rng.uniform(100, 130) if tipo_taxa == '% do Benchmark' else rng.uniform(3, 12)),
+                              'Prazo': prazo, 'Amortizacao': str(rng.choice(amortizacoes)),
+                              'Carencia': int(rng.integers(0, min(prazo - 1, 24) + 1)), 'Tranche': str(rng.choice(tranches)),
+                              'Perda': float(rng.choice([0.0, 2.0, 10.0]))})
+        else:
+            registros.append({'tipo': tipo, 'Nome': f"Ativo {i + 1}", 'Valor': float(rng.uniform(1e5, 2e6)),
+                              'Mês Investimento': mes, 'Benchmark': str(rng.choice(['IPCA', 'CDI'])),
+                              'Spread': float(rng.uniform(0, 8))})
+    carteira = Carteira.de(registros)
+
+    lista_despesas = [{'Nome': 'Taxa de Adm', 'Tipo': '% do PL', 'Valor': 0.2}]
+    lista_despesas += [{'Nome': f"Despesa {i + 1}", 'Tipo': 'Fixo Mensal', 'Valor': float(rng.uniform(1000, 20000))}
+                       for i in range(1, despesas)]
+    lista_eventos = [{'Mês': int(rng.integers(1, meses + 1)), 'Valor': float(rng.uniform(1e5, 1e6))} for _ in range(eventos)]
+
+    # Aporte inicial do tamanho da carteira, para o fundo não nascer alavancado
+    valores = carteira.dados[['Valor Compra', 'Principal', 'Valor']].sum(axis=1).sum()
+    parametros = ParametrosFundo(nome_fundo=f"Sintético {anos}a/{ativos} ativos", data_inicio=date(2024, 1, 1),
+                                 duracao_anos=anos, aporte_inicial=float(round(valores * 1.1, 2)),
+                                 projecao_cdi=10.0, projecao_ipca=4.5)
+    return DefinicaoFundo(parametros, carteira, lista_despesas, lista_eventos[:eventos // 2], lista_eventos[eventos // 2:])
+
+
+def _etapas(definicao):
+    """Etapas do caminho da interface, cada uma consumindo a saída da anterior."""
+    contexto = {}
+
+    def projecao():
+        contexto['resultado'] = definicao.projetar()
+
+    def dataframe():
+        contexto['df'] = contexto['resultado'].para_dataframe()
+
+    def dre():
+        montar_dre(contexto['df'], contexto['resultado'].nomes_despesas)
+
+    def tir():
+        resumo_investidor(contexto['resultado'])
+
+    def estilo():
+        # A interface manda a visão em dois níveis para o navegador em Arrow e formata por coluna lá
+        import pyarrow as pa
+        pa.Table.from_pandas(contexto['resultado'].visao_exibicao())
+
+    return contexto, {'projecao': projecao, 'dataframe': dataframe, 'dre': dre, 'tir': tir, 'estilo': estilo}
+
+
+ETAPAS = ('projecao', 'dataframe', 'dre', 'tir', 'estilo')
+
+
+def saidas_douradas(resultado):
+    """Números que o trabalho de desempenho não pode mudar: PL, dividendos e indicadores do investidor."""
+    resumo = resumo_investidor(resultado)
+    fim_de_ano = resultado.pl_final[::12]
+    dividendos_anuais = np.add.reduceat(resultado.dividendos, np.arange(0, len(resultado.dividendos), 12))
+    saidas = {'PL Final': resumo['PL Final'], 'Dividendos': float(resultado.dividendos.sum()),
+              'PL Final Anual': fim_de_ano.tolist(), 'Dividendos Anuais': dividendos_anuais.tolist()}
+    saidas.update({nome: resumo[nome] for nome in ('TIR', 'MOIC', 'DPI', 'RVPI', 'Payback (meses)',
+                                                   'Total Investido', 'Total Distribuído')})
+    return saidas
+
+
+def calcular_douradas(cenarios=None):
+    """{cenário: {'configuracao', 'saidas'}} dos cenários escolhidos (padrão: todos de `CENARIOS`)."""
+    return {nome: {'configuracao': CENARIOS[nome], 'saidas': saidas_douradas(fundo_sintetico(**CENARIOS[nome]).projetar())}
+            for nome in cenarios or CENARIOS}
+
+
+def comparar_douradas(atuais, referencia, rtol=1e-9, atol=1e-6):
+    """Lista de diferenças entre saídas douradas; cenários ausentes ou com outra configuração são ignorados."""
+    falhas = []
+    for nome, cenario in atuais.items():
+        base = referencia.get(nome)
+        if base is None or base['configuracao'] != cenario['configuracao']:
+            continue
+        for chave, valor_base in base['saidas'].items():
+            if not _iguais(cenario['saidas'].get(chave, np.nan), valor_base, rtol, atol):
+                falhas.append(f"{nome}: '{chave}' mudou em relação à referência")
+    return falhas
+
+
+def medir_cenario(configuracao, repeticoes=5, etapas=ETAPAS):
+    """Tempos (s) por etapa de um cenário. A primeira execução aquece e é descartada."""
+    definicao = fundo_sintetico(**configuracao)
+    amostras = {etapa: [] for etapa in etapas}
+    for rodada in range(repeticoes + 1):
+        _, funcoes = _etapas(definicao)
+        for etapa in ETAPAS:
+            inicio = time.perf_counter()
+            funcoes[etapa]()
+            decorrido = time.perf_counter() - inicio
+            if rodada and etapa in amostras:
+                amostras[etapa].append(decorrido)
+            if etapa == etapas[-1]:
+                break
+    tempos = {etapa: {'mediana': float(np.median(v)), 'minimo': float(np.min(v)), 'amostras': v} for etapa, v in amostras.items()}
+    return {'configuracao': configuracao, 'tempos': tempos}
+
+
+def executar(cenarios=None, repeticoes=5, etapas=ETAPAS, progresso=None):
+    """Roda os cenários escolhidos (padrão: todos de `CENARIOS`) e devolve o relatório em formato JSON."""
+    relatorio = {
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                     'plataforma': platform.platform(), 'processador': platform.processor()},
+        'repeticoes': repeticoes,
+        'cenarios': {},
+    }
+    for nome in cenarios or CENARIOS:
+        relatorio['cenarios'][nome] = medir_cenario(CENARIOS[nome], repeticoes, etapas)
+        if progresso:
+            progresso(nome, relatorio['cenarios'][nome])
+    return relatorio
+
+
+def _iguais(atual, referencia, rtol, atol):
+    atual, referencia = np.asarray(atual, dtype=float), np.asarray(referencia, dtype=float)
+    return atual.shape == referencia.shape and bool(np.allclose(atual, referencia, rtol=rtol, atol=atol, equal_nan=True))
+
+
+def comparar(atual, referencia, limite=1.5, piso=0.002, minimo=0.020):
+    """Lista de regressões de tempo do relatório `atual` contra a `referencia`.
+
+    Só entram etapas que levam ao menos `minimo` segundos na referência; abaixo
+    disso a razão entre medianas é dominada por ruído. Uma etapa regride quando a
+    mediana passa de `limite` vezes a da referência e a diferença supera `piso`
+    segundos. Cenários que não existem na referência, ou com outra configuração,
+    são ignorados.
+    """
+    falhas = []
+    for nome, cenario in atual['cenarios'].items():
+        base = referencia.get('cenarios', {}).get(nome)
+        if base is None or base['configuracao'] != cenario['configuracao']:
+            continue
+        for etapa, tempo in cenario['tempos'].items():
+            tempo_base = base['tempos'].get(etapa)
+            if tempo_base is None:
+                continue
+            mediana, mediana_base = tempo['mediana'], tempo_base['mediana']
+            if mediana_base >= minimo and mediana > limite * mediana_base and mediana - mediana_base > piso:
+                falhas.append(f"{nome}/{etapa}: {mediana * 1000:.1f} ms contra {mediana_base * 1000:.1f} ms "
+                              f"na referência ({mediana / mediana_base:.2f}x > {limite:.2f}x)")
+    return falhas
+
+
+def _tabela(relatorio):
+    linhas = {nome: {etapa: t['mediana'] * 1000 for etapa, t in cenario['tempos'].items()}
+              for nome, cenario in relatorio['cenarios'].items()}
+    return pd.DataFrame(linhas).T.round(2).rename_axis('mediana (ms)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fundos.benchmark', description="Benchmark do motor com fundos sintéticos.")
+    parser.add_argument('--cenarios', nargs='+', choices=list(CENARIOS), default=None, help="Cenários a rodar (padrão: todos)")
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=list(ETAPAS), help="Etapas a cronometrar (padrão: todas)")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--saida', default=None, help="Grava o relatório JSON neste arquivo")
+    parser.add_argument('--referencia', default=None,
+                        help="Compara os tempos com este relatório de referência (sem ela, só mede)")
+    parser.add_argument('--limite', type=float, default=1.5, help="Razão máxima de lentidão por etapa (padrão: 1.5)")
+    parser.add_argument('--piso-ms', type=float, default=2.0, help="Diferenças abaixo disto não contam como regressão (padrão: 2 ms)")
+    parser.add_argument('--minimo-ms', type=float, default=20.0,
+                        help="Etapas mais rápidas que isto na referência não são comparadas (padrão: 20 ms)")
+    parser.add_argument('--atualizar-referencia', action='store_true',
+                        help=f"Grava esta execução como a referência, em --referencia ou em {REFERENCIA_PADRAO}")
+    parser.add_argument('--atualizar-douradas', action='store_true',
+                        help=f"Regrava as saídas douradas em {DOURADAS_PADRAO} e sai, sem cronometrar")
+    args = parser.parse_args(argv)
+
+    if args.atualizar_douradas:
+        DOURADAS_PADRAO.parent.mkdir(parents=True, exist_ok=True)
+        DOURADAS_PADRAO.write_text(json.dumps(calcular_douradas(), indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"Saídas douradas gravadas em {DOURADAS_PADRAO}", file=sys.stderr)
+        return 0
+
+    def progresso(nome, cenario):
+        total = sum(t['mediana'] for t in cenario['tempos'].values())
+        print(f"{nome}: {total * 1000:.1f} ms por execução", file=sys.stderr)
+
+    relatorio = executar(args.cenarios, args.repeticoes, tuple(e for e in ETAPAS if e in args.etapas), progresso)
+    print(_tabela(relatorio).to_string())
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    caminho = Path(args.referencia or REFERENCIA_PADRAO)
+    if args.atualizar_referencia:
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        caminho.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"Referência gravada em {caminho}", file=sys.stderr)
+        return 0
+    if args.referencia is None:
+        return 0
+    if not caminho.exists():
+        print(f"Referência {caminho} não encontrada; grave uma com --atualizar-referencia", file=sys.stderr)
+        return 1
+    falhas = comparar(relatorio, json.loads(caminho.read_text(encoding='utf-8')), args.limite, args.piso_ms / 1000,
+                      args.minimo_ms / 1000)
+    for falha in falhas:
+        print(f"FALHA {falha}", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
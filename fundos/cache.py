@@ -0,0 +1,189 @@
+"""Cache de projeções por hash canônico dos parâmetros.
+
+Guarda dois níveis: a projeção completa, indexada por todas as entradas, e o
+cronograma isolado de cada ativo, indexado pelo hash da linha da carteira e
+pelas taxas. Ao editar um único ativo, só o cronograma dele é recalculado antes
+de refazer a agregação do fundo.
+"""
+import dataclasses
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+
+from fundos.carteira import Carteira
+from fundos.motor import CronogramaAtivo, agregar_fundo, cronogramas_carteira, taxas_mensais
+from fundos.perfil import etapa
+
+
+def _normalizar(valor):
+    if isinstance(valor, Carteira):
+        return {'__carteira__': hashlib.sha256(valor.hashes_linhas().tobytes()).hexdigest()}
+    if dataclasses.is_dataclass(valor) and not isinstance(valor, type):
+        return {f.name: _normalizar(getattr(valor, f.name)) for f in dataclasses.fields(valor)}
+    if isinstance(valor, dict):
+        return {str(k): _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    if isinstance(valor, np.ndarray):
+        return {'__ndarray__': hashlib.sha256(np.ascontiguousarray(valor).tobytes()).hexdigest(),
+                'forma': list(valor.shape), 'tipo': str(valor.dtype)}
+    if isinstance(valor, np.generic):
+        return _normalizar(valor.item())
+    if isinstance(valor, bool) or valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float)):
+        # 12 e 12.0 vindos de widgets diferentes devem gerar a mesma chave
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return repr(valor)
+
+
+def hash_canonico(*objetos):
+    """SHA-256 de uma serialização JSON canônica (chaves ordenadas, números como float)."""
+    texto = json.dumps(_normalizar(objetos), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def tamanho_em_bytes(valor):
+    """Estimativa do tamanho em memória, contando os buffers dos arrays NumPy."""
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if dataclasses.is_dataclass(valor) and not isinstance(valor, type):
+        return sum(tamanho_em_bytes(getattr(valor, f.name)) for f in dataclasses.fields(valor))
+    if isinstance(valor, dict):
+        return sum(tamanho_em_bytes(v) for v in valor.values()) + sys.getsizeof(valor)
+    if isinstance(valor, (list, tuple)):
+        return sum(tamanho_em_bytes(v) for v in valor) + sys.getsizeof(valor)
+    if hasattr(valor, 'memory_usage'):
+        return int(valor.memory_usage(deep=True).sum())
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    """Cache LRU limitado por número de entradas e por bytes, com contadores."""
+
+    def __init__(self, max_entradas=128, max_bytes=256 * 1024**2):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.RLock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def obter(self, chave, padrao=None):
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave][0]
+            self.falhas += 1
+            return padrao
+
+    def guardar(self, chave, valor):
+        tamanho = tamanho_em_bytes(valor)
+        with self._trava:
+            if chave in self._itens:
+                self._bytes -= self._itens.pop(chave)[1]
+            if tamanho > self.max_bytes:
+                return valor
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while len(self._itens) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, tamanho_removido) = self._itens.popitem(last=False)
+                self._bytes -= tamanho_removido
+                self.remocoes += 1
+        return valor
+
+    def obter_ou_calcular(self, chave, funcao):
+        with self._trava:
+            if chave in self._itens:
+                return self.obter(chave)
+            self.falhas += 1
+        return self.guardar(chave, funcao())
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {'entradas': len(self._itens), 'bytes': self._bytes, 'acertos': self.acertos,
+                'falhas': self.falhas, 'remocoes': self.remocoes,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0}
+
+
+def _somente_leitura(cronograma):
+    for campo in dataclasses.fields(cronograma):
+        getattr(cronograma, campo.name).flags.writeable = False
+    return cronograma
+
+
+def chave_taxas(parametros):
+    """Entradas que determinam as taxas mensais e, portanto, os cronogramas dos ativos."""
+    return hash_canonico(parametros.meses_total, parametros.projecao_cdi, parametros.projecao_ipca, parametros.curvas)
+
+
+class CacheProjecao:
+    """Projeção com cache em dois níveis: execução completa e cronograma por ativo."""
+
+    def __init__(self, max_resultados=64, max_cronogramas=4096, max_bytes=512 * 1024**2):
+        self.resultados = CacheLRU(max_resultados, max_bytes // 2)
+        self.cronogramas_ativos = CacheLRU(max_cronogramas, max_bytes // 2)
+
+    @staticmethod
+    def chave(parametros, ativos, despesas, aportes, amortizacoes):
+        return hash_canonico(parametros, Carteira.de(ativos), despesas, aportes, amortizacoes)
+
+    def cronogramas(self, carteira, parametros, taxas=None, chave_tx=None):
+        """Cronogramas da carteira (grupo ativos x meses), recalculando só as linhas novas ou alteradas."""
+        carteira = Carteira.de(carteira)
+        chave_tx = chave_tx or chave_taxas(parametros)
+        chaves = [f"{h:016x}:{chave_tx}" for h in carteira.hashes_linhas()]
+        encontrados = [self.cronogramas_ativos.obter(chave) for chave in chaves]
+        faltantes = [i for i, cronograma in enumerate(encontrados) if cronograma is None]
+        if faltantes:
+            taxas = taxas if taxas is not None else taxas_mensais(parametros)
+            novos = cronogramas_carteira(carteira.subconjunto(faltantes), taxas)
+            for j, i in enumerate(faltantes):
+                cronograma = CronogramaAtivo(novos.volume[j].copy(), novos.rendimento[j].copy(),
+                                             novos.perda[j].copy(), novos.investimento[j].copy())
+                encontrados[i] = self.cronogramas_ativos.guardar(chaves[i], _somente_leitura(cronograma))
+        n_meses = parametros.meses_total + 1
+
+        def empilhar(campo):
+            return np.stack([getattr(c, campo) for c in encontrados]) if encontrados else np.zeros((0, n_meses))
+
+        return CronogramaAtivo(empilhar('volume'), empilhar('rendimento'), empilhar('perda'), empilhar('investimento'))
+
+    def projetar(self, parametros, ativos, despesas, aportes=(), amortizacoes=()):
+        """Mesmo resultado de `projetar_fundo`, reaproveitando o que não mudou."""
+        with etapa('projeção (cache)', linhas=parametros.meses_total + 1, colunas=len(ativos)) as medicao:
+            carteira = Carteira.de(ativos)
+            chave = self.chave(parametros, carteira, despesas, aportes, amortizacoes)
+            resultado = self.resultados.obter(chave)
+            medicao.contar(acerto=resultado is not None)
+            if resultado is not None:
+                return resultado
+            taxas = taxas_mensais(parametros)
+            cronogramas = self.cronogramas(carteira, parametros, taxas, chave_taxas(parametros))
+            resultado = agregar_fundo(parametros, cronogramas, despesas, aportes, amortizacoes, taxas,
+                                      nomes_ativos=carteira.dados['Nome'])
+            return self.resultados.guardar(chave, resultado)
+
+    def estatisticas(self):
+        return {'resultados': self.resultados.estatisticas(), 'cronogramas': self.cronogramas_ativos.estatisticas()}
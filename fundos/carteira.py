@@ -0,0 +1,318 @@
+"""Carteira de ativos em formato colunar.
+
+Uma `Carteira` guarda um ativo por linha num DataFrame com esquema fixo (a
+união dos campos de imóveis, CRIs e ativos genéricos), valida as colunas de uma
+vez e entrega ao motor arrays tipados por classe de ativo. O CRI pulverizado
+aponta para uma fita de recebíveis (ver `fundos.recebiveis`) em vez de trazer o
+lastro na própria linha. Para o restante do código ela se comporta como a lista
+de dicionários usada antes: `len`, iteração e `carteira[i]` devolvem os campos
+preenchidos de cada ativo.
+"""
+import io
+import os
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TIPO_IMOVEL = "Imobiliário - Renda"
+TIPO_CRI = "CRI / CCI"
+TIPO_CRI_PULVERIZADO = "CRI Pulverizado"
+TIPO_GENERICO = "Genérico"
+TIPOS = (TIPO_IMOVEL, TIPO_CRI, TIPO_CRI_PULVERIZADO, TIPO_GENERICO)
+
+COLUNAS_TEXTO = ['tipo', 'Nome', 'Indice Reajuste', 'Benchmark', 'Tipo Taxa', 'Amortizacao', 'Tranche', 'Arquivo Recebiveis']
+COLUNAS_INTEIRAS = ['Mês Compra', 'Mês Investimento', 'Prazo', 'Carencia', 'Rampa']
+COLUNAS_DECIMAIS = ['Valor Compra', 'Receita Aluguel', 'Vacancia', 'Custos Mensais', 'Outros Custos % Receita',
+                    'Cap Rate Saida', 'Principal', 'Taxa', 'Perda', 'Subordinacao', 'CPR', 'CDR', 'Severidade',
+                    'Valor', 'Spread']
+
+# Ordem de exibição: identificação, imóvel, CRI, lastro do CRI pulverizado e genérico
+COLUNAS = ['tipo', 'Nome',
+           'Valor Compra', 'Mês Compra', 'Receita Aluguel', 'Vacancia', 'Indice Reajuste', 'Custos Mensais',
+           'Outros Custos % Receita', 'Cap Rate Saida',
+           'Principal', 'Mês Investimento', 'Benchmark', 'Tipo Taxa', 'Taxa', 'Prazo', 'Amortizacao', 'Carencia',
+           'Tranche', 'Perda',
+           'Arquivo Recebiveis', 'Subordinacao', 'CPR', 'CDR', 'Severidade', 'Rampa',
+           'Valor', 'Spread']
+
+CAMPOS_POR_TIPO = {
+    TIPO_IMOVEL: ['Valor Compra', 'Mês Compra', 'Receita Aluguel', 'Vacancia', 'Indice Reajuste', 'Custos Mensais',
+                  'Outros Custos % Receita', 'Cap Rate Saida'],
+    TIPO_CRI: ['Principal', 'Mês Investimento', 'Benchmark', 'Tipo Taxa', 'Taxa', 'Prazo', 'Amortizacao', 'Carencia',
+               'Tranche', 'Perda'],
+    TIPO_CRI_PULVERIZADO: ['Principal', 'Mês Investimento', 'Arquivo Recebiveis', 'Benchmark', 'Tipo Taxa', 'Taxa',
+                           'Tranche', 'Subordinacao', 'CPR', 'CDR', 'Severidade', 'Rampa'],
+    TIPO_GENERICO: ['Valor', 'Mês Investimento', 'Benchmark', 'Spread'],
+}
+OBRIGATORIOS = {
+    TIPO_IMOVEL: ['Valor Compra', 'Mês Compra', 'Receita Aluguel'],
+    TIPO_CRI: ['Principal', 'Mês Investimento', 'Benchmark', 'Taxa', 'Prazo', 'Amortizacao'],
+    TIPO_CRI_PULVERIZADO: ['Principal', 'Mês Investimento', 'Arquivo Recebiveis', 'Benchmark', 'Taxa', 'Subordinacao'],
+    TIPO_GENERICO: ['Valor', 'Mês Investimento'],
+}
+# Mesmos padrões que o motor usava com ativo.get(...)
+PADROES = {
+    TIPO_IMOVEL: {'Vacancia': 0.0, 'Indice Reajuste': 'IPCA', 'Custos Mensais': 0.0, 'Outros Custos % Receita': 0.0,
+                  'Cap Rate Saida': 0.0},
+    TIPO_CRI: {'Tipo Taxa': 'Spread', 'Carencia': 0, 'Tranche': 'Sênior', 'Perda': 0.0},
+    TIPO_CRI_PULVERIZADO: {'Tipo Taxa': 'Spread', 'Tranche': 'Sênior', 'CPR': 0.0, 'CDR': 0.0, 'Severidade': 0.0,
+                           'Rampa': 0},
+    TIPO_GENERICO: {'Benchmark': 'IPCA', 'Spread': 0.0},
+}
+VALORES_PERMITIDOS = {
+    (TIPO_IMOVEL, 'Indice Reajuste'): ('IPCA', 'IGP-M'),
+    (TIPO_CRI, 'Benchmark'): ('IPCA', 'CDI', 'Pré-fixado'),
+    (TIPO_CRI, 'Tipo Taxa'): ('Spread', '% do Benchmark'),
+    (TIPO_CRI, 'Amortizacao'): ('SAC', 'Price', 'Bullet'),
+    (TIPO_CRI, 'Tranche'): ('Sênior', 'Subordinada'),
+    (TIPO_CRI_PULVERIZADO, 'Benchmark'): ('IPCA', 'CDI', 'Pré-fixado'),
+    (TIPO_CRI_PULVERIZADO, 'Tipo Taxa'): ('Spread', '% do Benchmark'),
+    (TIPO_CRI_PULVERIZADO, 'Tranche'): ('Sênior', 'Subordinada'),
+    (TIPO_GENERICO, 'Benchmark'): ('IPCA', 'CDI'),
+}
+MINIMOS = {'Mês Compra': 1, 'Mês Investimento': 1, 'Prazo': 1, 'Carencia': 0, 'Valor Compra': 0, 'Receita Aluguel': 0,
+           'Vacancia': 0, 'Custos Mensais': 0, 'Principal': 0, 'Valor': 0, 'Perda': 0, 'Subordinacao': 0, 'CPR': 0,
+           'CDR': 0, 'Severidade': 0, 'Rampa': 0}
+MAXIMOS = {'Vacancia': 100, 'Outros Custos % Receita': 100, 'Subordinacao': 100, 'CPR': 100, 'CDR': 100,
+           'Severidade': 100}
+
+
+def _chave_coluna(nome):
+    texto = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode()
+    return ''.join(c for c in texto.lower() if c.isalnum())
+
+
+_COLUNAS_POR_CHAVE = {_chave_coluna(c): c for c in COLUNAS}
+_TIPOS_POR_CHAVE = {_chave_coluna(t): t for t in TIPOS}
+_TIPOS_POR_CHAVE.update({'imovel': TIPO_IMOVEL, 'imobiliario': TIPO_IMOVEL, 'cri': TIPO_CRI, 'cci': TIPO_CRI,
+                         'pulverizado': TIPO_CRI_PULVERIZADO, 'crirecebiveis': TIPO_CRI_PULVERIZADO,
+                         'generico': TIPO_GENERICO})
+
+
+def _texto(valor):
+    if valor is None or valor != valor:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _normalizar(df):
+    """Ajusta nomes de colunas, tipos e padrões ao esquema da carteira."""
+    df = df.rename(columns=lambda c: _COLUNAS_POR_CHAVE.get(_chave_coluna(c), c))
+    n = len(df)
+    colunas = {}
+    for coluna in COLUNAS:
+        if coluna in COLUNAS_TEXTO:
+            colunas[coluna] = np.array([_texto(v) for v in df[coluna]] if coluna in df.columns else [None] * n, dtype=object)
+        elif coluna in df.columns:
+            colunas[coluna] = np.array(pd.to_numeric(df[coluna], errors='coerce'), dtype=float)
+        else:
+            colunas[coluna] = np.full(n, np.nan)
+    tipos = {t: _TIPOS_POR_CHAVE.get(_chave_coluna(t), t) for t in set(colunas['tipo']) if t is not None}
+    colunas['tipo'] = np.array([tipos.get(t) for t in colunas['tipo']], dtype=object)
+    for tipo, padroes in PADROES.items():
+        linhas = colunas['tipo'] == tipo
+        for coluna, padrao in padroes.items():
+            valores = colunas[coluna]
+            vazio = (valores == None) if valores.dtype == object else np.isnan(valores)  # noqa: E711
+            valores[linhas & vazio] = padrao
+    sem_nome = colunas['Nome'] == None  # noqa: E711
+    colunas['Nome'][sem_nome] = [f"Ativo {i + 1}" for i in np.flatnonzero(sem_nome)]
+    return pd.DataFrame(colunas)
+
+
+def _assinatura_arquivo(caminho):
+    """Tamanho e data de modificação de um arquivo, ou '' se ele não existir."""
+    try:
+        estado = os.stat(caminho)
+    except (OSError, TypeError, ValueError):
+        return ''
+    return f"{estado.st_size}:{estado.st_mtime_ns}"
+
+
+def ler_planilha(arquivo, nome=None):
+    """DataFrame de um CSV (separador detectado) ou Excel, por caminho ou arquivo aberto."""
+    nome = str(nome or getattr(arquivo, 'name', arquivo))
+    if Path(nome).suffix.lower() in ('.xlsx', '.xls'):
+        try:
+            return pd.read_excel(arquivo)
+        except ImportError as erro:
+            raise ImportError("Leitura de Excel requer o pacote 'openpyxl'") from erro
+    conteudo = arquivo.read() if hasattr(arquivo, 'read') else Path(arquivo).read_bytes()
+    if isinstance(conteudo, str):
+        conteudo = conteudo.encode('utf-8')
+    cabecalho = conteudo.decode('utf-8-sig', errors='ignore').split('\n', 1)[0]
+    separador = max((',', ';', '\t'), key=cabecalho.count)
+    # Planilhas exportadas com ';' usam vírgula decimal e ponto de milhar
+    opcoes = {'decimal': ',', 'thousands': '.'} if separador == ';' else {}
+    return pd.read_csv(io.BytesIO(conteudo), sep=separador, encoding='utf-8-sig', float_precision='round_trip', **opcoes)
+
+
+class Carteira:
+    """Ativos do fundo, um por linha, com o esquema de `COLUNAS`."""
+
+    def __init__(self, dados=None):
+        self.dados = _normalizar(dados if dados is not None else pd.DataFrame(columns=COLUNAS))
+        # A carteira é tratada como imutável (as alterações devolvem cópias), então arrays e hashes são memorizados
+        self._memo = {}
+
+    @classmethod
+    def _de_normalizado(cls, dados):
+        carteira = cls.__new__(cls)
+        carteira.dados = dados.reset_index(drop=True)
+        carteira._memo = {}
+        return carteira
+
+    @classmethod
+    def de(cls, ativos):
+        """Aceita uma `Carteira`, uma lista de dicionários ou um DataFrame."""
+        if isinstance(ativos, cls):
+            return ativos
+        if isinstance(ativos, pd.DataFrame):
+            return cls(ativos)
+        return cls(pd.DataFrame.from_records(list(ativos)) if len(ativos) else None)
+
+    @classmethod
+    def de_arquivo(cls, arquivo, nome=None):
+        """Lê uma fita de ativos em CSV (separador detectado) ou Excel."""
+        return cls(ler_planilha(arquivo, nome))
+
+    def __len__(self):
+        return len(self.dados)
+
+    def __getitem__(self, i):
+        ativo = {}
+        for coluna in COLUNAS:
+            valor = self.dados[coluna].iat[i]
+            if valor is None or valor != valor:
+                continue
+            ativo[coluna] = int(valor) if coluna in COLUNAS_INTEIRAS else valor if coluna in COLUNAS_TEXTO else float(valor)
+        return ativo
+
+    def __iter__(self):
+        return iter(self.para_registros())
+
+    def __eq__(self, outra):
+        return isinstance(outra, Carteira) and self.dados.equals(outra.dados)
+
+    def para_registros(self):
+        """Os mesmos dicionários de `carteira[i]` para todos os ativos, convertidos coluna a coluna."""
+        registros = [{} for _ in range(len(self))]
+        for coluna in COLUNAS:
+            serie = self.dados[coluna]
+            converter = int if coluna in COLUNAS_INTEIRAS else str if coluna in COLUNAS_TEXTO else float
+            for registro, valor, vazio in zip(registros, serie.tolist(), serie.isna().tolist()):
+                if not vazio:
+                    registro[coluna] = converter(valor)
+        return registros
+
+    def concatenar(self, outra):
+        return Carteira(pd.concat([self.dados, Carteira.de(outra).dados], ignore_index=True))
+
+    def subconjunto(self, linhas):
+        return Carteira._de_normalizado(self.dados.iloc[list(linhas)])
+
+    def com_valores(self, alteracoes):
+        """Cópia com [(linha, coluna, valor), ...] aplicados."""
+        dados = self.dados.copy()
+        for linha, coluna, valor in alteracoes:
+            dados.at[linha, coluna] = valor
+        return Carteira(dados)
+
+    def pagina(self, inicio, tamanho):
+        return self.dados.iloc[inicio:inicio + tamanho]
+
+    def aplicar_edicoes(self, inicio, tamanho, edicoes):
+        """Aplica as alterações de um editor de grade sobre a página [inicio, inicio + tamanho).
+
+        `edicoes` segue o formato do `st.data_editor`: {'edited_rows': {pos: {col: val}},
+        'added_rows': [{col: val}], 'deleted_rows': [pos]}, com posições relativas à
+        página. Linhas adicionadas entram no fim da página.
+        """
+        dados = self.dados.copy()
+        for posicao, campos in edicoes.get('edited_rows', {}).items():
+            for coluna, valor in campos.items():
+                if coluna in dados.columns:
+                    dados.at[inicio + int(posicao), coluna] = valor
+        dados = dados.drop(index=[inicio + int(p) for p in edicoes.get('deleted_rows', [])])
+        adicionadas = pd.DataFrame.from_records([{c: v for c, v in linha.items() if c in COLUNAS}
+                                                 for linha in edicoes.get('added_rows', [])], columns=COLUNAS)
+        fim = min(inicio + tamanho, len(self.dados))
+        partes = [parte for parte in (dados.loc[:fim - 1], adicionadas, dados.loc[fim:]) if len(parte)]
+        return Carteira(pd.concat(partes, ignore_index=True) if partes else None)
+
+    def validar(self):
+        """Erros de validação (linha, coluna, mensagem), verificados coluna a coluna."""
+        erros = []
+        dados = self.dados
+
+        def registrar(mascara, coluna, mensagem):
+            for linha in np.flatnonzero(mascara):
+                erros.append({'Linha': int(linha) + 1, 'Coluna': coluna, 'Mensagem': mensagem})
+
+        registrar(~dados['tipo'].isin(TIPOS), 'tipo', f"tipo deve ser um de {list(TIPOS)}")
+        for tipo, colunas in OBRIGATORIOS.items():
+            linhas = (dados['tipo'] == tipo).to_numpy()
+            for coluna in colunas:
+                registrar(linhas & dados[coluna].isna().to_numpy(), coluna, f"obrigatório para {tipo}")
+        for (tipo, coluna), permitidos in VALORES_PERMITIDOS.items():
+            linhas = (dados['tipo'] == tipo).to_numpy() & dados[coluna].notna().to_numpy()
+            registrar(linhas & ~dados[coluna].isin(permitidos).to_numpy(), coluna, f"deve ser um de {list(permitidos)}")
+        for coluna in COLUNAS_INTEIRAS:
+            valores = dados[coluna].to_numpy()
+            registrar(~np.isnan(valores) & (valores != np.round(valores)), coluna, "deve ser inteiro")
+        for coluna, minimo in MINIMOS.items():
+            registrar(dados[coluna].to_numpy() < minimo, coluna, f"deve ser maior ou igual a {minimo}")
+        for coluna, maximo in MAXIMOS.items():
+            registrar(dados[coluna].to_numpy() > maximo, coluna, f"deve ser menor ou igual a {maximo}")
+        sac = (dados['tipo'] == TIPO_CRI).to_numpy() & (dados['Amortizacao'] == 'SAC').to_numpy()
+        registrar(sac & (dados['Prazo'].to_numpy() <= dados['Carencia'].to_numpy()), 'Prazo',
+                  "deve ser maior que a carência na amortização SAC")
+        pulverizado = (dados['tipo'] == TIPO_CRI_PULVERIZADO).to_numpy() & dados['Arquivo Recebiveis'].notna().to_numpy()
+        sem_arquivo = np.zeros(len(dados), dtype=bool)
+        sem_arquivo[pulverizado] = [not os.path.isfile(c) for c in dados['Arquivo Recebiveis'][pulverizado]]
+        registrar(sem_arquivo, 'Arquivo Recebiveis', "fita de recebíveis não encontrada")
+        return pd.DataFrame(erros, columns=['Linha', 'Coluna', 'Mensagem'])
+
+    def arrays(self, tipo):
+        """Arrays tipados dos campos de uma classe de ativo e as posições das linhas na carteira."""
+        if ('arrays', tipo) not in self._memo:
+            self._memo['arrays', tipo] = self._extrair_arrays(tipo)
+        return self._memo['arrays', tipo]
+
+    def _extrair_arrays(self, tipo):
+        if tipo == TIPO_GENERICO:
+            # Tipos desconhecidos seguem o ativo genérico, como no motor original
+            mascara = ~self.dados['tipo'].isin([TIPO_IMOVEL, TIPO_CRI, TIPO_CRI_PULVERIZADO])
+        else:
+            mascara = self.dados['tipo'] == tipo
+        linhas = np.flatnonzero(mascara.to_numpy())
+        parte = self.dados.iloc[linhas]
+        arrays = {'posicao': linhas, 'Nome': parte['Nome'].to_numpy(dtype=object)}
+        for coluna in CAMPOS_POR_TIPO[tipo]:
+            if coluna in COLUNAS_INTEIRAS:
+                padrao = PADROES[tipo].get(coluna, 1)
+                arrays[coluna] = np.nan_to_num(parte[coluna].to_numpy(dtype=float), nan=padrao).astype(np.int64)
+            elif coluna in COLUNAS_DECIMAIS:
+                arrays[coluna] = np.nan_to_num(parte[coluna].to_numpy(dtype=float), nan=PADROES[tipo].get(coluna, 0.0))
+            else:
+                arrays[coluna] = parte[coluna].to_numpy(dtype=object)
+        return arrays
+
+    def hashes_linhas(self):
+        """Hash de 64 bits por ativo, para memorizar cronogramas linha a linha.
+
+        Nos CRIs pulverizados entra também a assinatura da fita de recebíveis,
+        conferida a cada chamada: trocar o arquivo invalida o cronograma.
+        """
+        if 'hashes' not in self._memo:
+            self._memo['hashes'] = pd.util.hash_pandas_object(self.dados, index=False).to_numpy()
+        pulverizados = np.flatnonzero((self.dados['tipo'] == TIPO_CRI_PULVERIZADO).to_numpy())
+        if len(pulverizados) == 0:
+            return self._memo['hashes']
+        assinaturas = [_assinatura_arquivo(c) for c in self.dados['Arquivo Recebiveis'].iloc[pulverizados]]
+        hashes = self._memo['hashes'].copy()
+        hashes[pulverizados] ^= pd.util.hash_array(np.array(assinaturas, dtype=object))
+        return hashes
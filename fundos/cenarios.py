@@ -0,0 +1,135 @@
+"""Simulação de Monte Carlo de CDI/IPCA com o motor em lote sobre o eixo de cenários."""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from fundos.curvas import taxas_das_curvas
+from fundos.indicadores import indicadores_investidor
+from fundos.motor import projetar_lote, taxa_mensal
+
+PERCENTIS_PADRAO = (5, 25, 50, 75, 95)
+# Cenários sorteados por semente filha, fixo para que a semente sozinha reproduza cada cenário
+CENARIOS_POR_SEMENTE = 100
+
+
+@dataclass
+class ModeloTaxas:
+    """Processos de Ornstein-Uhlenbeck correlacionados para CDI e IPCA em % a.a.
+
+    Os caminhos partem das projeções do fundo e revertem para elas com velocidade
+    `reversao` (por ano); as volatilidades são em pontos percentuais ao ano. Um
+    índice com curva em `parametros.curvas` reverte para a curva, mês a mês; o
+    IGP-M com curva própria soma a ela os desvios sorteados para o IPCA.
+    """
+    vol_cdi: float = 2.0
+    vol_ipca: float = 1.5
+    correlacao: float = 0.3
+    reversao: float = 0.5
+    piso_cdi: float = 0.0
+    piso_ipca: float = -10.0
+
+    def gerar(self, parametros, n_cenarios, rng):
+        """Taxas mensais por índice em matrizes (cenários, meses_total + 1)."""
+        meses_total = parametros.meses_total
+        dt = 1 / 12
+        persistencia = np.exp(-self.reversao * dt)
+        escala = np.sqrt((1 - persistencia**2) / (2 * self.reversao)) if self.reversao > 0 else np.sqrt(dt)
+        choque_cdi = rng.standard_normal((n_cenarios, meses_total))
+        choque_ipca = self.correlacao * choque_cdi + np.sqrt(1 - self.correlacao**2) * rng.standard_normal((n_cenarios, meses_total))
+
+        curvas = parametros.curvas or {}
+        tabela = taxas_das_curvas(parametros) if curvas else None
+        medias = {indice: np.full(meses_total + 1, float(plana)) if indice not in curvas else tabela.anual(indice) * 100
+                  for indice, plana in (('CDI', parametros.projecao_cdi), ('IPCA', parametros.projecao_ipca))}
+
+        caminhos = {}
+        desvios = {}
+        for indice, vol, choques, piso in (
+                ('CDI', self.vol_cdi, choque_cdi, self.piso_cdi),
+                ('IPCA', self.vol_ipca, choque_ipca, self.piso_ipca)):
+            media = medias[indice]
+            caminho = np.empty((n_cenarios, meses_total + 1))
+            caminho[:, 0] = media[0]
+            desvio = 0.0
+            for mes in range(1, meses_total + 1):
+                desvio = persistencia * desvio + vol * escala * choques[:, mes - 1]
+                caminho[:, mes] = media[mes] + desvio
+            desvios[indice] = caminho - media
+            caminhos[indice] = taxa_mensal(np.maximum(caminho, piso))
+        if 'IGP-M' in curvas:
+            caminhos['IGP-M'] = taxa_mensal(np.maximum(tabela.anual('IGP-M') * 100 + desvios['IPCA'], self.piso_ipca))
+        else:
+            caminhos['IGP-M'] = caminhos['IPCA']
+        return caminhos
+
+
+@dataclass
+class ResultadoMonteCarlo:
+    """Indicadores do investidor por cenário (vetores de tamanho n_cenarios)."""
+    indicadores: dict
+
+    @property
+    def n_cenarios(self):
+        return len(self.indicadores['TIR'])
+
+    def resumo(self, percentis=PERCENTIS_PADRAO):
+        """Média, percentis e fração de cenários válidos de cada indicador."""
+        linhas = {}
+        for nome, valores in self.indicadores.items():
+            validos = valores[~np.isnan(valores)]
+            estatisticas = {'Média': validos.mean() if len(validos) else np.nan}
+            for p in percentis:
+                estatisticas[f'P{p}'] = np.percentile(validos, p) if len(validos) else np.nan
+            estatisticas['% Cenários Válidos'] = len(validos) / len(valores) if len(valores) else np.nan
+            linhas[nome] = estatisticas
+        return pd.DataFrame(linhas)
+
+    def var(self, indicador='TIR', nivel=0.95):
+        """Valor do indicador no quantil (1 - nivel): o pior resultado esperado com a confiança dada."""
+        valores = self.indicadores[indicador]
+        valores = valores[~np.isnan(valores)]
+        return np.percentile(valores, (1 - nivel) * 100) if len(valores) else np.nan
+
+    def prob_abaixo(self, indicador, limite):
+        valores = self.indicadores[indicador]
+        return float(np.mean(valores < limite))
+
+
+def _taxas_cenarios(modelo, parametros, sementes, inicio, fim):
+    """Taxas dos cenários [inicio, fim): cada bloco de `CENARIOS_POR_SEMENTE` sai da sua semente filha."""
+    partes = []
+    for bloco in range(inicio // CENARIOS_POR_SEMENTE, (fim - 1) // CENARIOS_POR_SEMENTE + 1):
+        # O bloco é sorteado inteiro e recortado, para não depender de onde o lote começa ou termina
+        taxas = modelo.gerar(parametros, CENARIOS_POR_SEMENTE, np.random.default_rng(sementes[bloco]))
+        recorte = slice(max(inicio - bloco * CENARIOS_POR_SEMENTE, 0), min(fim - bloco * CENARIOS_POR_SEMENTE, CENARIOS_POR_SEMENTE))
+        segue_ipca = taxas['IGP-M'] is taxas['IPCA']
+        partes.append({indice: (taxa[recorte], segue_ipca) for indice, taxa in taxas.items()})
+    taxas = {indice: np.concatenate([p[indice][0] for p in partes]) for indice in ('CDI', 'IPCA')}
+    taxas['IGP-M'] = taxas['IPCA'] if all(p['IGP-M'][1] for p in partes) else np.concatenate([p['IGP-M'][0] for p in partes])
+    return taxas
+
+
+def simular_cenarios(parametros, ativos, despesas, aportes=(), amortizacoes=(), modelo=None,
+                     n_cenarios=10000, tamanho_lote=500, semente=None):
+    """Roda `n_cenarios` caminhos de taxas em lotes de `tamanho_lote` cenários.
+
+    Cada lote gera os seus caminhos, projeta o fundo em lote e guarda só os
+    indicadores, de modo que a memória fica limitada a lote x meses. O cenário k
+    depende só de `semente` e de k: `tamanho_lote` e `n_cenarios` não mudam os
+    cenários sorteados.
+    """
+    modelo = modelo if modelo is not None else ModeloTaxas()
+    sementes = np.random.SeedSequence(semente).spawn(int(np.ceil(n_cenarios / CENARIOS_POR_SEMENTE)))
+    partes = []
+    chute_tir = None
+    for inicio in range(0, n_cenarios, tamanho_lote):
+        taxas = _taxas_cenarios(modelo, parametros, sementes, inicio, min(inicio + tamanho_lote, n_cenarios))
+        lote = projetar_lote(parametros, ativos, despesas, aportes, amortizacoes, taxas)
+        parte = indicadores_investidor(lote.aportes, lote.amortizacoes, lote.dividendos, lote.pl_final, chute_tir)
+        partes.append(parte)
+        # A TIR mediana do lote anterior serve de partida a quente para o próximo
+        if np.isfinite(parte['TIR']).any():
+            chute_tir = (1 + np.nanmedian(parte['TIR']))**(1/12) - 1
+    indicadores = {nome: np.concatenate([parte[nome] for parte in partes]) for nome in partes[0]}
+    return ResultadoMonteCarlo(indicadores)
@@ -0,0 +1,150 @@
+"""Execução em lote, sem interface, de definições de fundos em JSON/YAML.
+
+Uso:
+    python -m fundos entradas/ outro_fundo.yaml --saida resultados --formato parquet --processos 8
+
+Para cada fundo grava o fluxo mensal, a DRE e os indicadores do investidor em
+`<saida>/<fundo>/` (com `--formato xlsx`, num único `fundo.xlsx` formatado), e ao final um `resumo` com uma linha por fundo e o tempo
+de cada execução. Com `--banco cenarios.db`, os fundos já projetados são lidos do
+banco de cenários e os novos são guardados nele.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from fundos.arquivos import carregar_definicoes, listar_arquivos
+from fundos.banco import BancoCenarios
+from fundos.exportacao import exportar_excel
+from fundos.relatorios import montar_dre, resumo_investidor
+
+FORMATOS = ('csv', 'parquet', 'xlsx')
+
+
+def _nome_pasta(texto):
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', texto).strip('_') or 'fundo'
+
+
+def gravar_tabela(df, caminho, formato):
+    """Grava `df` em CSV, Parquet ou Excel; o índice vira coluna para manter as datas/anos."""
+    if formato == 'xlsx':
+        df.to_excel(caminho.with_suffix('.xlsx'))
+    elif formato == 'parquet':
+        try:
+            df.to_parquet(caminho.with_suffix('.parquet'))
+        except ImportError as erro:
+            raise ImportError("Saída em Parquet requer o pacote 'pyarrow'") from erro
+    else:
+        df.to_csv(caminho.with_suffix('.csv'), encoding='utf-8')
+
+
+def processar_fundo(tarefa):
+    """Projeta um fundo e grava as suas tabelas. Roda dentro dos processos trabalhadores."""
+    definicao, origem, pasta, formato, banco = tarefa
+    inicio = time.perf_counter()
+    linha = {'Fundo': definicao.parametros.nome_fundo, 'Arquivo': origem, 'Pasta': str(pasta)}
+    try:
+        if banco:
+            with BancoCenarios(banco) as banco_cenarios:
+                resultado, linha['Do Banco'] = banco_cenarios.projetar(definicao)
+        else:
+            resultado = definicao.projetar()
+        resumo = resumo_investidor(resultado)
+        pasta.mkdir(parents=True, exist_ok=True)
+        if formato == 'xlsx':
+            exportar_excel(pasta / 'fundo.xlsx', resultado)
+        else:
+            df = resultado.para_dataframe()
+            df.index.name = 'Data'
+            dre = montar_dre(df, resultado.nomes_despesas)
+            dre.index.name = 'Ano'
+            gravar_tabela(df, pasta / 'fluxo', formato)
+            gravar_tabela(dre, pasta / 'dre', formato)
+            gravar_tabela(pd.DataFrame([resumo]), pasta / 'indicadores', formato)
+        linha.update(resumo)
+        linha.update({'Meses': len(resultado.tabela) - 1, 'Ativos': len(definicao.ativos), 'Status': 'ok'})
+    except Exception as erro:  # um fundo inválido não deve derrubar o lote
+        linha.update({'Status': f"erro: {type(erro).__name__}: {erro}"})
+    linha['Tempo (ms)'] = (time.perf_counter() - inicio) * 1000
+    return linha
+
+
+def montar_tarefas(arquivos, saida, formato, banco=None):
+    """Tarefas por fundo e linhas de erro dos arquivos que não puderam ser lidos."""
+    tarefas, erros, usados = [], [], set()
+    for arquivo in arquivos:
+        try:
+            definicoes = carregar_definicoes(arquivo)
+        except Exception as erro:
+            erros.append({'Fundo': None, 'Arquivo': str(arquivo), 'Status': f"erro: {type(erro).__name__}: {erro}", 'Tempo (ms)': 0.0})
+            continue
+        for i, definicao in enumerate(definicoes):
+            nome = _nome_pasta(definicao.parametros.nome_fundo)
+            pasta, sufixo = nome, 2
+            while pasta in usados:
+                pasta, sufixo = f"{nome}_{sufixo}", sufixo + 1
+            usados.add(pasta)
+            tarefas.append((definicao, f"{arquivo}[{i}]", Path(saida) / pasta, formato, banco))
+    return tarefas, erros
+
+
+def executar_lote(tarefas, processos=None, progresso=None):
+    """Processa as tarefas em paralelo e devolve (linhas do resumo, segundos decorridos)."""
+    processos = processos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    linhas = []
+    if processos == 1 or len(tarefas) <= 1:
+        for tarefa in tarefas:
+            linhas.append(processar_fundo(tarefa))
+            if progresso:
+                progresso(len(linhas), len(tarefas), linhas[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            for futuro in as_completed([pool.submit(processar_fundo, tarefa) for tarefa in tarefas]):
+                linhas.append(futuro.result())
+                if progresso:
+                    progresso(len(linhas), len(tarefas), linhas[-1])
+    return linhas, time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fundos', description="Projeta em lote fundos definidos em JSON/YAML.")
+    parser.add_argument('entradas', nargs='+', help="Arquivos .json/.yaml/.yml ou diretórios com eles")
+    parser.add_argument('--saida', default='resultados', help="Diretório de saída (padrão: resultados)")
+    parser.add_argument('--formato', choices=FORMATOS, default='csv')
+    parser.add_argument('--processos', type=int, default=None, help="Processos trabalhadores (padrão: núcleos da máquina)")
+    parser.add_argument('--banco', default=None, help="Banco SQLite de cenários: lê os fundos já projetados e guarda os novos")
+    parser.add_argument('--silencioso', action='store_true', help="Não mostra o progresso por fundo")
+    args = parser.parse_args(argv)
+
+    arquivos = listar_arquivos(args.entradas)
+    if not arquivos:
+        parser.error("nenhum arquivo de definição encontrado")
+    tarefas, erros_leitura = montar_tarefas(arquivos, args.saida, args.formato, args.banco)
+    for linha in erros_leitura:
+        print(f"{linha['Arquivo']}: {linha['Status']}", file=sys.stderr)
+
+    def progresso(concluidos, total, linha):
+        if not args.silencioso:
+            print(f"[{concluidos}/{total}] {linha['Fundo']}: {linha['Status']} ({linha['Tempo (ms)']:.0f} ms)", file=sys.stderr)
+
+    linhas, decorrido = executar_lote(tarefas, args.processos, progresso)
+    Path(args.saida).mkdir(parents=True, exist_ok=True)
+    resumo = pd.DataFrame(erros_leitura + linhas).sort_values('Arquivo', ignore_index=True)
+    gravar_tabela(resumo, Path(args.saida) / 'resumo', args.formato)
+
+    erros = int((resumo['Status'] != 'ok').sum())
+    print(f"{len(linhas)} fundos em {decorrido:.2f} s ({len(linhas) / max(decorrido, 1e-9):.1f} fundos/s, "
+          f"{resumo['Tempo (ms)'].mean():.1f} ms/fundo em média), {erros} com erro", file=sys.stderr)
+    return 1 if erros else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Curvas de CDI, IPCA e IGP-M ao longo do prazo do fundo e as tabelas de fatores dos índices.
+
+Uma curva é um dicionário guardado em `ParametrosFundo.curvas`, por índice:
+
+    {'CDI': {'tipo': 'estrutura', 'pontos': [[6, 10.75], [12, 10.4], [36, 9.9]]},
+     'IGP-M': {'tipo': 'forward', 'pontos': [[1, 5.0], [24, 4.0]]}}
+
+Os pontos são (mês, taxa em % a.a.). Em `'estrutura'` as taxas são à vista
+(do início do fundo até o mês) e a curva é interpolada com forward constante
+entre os vértices (linear no log do fator acumulado), repetindo a última
+forward depois do último vértice. Em `'forward'` as taxas já são as de cada
+mês, interpoladas linearmente e constantes fora dos pontos. Índices sem curva
+ficam planos em `projecao_cdi`/`projecao_ipca`, e o IGP-M sem curva segue o IPCA.
+
+A projeção calcula as taxas mensais uma vez e as entrega numa `TabelaIndices`,
+que também guarda, por índice, o log do fator acumulado e a taxa anual
+equivalente de cada mês: os ativos leem acúmulos e anualizações dessas
+tabelas, em vez de refazê-los por ativo.
+"""
+import dataclasses
+
+import numpy as np
+import pandas as pd
+
+from fundos.carteira import ler_planilha
+
+INDICES = ('CDI', 'IPCA', 'IGP-M')
+TIPOS_CURVA = {'estrutura': "Estrutura a termo (taxas à vista)", 'forward': "Forward mensal"}
+
+
+def _pontos(curva, indice):
+    if curva.get('tipo', 'estrutura') not in TIPOS_CURVA:
+        raise ValueError(f"Curva de {indice}: tipo '{curva.get('tipo')}' desconhecido; use {sorted(TIPOS_CURVA)}")
+    pontos = np.asarray(curva.get('pontos', []), dtype=float).reshape(-1, 2)
+    pontos = pontos[~np.isnan(pontos).any(axis=1)]
+    if len(pontos) == 0:
+        raise ValueError(f"Curva de {indice} sem pontos")
+    if (pontos[:, 0] < 0).any() or (pontos[:, 1] <= -100).any():
+        raise ValueError(f"Curva de {indice}: meses devem ser >= 0 e taxas maiores que -100% a.a.")
+    meses, posicoes = np.unique(pontos[:, 0], return_index=True)
+    if len(meses) < len(pontos):
+        raise ValueError(f"Curva de {indice}: mês repetido nos pontos")
+    return meses, pontos[posicoes, 1]
+
+
+def curva_mensal(curva, meses_total, indice=''):
+    """Taxas mensais (decimais) da curva, vetor (meses_total + 1); o mês 0 repete a taxa do mês 1."""
+    meses, taxas = _pontos(curva, indice)
+    grade = np.arange(meses_total + 1, dtype=float)
+    if curva.get('tipo', 'estrutura') == 'forward':
+        mensal = (1 + np.interp(grade, meses, taxas) / 100.0)**(1/12) - 1
+    else:
+        # Log do fator acumulado em cada vértice, com o início do fundo (mês 0, fator 1) como vértice extra
+        log_fator = meses / 12 * np.log1p(taxas / 100.0)
+        if meses[0] > 0:
+            meses, log_fator = np.append(0.0, meses), np.append(0.0, log_fator)
+        if len(meses) == 1:
+            # Um único vértice no mês 0: a taxa dele vale para todo o prazo
+            log_fator = np.append(log_fator, np.log1p(taxas[0] / 100.0))
+            meses = np.append(meses, 12.0)
+        inclinacao_final = (log_fator[-1] - log_fator[-2]) / (meses[-1] - meses[-2])
+        acumulado = np.interp(grade, meses, log_fator)
+        depois = grade > meses[-1]
+        acumulado[depois] = log_fator[-1] + (grade[depois] - meses[-1]) * inclinacao_final
+        mensal = np.empty(meses_total + 1)
+        mensal[1:] = np.expm1(np.diff(acumulado))
+    mensal[0] = mensal[min(1, meses_total)]
+    return mensal
+
+
+def validar_curvas(curvas):
+    """Levanta ValueError se algum índice ou curva for inválido."""
+    desconhecidos = set(curvas) - set(INDICES)
+    if desconhecidos:
+        raise ValueError(f"Curvas de índices desconhecidos: {sorted(desconhecidos)}; use {list(INDICES)}")
+    for indice, curva in curvas.items():
+        _pontos(curva, indice)
+
+
+def ler_curvas(arquivo, tipo='forward', data_inicio=None, nome=None):
+    """Curvas de um CSV/Excel com uma coluna 'Mês' (ou 'Data') e uma coluna em % a.a. por índice.
+
+    Com 'Data', o mês é contado a partir de `data_inicio`. Células vazias são
+    ignoradas, então cada índice pode ter os seus próprios vértices.
+    """
+    tabela = ler_planilha(arquivo, nome)
+    tabela.columns = [str(c).strip() for c in tabela.columns]
+    if 'Mês' in tabela.columns:
+        meses = pd.to_numeric(tabela['Mês'], errors='coerce')
+    elif 'Data' in tabela.columns:
+        if data_inicio is None:
+            raise ValueError("Curvas com coluna 'Data' precisam da data de início do fundo")
+        datas = pd.to_datetime(tabela['Data'], dayfirst=True, errors='coerce')
+        inicio = pd.Timestamp(data_inicio)
+        meses = (datas.dt.year - inicio.year) * 12 + (datas.dt.month - inicio.month)
+    else:
+        raise ValueError("O arquivo de curvas precisa de uma coluna 'Mês' ou 'Data'")
+    indices = [c for c in tabela.columns if c in INDICES]
+    if not indices:
+        raise ValueError(f"Nenhuma coluna de índice no arquivo de curvas; use {list(INDICES)}")
+    curvas = {}
+    for indice in indices:
+        taxas = pd.to_numeric(tabela[indice], errors='coerce')
+        validos = meses.notna() & taxas.notna()
+        curvas[indice] = {'tipo': tipo, 'pontos': [[int(m), float(t)] for m, t in zip(meses[validos], taxas[validos])]}
+    validar_curvas(curvas)
+    return curvas
+
+
+def taxas_das_curvas(parametros):
+    """Taxas mensais por índice (vetores meses_total + 1) a partir das curvas e projeções do fundo."""
+    curvas = parametros.curvas or {}
+    validar_curvas(curvas)
+    forma = parametros.meses_total + 1
+    taxas = {}
+    for indice, plana in (('CDI', parametros.projecao_cdi), ('IPCA', parametros.projecao_ipca)):
+        taxas[indice] = (curva_mensal(curvas[indice], parametros.meses_total, indice) if indice in curvas
+                         else np.full(forma, float((1 + plana / 100.0)**(1/12) - 1)))
+    taxas['IGP-M'] = curva_mensal(curvas['IGP-M'], parametros.meses_total, 'IGP-M') if 'IGP-M' in curvas else taxas['IPCA']
+    return TabelaIndices(taxas)
+
+
+def taxas_de_curvas(parametros, conjuntos):
+    """Taxas (cenários, meses_total + 1) para `projetar_lote`, um cenário por conjunto de curvas ({índice: curva}).
+
+    Cada conjunto substitui só as curvas que traz; os demais índices seguem as do fundo.
+    """
+    por_cenario = [taxas_das_curvas(dataclasses.replace(parametros, curvas={**(parametros.curvas or {}), **curvas}))
+                   for curvas in conjuntos]
+    taxas = {indice: np.stack([t[indice] for t in por_cenario]) for indice in ('CDI', 'IPCA')}
+    segue_ipca = all(t['IGP-M'] is t['IPCA'] for t in por_cenario)
+    taxas['IGP-M'] = taxas['IPCA'] if segue_ipca else np.stack([t['IGP-M'] for t in por_cenario])
+    return TabelaIndices(taxas)
+
+
+def curvas_anuais(parametros):
+    """DataFrame (mês x índice) das taxas forward de cada mês em % a.a., para exibir as curvas."""
+    taxas = taxas_das_curvas(parametros)
+    return pd.DataFrame({indice: taxas.anual(indice) * 100 for indice in INDICES}).rename_axis('Mês')
+
+
+class TabelaIndices(dict):
+    """Taxas mensais por índice (vetores ou matrizes cenários x meses) com tabelas derivadas calculadas uma vez.
+
+    `log_fator(indice)[..., m]` é o log do fator acumulado do índice do mês 0 ao
+    mês m e `anual(indice)` a taxa anual equivalente à de cada mês. Índices que
+    apontam para o mesmo array (IGP-M seguindo o IPCA) dividem as tabelas.
+    """
+
+    def __init__(self, taxas=()):
+        super().__init__(taxas)
+        self._derivadas = {}
+
+    @classmethod
+    def de(cls, taxas):
+        return taxas if isinstance(taxas, cls) else cls(taxas)
+
+    def _derivada(self, nome, indice, calcular):
+        taxa = self[indice]
+        chave = (nome, id(taxa))
+        if chave not in self._derivadas:
+            # Guarda o array junto para que o id não seja reaproveitado por outro objeto
+            self._derivadas[chave] = (taxa, calcular(np.asarray(taxa, dtype=float)))
+        return self._derivadas[chave][1]
+
+    def log_fator(self, indice):
+        def calcular(taxa):
+            log_fator = np.cumsum(np.log1p(taxa), axis=-1)
+            return log_fator - log_fator[..., :1]
+        return self._derivada('log_fator', indice, calcular)
+
+    def anual(self, indice):
+        return self._derivada('anual', indice, lambda taxa: (1 + taxa)**12 - 1)
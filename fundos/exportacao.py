@@ -0,0 +1,212 @@
+"""Exportação dos resultados para Excel (xlsxwriter) e Parquet.
+
+O Excel é escrito em modo de memória constante: cada linha sai direto da tabela
+do resultado, na ordem, sem montar DataFrames formatados. Vários cenários
+podem ir para o mesmo arquivo: no Excel, uma aba de indicadores lado a lado e
+abas de fluxo e DRE por cenário; no Parquet, um único arquivo por tabela com a
+coluna 'Cenário', gravado um cenário por vez.
+"""
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fundos.motor import COLUNAS_DERIVADAS, ResultadoProjecao
+from fundos.perfil import etapa
+from fundos.relatorios import montar_dre, resumo_investidor
+
+FORMATOS_INDICADORES = {'TIR': 'pct', 'MOIC': 'multiplo', 'DPI': 'multiplo', 'RVPI': 'multiplo',
+                        'Payback (meses)': 'inteiro', 'Total Investido': 'moeda', 'Total Distribuído': 'moeda',
+                        'PL Final': 'moeda'}
+
+
+def _como_dict(resultados):
+    """Aceita um `ResultadoProjecao` ou {nome do cenário: ResultadoProjecao}."""
+    if isinstance(resultados, ResultadoProjecao):
+        return {resultados.parametros.nome_fundo: resultados}
+    return dict(resultados)
+
+
+def _nome_aba(texto, usados):
+    """Nome de aba válido no Excel (até 31 caracteres, sem []:*?/\\) e único no arquivo."""
+    base = re.sub(r'[\[\]:*?/\\]', '_', str(texto))[:31] or 'Aba'
+    nome, sufixo = base, 2
+    while nome.lower() in usados:
+        nome = f"{base[:31 - len(str(sufixo)) - 1]}~{sufixo}"
+        sufixo += 1
+    usados.add(nome.lower())
+    return nome
+
+
+def _formatos(livro):
+    return {
+        'cabecalho': livro.add_format({'bold': True, 'bg_color': '#DDEBF7', 'border': 1, 'text_wrap': True, 'valign': 'top'}),
+        'grupo': livro.add_format({'bold': True, 'bg_color': '#BDD7EE', 'border': 1}),
+        'secao': livro.add_format({'bold': True, 'italic': True}),
+        'moeda': livro.add_format({'num_format': '#,##0;[Red]-#,##0'}),
+        'pct': livro.add_format({'num_format': '0.00%'}),
+        'multiplo': livro.add_format({'num_format': '0.00"x"'}),
+        'inteiro': livro.add_format({'num_format': '0'}),
+        'data': livro.add_format({'num_format': 'mmm/yyyy'}),
+    }
+
+
+def _escrever_fluxo(aba, resultado, formatos):
+    visao = resultado.visao_exibicao()
+    colunas = [('Período', 'Data')] + list(visao.columns)
+    aba.set_column(0, 0, 10, formatos['data'])
+    aba.set_column(1, 1, 6, formatos['inteiro'])
+    aba.set_column(2, len(colunas) - 2, 14, formatos['moeda'])
+    aba.set_column(len(colunas) - 1, len(colunas) - 1, 6, formatos['inteiro'])
+    grupo_anterior = None
+    for j, (grupo, serie) in enumerate(colunas):
+        if grupo != grupo_anterior:
+            aba.write_string(0, j, grupo, formatos['grupo'])
+            grupo_anterior = grupo
+        aba.write_string(1, j, serie, formatos['cabecalho'])
+    aba.freeze_panes(2, 2)
+
+    # Uma cópia em ordem de linha da parte numérica; o resto sai linha a linha para o arquivo
+    valores = np.ascontiguousarray(resultado.tabela[:, :len(colunas) - 3])
+    datas = visao.index.to_pydatetime()
+    anos = visao.index.year
+    with etapa('Excel: linhas do fluxo', 'exportação', linhas=len(valores), colunas=len(colunas)):
+        for i in range(len(valores)):
+            aba.write_row(i + 2, 0, [datas[i], i, *valores[i].tolist(), int(anos[i])])
+
+
+def _escrever_dre(aba, dre, formatos):
+    aba.set_column(0, 0, 42)
+    aba.set_column(1, len(dre.index), 14, formatos['moeda'])
+    aba.write_row(0, 0, ['Linha', *[int(ano) for ano in dre.index]], formatos['cabecalho'])
+    aba.freeze_panes(1, 1)
+    for i, (linha, valores) in enumerate(dre.items(), start=1):
+        if valores.isna().all():
+            aba.write_string(i, 0, linha, formatos['secao'])
+            continue
+        aba.write_string(i, 0, linha)
+        aba.write_row(i, 1, [None if np.isnan(v) else float(v) for v in valores.to_numpy(dtype=float)])
+
+
+def _escrever_indicadores(aba, resumos, formatos):
+    nomes = list(resumos)
+    aba.set_column(0, 0, 22)
+    aba.set_column(1, len(nomes), 18)
+    aba.write_row(0, 0, ['Indicador', *nomes], formatos['cabecalho'])
+    aba.freeze_panes(1, 1)
+    indicadores = list(dict.fromkeys(chave for resumo in resumos.values() for chave in resumo))
+    for i, indicador in enumerate(indicadores, start=1):
+        aba.write_string(i, 0, indicador)
+        formato = formatos.get(FORMATOS_INDICADORES.get(indicador))
+        for j, nome in enumerate(nomes, start=1):
+            valor = resumos[nome].get(indicador)
+            if isinstance(valor, (bool, np.bool_)):
+                aba.write_boolean(i, j, bool(valor))
+            elif isinstance(valor, (int, float, np.number)):
+                aba.write_number(i, j, float(valor), formato)
+            elif valor is not None:
+                aba.write_string(i, j, str(valor))
+
+
+def exportar_excel(destino, resultados):
+    """Grava fluxo, DRE e indicadores do investidor num Excel formatado, com várias abas.
+
+    `destino` é um caminho ou um arquivo binário aberto (ex.: `BytesIO`); com vários cenários, a aba 'Indicadores' os coloca
+    lado a lado e cada cenário ganha as suas abas de fluxo e DRE.
+    """
+    try:
+        import xlsxwriter
+    except ImportError as erro:
+        raise ImportError("Exportação para Excel requer o pacote 'xlsxwriter'") from erro
+    resultados = _como_dict(resultados)
+    varios = len(resultados) > 1
+    livro = xlsxwriter.Workbook(destino if hasattr(destino, 'write') else str(destino), {'constant_memory': True, 'nan_inf_to_errors': True})
+    try:
+        formatos = _formatos(livro)
+        usados = set()
+        # Em memória constante as abas são gravadas inteiras, uma por vez e na ordem de criação
+        _escrever_indicadores(livro.add_worksheet(_nome_aba('Indicadores', usados)),
+                              {nome: resumo_investidor(r) for nome, r in resultados.items()}, formatos)
+        for i, (nome, resultado) in enumerate(resultados.items(), start=1):
+            # O número do cenário vem antes do nome para sobreviver ao corte em 31 caracteres
+            _escrever_fluxo(livro.add_worksheet(_nome_aba(f"{i} Fluxo {nome}" if varios else 'Fluxo', usados)),
+                            resultado, formatos)
+            dre = montar_dre(resultado.para_dataframe(), resultado.nomes_despesas)
+            _escrever_dre(livro.add_worksheet(_nome_aba(f"{i} DRE {nome}" if varios else 'DRE', usados)), dre, formatos)
+    finally:
+        livro.close()
+    return destino
+
+
+def _gravar_parquet(caminho, colunas, tabelas):
+    """Grava (cenário, DataFrame) num único Parquet, um grupo de linhas por cenário.
+
+    `colunas` é a união das colunas de todos os cenários; quem não tem uma delas
+    a grava vazia. As tabelas chegam uma a uma, sem juntar todos os cenários em memória.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    try:
+        for cenario, df in tabelas:
+            df = df.reindex(columns=colunas)
+            df.insert(0, 'Cenário', cenario)
+            with etapa('Parquet: conversão para Arrow', 'exportação', linhas=len(df), colunas=df.shape[1]):
+                tabela = pa.Table.from_pandas(df, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho, tabela.schema)
+            escritor.write_table(tabela.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def _colunas_ativos_por_nome(resultado):
+    """{'Ativo_i_Volume': 'Ativo: <nome>_Volume', ...}; nomes repetidos ganham o sufixo ' (2)', ' (3)'..."""
+    renomear, vistos = {}, {}
+    for i, nome in enumerate(resultado.nomes_ativos, start=1):
+        vistos[nome] = vistos.get(nome, 0) + 1
+        rotulo = f"Ativo: {nome}" + (f" ({vistos[nome]})" if vistos[nome] > 1 else '')
+        renomear[f'Ativo_{i}_Volume'] = f'{rotulo}_Volume'
+        renomear[f'Ativo_{i}_Rend_R$'] = f'{rotulo}_Rend_R$'
+    return renomear
+
+
+def exportar_parquet(pasta, resultados):
+    """Grava `fluxo.parquet`, `dre.parquet` e `indicadores.parquet` em `pasta`, com a coluna 'Cenário'.
+
+    No fluxo as colunas dos ativos levam o nome do ativo, não a posição, para que
+    cenários com carteiras diferentes não misturem ativos distintos na mesma coluna.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as erro:
+        raise ImportError("Exportação para Parquet requer o pacote 'pyarrow'") from erro
+    resultados = _como_dict(resultados)
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    def fluxos():
+        for nome, resultado in resultados.items():
+            df = resultado.para_dataframe().rename(columns=_colunas_ativos_por_nome(resultado))
+            df.insert(0, 'Data', df.index)
+            yield nome, df
+
+    def dres():
+        for nome, resultado in resultados.items():
+            dre = montar_dre(resultado.para_dataframe(), resultado.nomes_despesas)
+            dre.insert(0, 'Ano', dre.index)
+            yield nome, dre
+
+    series = dict.fromkeys(_colunas_ativos_por_nome(r).get(c, c) for r in resultados.values() for c in r.nomes_colunas()
+                           if c not in COLUNAS_DERIVADAS)
+    colunas_fluxo = ['Data', 'Mês', *series, 'Ano', *COLUNAS_DERIVADAS]
+    _gravar_parquet(pasta / 'fluxo.parquet', colunas_fluxo, fluxos())
+    # A DRE tem poucas linhas por cenário; basta montá-las todas para unir as colunas
+    tabelas_dre = list(dres())
+    _gravar_parquet(pasta / 'dre.parquet', list(dict.fromkeys(c for _, dre in tabelas_dre for c in dre.columns)), tabelas_dre)
+    indicadores = pd.DataFrame([{'Cenário': nome, **resumo_investidor(r)} for nome, r in resultados.items()])
+    indicadores.to_parquet(pasta / 'indicadores.parquet', index=False)
+    return pasta
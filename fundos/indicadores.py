@@ -0,0 +1,57 @@
+"""Indicadores do investidor (TIR, MOIC, DPI, RVPI e payback), escalares ou em lote."""
+import numpy as np
+
+from fundos.perfil import etapa
+from fundos.tir import anualizar, tir_lote
+
+
+def fluxo_investidor(aportes, amortizacoes, dividendos, pl_final):
+    """Fluxo mensal do investidor, com o PL final somado ao último mês."""
+    fluxo = np.atleast_2d(amortizacoes + dividendos - aportes).astype(float)
+    fluxo = np.broadcast_to(fluxo, np.broadcast_shapes(fluxo.shape, np.shape(pl_final))).copy()
+    fluxo[:, -1] += np.atleast_2d(pl_final)[:, -1]
+    return fluxo
+
+
+def tir_investidor(aportes, amortizacoes, dividendos, pl_final, chute_tir=None):
+    """Solução completa (`ResultadoTIR`, taxa mensal) do fluxo do investidor."""
+    fluxo = fluxo_investidor(aportes, amortizacoes, dividendos, pl_final)
+    with etapa('TIR', 'tir', linhas=fluxo.shape[0], colunas=fluxo.shape[1]):
+        return tir_lote(fluxo, chute=chute_tir)
+
+
+def tir_acumulada(aportes, amortizacoes, dividendos, pl_final):
+    """TIR anual até cada mês t, com o PL de t como valor residual; NaN enquanto o fluxo não tem solução."""
+    fluxo = np.asarray(amortizacoes + dividendos - aportes, dtype=float)
+    n = len(fluxo)
+    # Uma linha por mês de corte: o fluxo até ele (os zeros depois não mudam a TIR) mais o PL daquele mês
+    cortes = np.tril(np.broadcast_to(fluxo, (n, n)))
+    cortes[np.arange(n), np.arange(n)] += pl_final
+    with etapa('TIR acumulada', 'tir', linhas=n, colunas=n):
+        return anualizar(tir_lote(cortes).taxa)
+
+
+def indicadores_investidor(aportes, amortizacoes, dividendos, pl_final, chute_tir=None, solucao_tir=None):
+    """Indicadores por cenário. Aceita vetores (meses) ou matrizes (cenários x meses).
+
+    `chute_tir` é a TIR mensal usada como partida a quente do solver; `solucao_tir`
+    reaproveita um `ResultadoTIR` já calculado para o mesmo fluxo.
+    """
+    dividendos, pl_final = np.atleast_2d(dividendos), np.atleast_2d(pl_final)
+    distribuicoes = amortizacoes + dividendos
+    total_investido = np.sum(aportes)
+    total_distribuido = distribuicoes.sum(axis=1)
+    pl_residual = pl_final[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        moic = np.where(total_investido != 0, (total_distribuido + pl_residual) / total_investido, 0.0)
+        dpi = np.where(total_investido != 0, total_distribuido / total_investido, 0.0)
+        rvpi = np.where(total_investido != 0, pl_residual / total_investido, 0.0)
+
+    acumulado = np.cumsum(distribuicoes - aportes, axis=1)
+    atingiu = acumulado >= 0
+    payback = np.where(atingiu.any(axis=1), atingiu.argmax(axis=1), np.nan)
+
+    if solucao_tir is None:
+        solucao_tir = tir_investidor(aportes, amortizacoes, dividendos, pl_final, chute_tir)
+    tir = anualizar(solucao_tir.taxa)
+    return {'TIR': tir, 'MOIC': moic, 'DPI': dpi, 'RVPI': rvpi, 'Payback (meses)': payback}
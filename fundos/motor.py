@@ -0,0 +1,679 @@
+"""Motor de projeção do fundo, independente do Streamlit.
+
+Os cronogramas dos ativos (genérico, imóvel, CRI e CRI pulverizado) não
+dependem do estado do fundo, então são calculados de uma vez como matrizes
+ativos x meses, uma classe de ativo por vez sobre os arrays tipados da
+`Carteira`. Só o caixa e o acúmulo de lucro para dividendos, que dependem do
+mês anterior, rodam em laço.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import numpy_financial as npf
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from fundos.carteira import TIPO_CRI, TIPO_CRI_PULVERIZADO, TIPO_GENERICO, TIPO_IMOVEL, Carteira
+from fundos.curvas import TabelaIndices, taxas_das_curvas
+from fundos.perfil import etapa
+from fundos.recebiveis import carregar_recebiveis, cascata
+
+FREQUENCIA_MESES = {'Mensal': 1, 'Semestral': 6, 'Anual': 12}
+
+
+def taxa_mensal(taxa_anual_pct):
+    """Converte uma taxa em % a.a. para a taxa mensal equivalente (decimal)."""
+    return (1 + np.asarray(taxa_anual_pct, dtype=float) / 100.0)**(1/12) - 1
+
+
+@dataclass
+class ParametrosFundo:
+    """Parâmetros gerais coletados nas abas de configuração."""
+    nome_fundo: str = "Fundo"
+    data_inicio: date = date(2024, 1, 1)
+    duracao_anos: int = 10
+    aporte_inicial: float = 10000000.0
+    projecao_cdi: float = 10.0
+    projecao_ipca: float = 4.5
+    calc_dividendos: bool = True
+    dist_percentual: float = 95.0
+    dist_frequencia: str = 'Semestral'
+    calc_performance: bool = True
+    perf_benchmark: str = 'CDI'
+    perf_spread: float = 0.0
+    perf_percentual: float = 20.0
+    perf_carencia: int = 12
+    perf_periodo: str = 'Anual'
+    perf_hwm: bool = True
+    # Curvas por índice (ver `fundos.curvas`); índices sem curva usam as projeções planas acima
+    curvas: dict = field(default_factory=dict)
+
+    @property
+    def meses_total(self):
+        return int(self.duracao_anos) * 12
+
+
+@dataclass
+class DefinicaoFundo:
+    """Tudo o que a interface coleta: parâmetros gerais, a carteira de ativos e as listas de despesas e eventos.
+
+    `ativos` pode ser uma `Carteira` ou a lista de dicionários equivalente.
+    """
+    parametros: ParametrosFundo = field(default_factory=ParametrosFundo)
+    ativos: list = field(default_factory=list)
+    despesas: list = field(default_factory=list)
+    aportes: list = field(default_factory=list)
+    amortizacoes: list = field(default_factory=list)
+
+    def entradas(self):
+        return self.parametros, self.ativos, self.despesas, self.aportes, self.amortizacoes
+
+    def projetar(self):
+        return projetar_fundo(*self.entradas())
+
+
+@dataclass
+class CronogramaAtivo:
+    """Vetores mensais (meses_total + 1) de um ativo, ou matrizes (ativos, meses_total + 1) de um grupo."""
+    volume: np.ndarray
+    rendimento: np.ndarray
+    perda: np.ndarray
+    investimento: np.ndarray
+
+
+# Colunas da tabela de resultados, na ordem do fluxo mensal: as séries do fundo, depois
+# volume/rendimento de cada ativo, as despesas e por fim as colunas derivadas
+COLUNAS_FUNDO = ['PL Início', '(+) Aportes', '(-) Amortizações', '(-) Dividendos', 'Caixa_Volume', 'Caixa_Rend_R$',
+                 'Total Despesas', 'PL Final', '(-) Taxa de Performance', '(-) Perdas em Ativos']
+COLUNAS_DERIVADAS = ['Ativos_Volume', 'Ativos_Rend_R$', 'Rend. Pré-Desp_R$', 'Rend. Pós-Desp_R$',
+                     'Ativos_% Alocado', 'Caixa_% Alocado']
+GRUPOS_EXIBICAO = {
+    'PL Início': ('Geral', 'PL Início'), '(+) Aportes': ('Geral', '(+) Aportes'),
+    '(-) Amortizações': ('Geral', '(-) Amortizações'), '(-) Dividendos': ('Geral', '(-) Dividendos'),
+    'Caixa_Volume': ('Caixa', 'Volume'), 'Caixa_Rend_R$': ('Caixa', 'Rend R$'), 'Total Despesas': ('Despesas', 'Total'),
+    'PL Final': ('Geral', 'PL Final'), '(-) Taxa de Performance': ('Despesas', 'Performance'),
+    '(-) Perdas em Ativos': ('Resultado', '(-) Perdas'),
+}
+
+
+def _coluna(indice):
+    return property(lambda self: self.tabela[:, indice])
+
+
+@dataclass
+class ResultadoProjecao:
+    """Saída do motor numa única tabela pré-alocada (meses + 1, colunas), em ordem de coluna.
+
+    As séries (`aportes`, `pl_final`, `ativos_volume`, ...) são vistas dessa tabela,
+    e os DataFrames de `para_dataframe` e `visao_exibicao` a embrulham sem copiar.
+    Despesas com o mesmo nome ocupam uma só coluna, com o valor da última.
+    """
+    parametros: ParametrosFundo
+    nomes_despesas: list
+    nomes_ativos: list
+    tabela: np.ndarray
+    investimentos: np.ndarray = field(default=None)
+
+    @classmethod
+    def alocar(cls, parametros, nomes_ativos, nomes_despesas, investimentos=None):
+        n_colunas = len(COLUNAS_FUNDO) + 2 * len(nomes_ativos) + len(dict.fromkeys(nomes_despesas)) + len(COLUNAS_DERIVADAS)
+        tabela = np.zeros((parametros.meses_total + 1, n_colunas), order='F')
+        return cls(parametros, list(nomes_despesas), list(nomes_ativos), tabela, investimentos)
+
+    pl_inicio = _coluna(0)
+    aportes = _coluna(1)
+    amortizacoes = _coluna(2)
+    dividendos = _coluna(3)
+    caixa_volume = _coluna(4)
+    caixa_rend = _coluna(5)
+    total_despesas = _coluna(6)
+    pl_final = _coluna(7)
+    taxa_performance = _coluna(8)
+    perdas = _coluna(9)
+
+    @property
+    def _inicio_despesas(self):
+        return len(COLUNAS_FUNDO) + 2 * len(self.nomes_ativos)
+
+    @property
+    def ativos_volume(self):
+        return self.tabela[:, len(COLUNAS_FUNDO):self._inicio_despesas:2]
+
+    @property
+    def ativos_rend(self):
+        return self.tabela[:, len(COLUNAS_FUNDO) + 1:self._inicio_despesas:2]
+
+    @property
+    def despesas(self):
+        """Despesas por nome único (meses + 1, despesas)."""
+        return self.tabela[:, self._inicio_despesas:self.tabela.shape[1] - len(COLUNAS_DERIVADAS)]
+
+    @property
+    def derivadas(self):
+        return self.tabela[:, self.tabela.shape[1] - len(COLUNAS_DERIVADAS):]
+
+    @property
+    def meses(self):
+        return np.arange(len(self.tabela))
+
+    def datas(self):
+        inicio = self.parametros.data_inicio
+        return pd.to_datetime([inicio + relativedelta(months=i) for i in range(len(self.tabela))])
+
+    def nomes_colunas(self):
+        nomes = list(COLUNAS_FUNDO)
+        for i in range(len(self.nomes_ativos)):
+            nomes += [f'Ativo_{i+1}_Volume', f'Ativo_{i+1}_Rend_R$']
+        return nomes + [f"(-) {nome}" for nome in dict.fromkeys(self.nomes_despesas)] + COLUNAS_DERIVADAS
+
+    def calcular_derivadas(self):
+        """Preenche as colunas derivadas a partir das séries já gravadas na tabela."""
+        ativos_volume, ativos_rend, pre_desp, pos_desp, ativos_pct, caixa_pct = self.derivadas.T
+        ativos_volume[:] = self.ativos_volume.sum(axis=1)
+        ativos_rend[:] = self.ativos_rend.sum(axis=1)
+        pre_desp[:] = ativos_rend + self.caixa_rend
+        pos_desp[:] = pre_desp - self.total_despesas
+        ativos_pct[:] = _razao_segura(ativos_volume, self.pl_final)
+        caixa_pct[:] = _razao_segura(self.caixa_volume, self.pl_final)
+
+    def para_dataframe(self):
+        """DataFrame mensal com os nomes de coluna usados pelas abas de resultado e pela DRE."""
+        with etapa('DataFrame do fluxo', 'tabelas', linhas=len(self.tabela), colunas=self.tabela.shape[1] + 2):
+            datas = self.datas()
+            df = pd.DataFrame(self.tabela, index=datas, columns=self.nomes_colunas(), copy=False)
+            df.insert(0, 'Mês', self.meses)
+            df.insert(df.shape[1] - len(COLUNAS_DERIVADAS), 'Ano', datas.year)
+        return df
+
+    def visao_exibicao(self):
+        """Fluxo com colunas em dois níveis (grupo, série) sobre a mesma tabela, sem as colunas derivadas."""
+        datas = self.datas()
+        colunas = [GRUPOS_EXIBICAO[nome] for nome in COLUNAS_FUNDO]
+        for nome in self.nomes_ativos:
+            grupo = f"Ativo: {str(nome).replace(' ', '_')}"
+            colunas += [(grupo, 'Volume'), (grupo, 'Rend R$')]
+        colunas += [('Despesas', f"(-) {nome}") for nome in dict.fromkeys(self.nomes_despesas)]
+        df = pd.DataFrame(self.tabela[:, :len(colunas)], index=datas, columns=pd.MultiIndex.from_tuples(colunas), copy=False)
+        df.insert(0, ('Período', 'Mês'), self.meses)
+        df.insert(df.shape[1], ('Período', 'Ano'), datas.year)
+        return df
+
+
+def _razao_segura(numerador, denominador):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        razao = np.where(denominador != 0, numerador / np.where(denominador != 0, denominador, 1), 0.0)
+    return np.nan_to_num(razao, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def taxas_mensais(parametros):
+    """Taxas mensais dos índices como vetores (meses_total + 1), numa `TabelaIndices`.
+
+    Vêm das curvas do fundo ou, sem curva, das projeções planas; o IGP-M sem
+    curva própria segue o IPCA. Os cronogramas aceitam também matrizes
+    (cenários, meses_total + 1) com o mesmo formato de dicionário.
+    """
+    return taxas_das_curvas(parametros)
+
+
+def _benchmark(taxas, usa_cdi, tabela=None):
+    """Taxa mensal do benchmark de cada ativo, ou a tabela `tabela` dele: (..., ativos, meses_total + 1)."""
+    cdi, ipca = (taxas['CDI'], taxas['IPCA']) if tabela is None else (tabela('CDI'), tabela('IPCA'))
+    return np.where(usa_cdi[:, np.newaxis], cdi[..., np.newaxis, :], ipca[..., np.newaxis, :])
+
+
+def cronogramas_genericos(arrays, taxas):
+    """Cronogramas dos ativos genéricos de uma vez, a partir dos arrays da classe."""
+    taxas = TabelaIndices.de(taxas)
+    meses_total = taxas['CDI'].shape[-1] - 1
+    meses = np.arange(meses_total + 1)
+    mes_inv = arrays['Mês Investimento'][:, np.newaxis]
+    valor = arrays['Valor'][:, np.newaxis]
+    valido = (mes_inv >= 1) & (mes_inv <= meses_total)
+    spread_mensal = taxa_mensal(arrays['Spread'])[:, np.newaxis]
+    usa_cdi = arrays['Benchmark'] == 'CDI'
+    taxa_ativo = (1 + _benchmark(taxas, usa_cdi)) * (1 + spread_mensal) - 1
+
+    # O acúmulo desde o investimento sai da tabela de fatores do benchmark (diferença de logs) mais o
+    # spread composto; fator 1 fora do período rendendo, que só começa no mês seguinte ao investimento
+    rende = valido & (valor > 0) & (meses > mes_inv)
+    log_bench = _benchmark(taxas, usa_cdi, taxas.log_fator)
+    inicio = np.broadcast_to(np.clip(mes_inv, 0, meses_total), log_bench.shape[:-1] + (1,))
+    log_acum = log_bench - np.take_along_axis(log_bench, inicio, axis=-1) + (meses - mes_inv) * np.log1p(spread_mensal)
+    fator_acum = np.where(rende, np.exp(log_acum), 1.0)
+    volume = np.where(valido & (meses >= mes_inv), valor * fator_acum, 0.0)
+    rend = np.zeros(volume.shape)
+    rend[..., 1:] = np.where(rende[:, 1:], volume[..., :-1] * taxa_ativo[..., 1:], 0.0)
+    invest = np.where(valido & (meses == mes_inv), valor, 0.0)
+    return CronogramaAtivo(volume, rend, np.zeros(volume.shape), invest)
+
+
+def cronogramas_imoveis(arrays, taxas):
+    """Cronogramas dos imóveis de renda de uma vez, a partir dos arrays da classe."""
+    meses_total = taxas['CDI'].shape[-1] - 1
+    meses = np.arange(meses_total + 1)
+    mes_compra = arrays['Mês Compra'][:, np.newaxis]
+    valor = arrays['Valor Compra'][:, np.newaxis]
+    vacancia = arrays['Vacancia'][:, np.newaxis] / 100.0
+    custos = arrays['Custos Mensais'][:, np.newaxis]
+    outros_custos = arrays['Outros Custos % Receita'][:, np.newaxis] / 100.0
+    cap_rate = arrays['Cap Rate Saida']
+    comprado = (mes_compra >= 1) & (mes_compra <= meses_total)
+
+    # O aluguel só passa a valer no mês seguinte à compra e é reajustado a cada aniversário:
+    # o índice só entra no produto acumulado nos meses de aniversário
+    indice = np.where((arrays['Indice Reajuste'] == 'IPCA')[:, np.newaxis],
+                      taxas['IPCA'][..., np.newaxis, :], taxas['IGP-M'][..., np.newaxis, :])
+    alugado = comprado & (meses > mes_compra)
+    aniversario = alugado & ((meses - mes_compra) % 12 == 0)
+    patamar = np.cumprod(np.where(aniversario, 1 + indice * 12, 1.0), axis=-1)
+    aluguel = np.where(alugado, arrays['Receita Aluguel'][:, np.newaxis] * patamar, 0.0)
+    rend = np.where(meses >= np.maximum(mes_compra, 1),
+                    aluguel * (1 - vacancia) - (custos + aluguel * outros_custos), 0.0)
+
+    acumulado = np.cumsum(rend, axis=-1)
+    indice_compra = np.broadcast_to(np.clip(mes_compra, 0, meses_total), acumulado.shape[:-1] + (1,))
+    no_mes_compra = np.take_along_axis(acumulado, indice_compra, axis=-1)
+    volume = np.where(comprado & (meses >= mes_compra), valor + acumulado - no_mes_compra, 0.0)
+    volume = np.where((mes_compra < 1) & (meses >= 1), acumulado, volume)
+
+    noi_anual = (aluguel[..., -1] * (1 - vacancia[:, 0]) - custos[:, 0]) * 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rend[..., -1] += np.where(cap_rate > 0, noi_anual / (cap_rate / 100.0), 0.0)
+    volume[..., -1] = np.where(mes_compra[:, 0] == meses_total, valor[:, 0], 0.0)
+    invest = np.where(comprado & (meses == mes_compra), valor, 0.0)
+    return CronogramaAtivo(volume, rend, np.zeros(volume.shape), invest)
+
+
+def taxas_mensais_cri(arrays, taxas):
+    """Taxa de remuneração mensal (decimal) de cada CRI, mês a mês: (..., CRIs, meses_total + 1)."""
+    taxas = TabelaIndices.de(taxas)
+    taxa = arrays['Taxa'] / 100.0
+    taxa_fixa = taxa_mensal(taxa * 100)[:, np.newaxis]
+    usa_cdi = arrays['Benchmark'] != 'IPCA'
+    bench_mensal = _benchmark(taxas, usa_cdi)
+    # (1 + bench) * (1 + spread) ao ano equivale ao produto das taxas mensais
+    resultado = (1 + bench_mensal) * (1 + taxa_fixa) - 1
+    percentual = arrays['Tipo Taxa'] != 'Spread'
+    if percentual.any():
+        # % do benchmark incide sobre a taxa anual, lida da tabela do índice
+        bench_anual = _benchmark(taxas, usa_cdi[percentual], taxas.anual)
+        resultado[..., percentual, :] = (1 + bench_anual * taxa[percentual, np.newaxis])**(1/12) - 1
+    pre_fixado = arrays['Benchmark'] == 'Pré-fixado'
+    resultado[..., pre_fixado, :] = taxa_fixa[pre_fixado]
+    return resultado
+
+
+def _recorrencia_linear(saldo_inicial, fator, desconto):
+    """Resolve saldo_k = fator_k * saldo_{k-1} - desconto_k para todo k de uma vez (último eixo).
+
+    Linhas com fator acumulado não positivo caem no laço explícito.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        fator_acum = np.cumprod(fator, axis=-1)
+        saldos = fator_acum * (saldo_inicial - np.cumsum(desconto / fator_acum, axis=-1))
+        instavel = ~np.all((fator_acum > 0) & np.isfinite(fator_acum), axis=-1)
+    if instavel.any():
+        laco = np.empty(saldos.shape)
+        saldo = saldo_inicial[..., 0]
+        for k in range(saldos.shape[-1]):
+            saldo = fator[..., k] * saldo - desconto[..., k]
+            laco[..., k] = saldo
+        saldos = np.where(instavel[..., np.newaxis], laco, saldos)
+    return saldos
+
+
+def cronogramas_cri(arrays, taxas):
+    """Cronogramas dos CRIs de uma vez, a partir dos arrays da classe.
+
+    Cada CRI é resolvido em meses desde o investimento (eixo k) e depois lido de
+    volta no calendário do fundo.
+    """
+    forma = taxas['CDI'].shape
+    meses_total = forma[-1] - 1
+    meses = np.arange(meses_total + 1)
+    mes_inv, principal = arrays['Mês Investimento'], arrays['Principal']
+    valido = (mes_inv >= 1) & (mes_inv <= meses_total)
+    em_carteira = valido[:, np.newaxis] & (meses >= mes_inv[:, np.newaxis])
+    invest = np.where(em_carteira & (meses == mes_inv[:, np.newaxis]), principal[:, np.newaxis], 0.0)
+    volume = np.broadcast_to(np.where(em_carteira, principal[:, np.newaxis], 0.0), forma[:-1] + invest.shape).copy()
+    rend, perda = np.zeros(volume.shape), np.zeros(volume.shape)
+    ativos = np.flatnonzero(valido & (principal > 0) & (mes_inv < meses_total))
+    if len(ativos) == 0:
+        return CronogramaAtivo(volume, rend, perda, invest)
+
+    amortizacao = arrays['Amortizacao'][ativos]
+    prazo, carencia = arrays['Prazo'][ativos, np.newaxis], arrays['Carencia'][ativos, np.newaxis]
+    sac, price = (amortizacao == 'SAC')[:, np.newaxis], (amortizacao == 'Price')[:, np.newaxis]
+    invalidos = sac[:, 0] & (prazo[:, 0] - carencia[:, 0] <= 0)
+    if invalidos.any():
+        nome = arrays['Nome'][ativos][invalidos][0]
+        raise ValueError(f"CRI '{nome}': prazo deve ser maior que a carência na amortização SAC")
+
+    inicio = mes_inv[ativos, np.newaxis]
+    saldo_inicial = principal[ativos, np.newaxis]
+    n_meses = meses_total - inicio[:, 0]
+    k = np.arange(1, n_meses.max() + 1)
+    no_prazo_do_fundo = k <= n_meses[:, np.newaxis]
+    subconjunto = {campo: valores[ativos] for campo, valores in arrays.items()}
+    taxa_cri = taxas_mensais_cri(subconjunto, taxas)
+    taxa_inv = np.take_along_axis(taxa_cri, inicio[(np.newaxis,) * (len(forma) - 1)], axis=-1)
+    # Cada CRI passa para o eixo k por fatias; além do prazo do fundo a taxa fica zerada e não é lida
+    taxa_m = np.zeros(forma[:-1] + (len(ativos), len(k)))
+    for j, (mes, n) in enumerate(zip(inicio[:, 0], n_meses)):
+        taxa_m[..., j, :n] = taxa_cri[..., j, mes + 1:]
+    perda_m = taxa_mensal(arrays['Perda'][ativos])[:, np.newaxis]
+    perda_saldo = np.where((arrays['Tranche'][ativos] == 'Subordinada')[:, np.newaxis], perda_m, 0.0)
+
+    amortiza = k > carencia
+    fator = np.where(price & amortiza, (1 - perda_saldo) + taxa_m, 1 - perda_saldo)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        parcela_sac = saldo_inicial / np.where(sac, prazo - carencia, 1)
+        # A parcela Price é fixada no mês do investimento com a taxa vigente naquele mês
+        nper = prazo - carencia
+        pmt = np.where((taxa_inv > 0) & (nper > 0), npf.pmt(taxa_inv, np.maximum(nper, 1), -saldo_inicial), 0.0)
+    desconto = np.where(amortiza & sac, parcela_sac, 0.0)
+    desconto = np.where(amortiza & price, pmt, desconto)
+    fim_bullet = np.where((amortizacao == 'Bullet') & (carencia[:, 0] < prazo[:, 0] - 1), prazo[:, 0] - 1, np.inf)
+
+    # O cronograma segue a recorrência linear até o primeiro mês em que o saldo zera
+    saldo_linear = _recorrencia_linear(saldo_inicial, fator, desconto)
+    zerado = (saldo_linear <= 0) & no_prazo_do_fundo
+    fim = np.where(zerado.any(axis=-1), zerado.argmax(axis=-1) + 1, np.inf)
+    fim = np.minimum(fim, fim_bullet)[..., np.newaxis]
+    fim_bullet = fim_bullet[:, np.newaxis]
+
+    saldo = np.where(k < fim, saldo_linear, 0.0)
+    saldo_anterior = np.concatenate([np.broadcast_to(saldo_inicial, saldo.shape[:-1] + (1,)), saldo[..., :-1]], axis=-1)
+    juros = saldo_anterior * taxa_m
+    amort = np.where(amortiza, desconto, 0.0)
+    amort = np.where(price & amortiza, desconto - juros, amort)
+    amort = np.where(k == fim_bullet, saldo_anterior, amort)
+    amort = np.where(k < fim, amort, np.where(k == fim, np.minimum(amort, saldo_anterior), 0.0))
+
+    # Volta do eixo k para o calendário: o mês m do fundo é k = m - mês de investimento
+    recebido = juros + amort
+    perda_saldo_anterior = saldo_anterior * perda_m
+    for j, (i, mes, n) in enumerate(zip(ativos, inicio[:, 0], n_meses)):
+        volume[..., i, mes + 1:] = saldo[..., j, :n]
+        rend[..., i, mes + 1:] = recebido[..., j, :n]
+        perda[..., i, mes + 1:] = perda_saldo_anterior[..., j, :n]
+    return CronogramaAtivo(volume, rend, perda, invest)
+
+
+def _fator_desde(taxas, indexador, inicio):
+    """Fator acumulado do indexador desde o mês `inicio`: (..., meses_total + 1 - inicio)."""
+    log_fator = taxas.log_fator('CDI' if indexador == 'Pré-fixado' else indexador)[..., inicio:]
+    if indexador == 'Pré-fixado':
+        return np.ones(log_fator.shape)
+    return np.exp(log_fator - log_fator[..., :1])
+
+
+def cronogramas_cri_pulverizado(arrays, taxas):
+    """Cronogramas dos CRIs pulverizados de uma vez, a partir dos arrays da classe.
+
+    O lastro de cada CRI sai da fita de recebíveis em unidades dos indexadores,
+    sem depender das taxas, e vira R$ pelos fatores acumulados da tabela de
+    índices; a cascata divide o caixa entre as tranches e o fundo fica com a
+    fração `Principal / saldo inicial` da sua tranche.
+    """
+    taxas = TabelaIndices.de(taxas)
+    forma = taxas['CDI'].shape
+    meses_total = forma[-1] - 1
+    meses = np.arange(meses_total + 1)
+    mes_inv, principal = arrays['Mês Investimento'], arrays['Principal']
+    valido = (mes_inv >= 1) & (mes_inv <= meses_total)
+    invest = np.where(valido[:, np.newaxis] & (meses == mes_inv[:, np.newaxis]), principal[:, np.newaxis], 0.0)
+    volume = np.broadcast_to(invest, forma[:-1] + invest.shape).copy()
+    rend, perda = np.zeros(volume.shape), np.zeros(volume.shape)
+    ativos = np.flatnonzero(valido & (principal > 0) & (mes_inv < meses_total))
+    if len(ativos) == 0:
+        return CronogramaAtivo(volume, rend, perda, invest)
+
+    taxa_senior = taxas_mensais_cri(arrays, taxas)
+    for j in ativos:
+        nome, inicio, tranche = arrays['Nome'][j], mes_inv[j], arrays['Tranche'][j]
+        lastro = carregar_recebiveis(arrays['Arquivo Recebiveis'][j]).projetar(
+            meses_total - inicio, arrays['CPR'][j], arrays['CDR'][j], arrays['Rampa'][j])
+        if not lastro.indexadores:
+            raise ValueError(f"CRI '{nome}': fita de recebíveis sem contratos")
+        fator = np.stack([_fator_desde(taxas, indexador, inicio) for indexador in lastro.indexadores], axis=-2)
+
+        def em_reais(serie, fator=fator):
+            return (serie * fator).sum(axis=-2)
+
+        tranches = cascata(em_reais(lastro.saldo), em_reais(lastro.juros),
+                           em_reais(lastro.amortizacao + lastro.pre_pagamento), em_reais(lastro.inadimplencia),
+                           arrays['Severidade'][j], arrays['Subordinacao'][j], taxa_senior[..., j, inicio:])
+        saldo, recebido, baixa = tranches[tranche]
+        # No mês do investimento os fatores valem 1: o saldo inicial é o mesmo em todos os cenários
+        inicial = float(saldo[(0,) * saldo.ndim])
+        if inicial <= 0:
+            raise ValueError(f"CRI '{nome}': a tranche {tranche} não tem saldo no lastro")
+        if principal[j] > inicial * (1 + 1e-9):
+            raise ValueError(f"CRI '{nome}': Principal maior que a tranche {tranche} do lastro (R$ {inicial:,.2f})")
+        cota = principal[j] / inicial
+        volume[..., j, inicio:] = cota * saldo
+        rend[..., j, inicio + 1:] = cota * recebido[..., 1:]
+        perda[..., j, inicio + 1:] = cota * baixa[..., 1:]
+    return CronogramaAtivo(volume, rend, perda, invest)
+
+
+CRONOGRAMAS_POR_TIPO = {TIPO_GENERICO: cronogramas_genericos, TIPO_IMOVEL: cronogramas_imoveis, TIPO_CRI: cronogramas_cri,
+                        TIPO_CRI_PULVERIZADO: cronogramas_cri_pulverizado}
+
+
+def arrays_por_classe(carteira):
+    """Arrays tipados de cada classe de ativo presente na carteira."""
+    carteira = Carteira.de(carteira)
+    classes = {tipo: carteira.arrays(tipo) for tipo in CRONOGRAMAS_POR_TIPO}
+    return {tipo: arrays for tipo, arrays in classes.items() if len(arrays['posicao'])}
+
+
+def cronogramas_carteira(carteira, taxas):
+    """Cronogramas de todos os ativos, calculados classe a classe.
+
+    Volume, rendimento e perda saem em (..., ativos, meses_total + 1), seguindo a
+    forma das taxas; o investimento em (ativos, meses_total + 1).
+    """
+    carteira = Carteira.de(carteira)
+    taxas = TabelaIndices.de(taxas)
+    forma = taxas['CDI'].shape
+    forma_ativos = forma[:-1] + (len(carteira), forma[-1])
+    grupo = CronogramaAtivo(np.zeros(forma_ativos), np.zeros(forma_ativos), np.zeros(forma_ativos),
+                            np.zeros((len(carteira), forma[-1])))
+    for tipo, arrays in arrays_por_classe(carteira).items():
+        posicao = arrays['posicao']
+        with etapa(f"cronogramas: {tipo}", linhas=len(posicao), colunas=forma[-1]):
+            parcial = CRONOGRAMAS_POR_TIPO[tipo](arrays, taxas)
+        grupo.volume[..., posicao, :] = parcial.volume
+        grupo.rendimento[..., posicao, :] = parcial.rendimento
+        grupo.perda[..., posicao, :] = parcial.perda
+        grupo.investimento[posicao] = parcial.investimento
+    return grupo
+
+
+def cronograma_ativo(ativo, parametros, taxas=None):
+    """Cronograma isolado de um ativo conforme o seu tipo.
+
+    `taxas` mapeia cada índice para as taxas mensais, em vetor (meses_total + 1)
+    ou em matriz (cenários, meses_total + 1); o resultado segue a mesma forma.
+    """
+    taxas = taxas if taxas is not None else taxas_mensais(parametros)
+    grupo = cronogramas_carteira(Carteira.de([ativo]), taxas)
+    return CronogramaAtivo(grupo.volume[..., 0, :], grupo.rendimento[..., 0, :], grupo.perda[..., 0, :],
+                           grupo.investimento[0])
+
+
+def eventos_por_mes(eventos, meses_total):
+    """Soma os valores de aportes/amortizações por mês num vetor (meses_total + 1)."""
+    vetor = np.zeros(meses_total + 1)
+    for evento in eventos:
+        mes = int(evento['Mês'])
+        if 1 <= mes <= meses_total:
+            vetor[mes] += evento['Valor']
+    return vetor
+
+
+def _coeficientes_despesas(despesas):
+    """Fração mensal do PL e valor fixo de cada despesa."""
+    pct_pl = np.array([d['Valor'] / 100 / 12 if d['Tipo'] == '% do PL' else 0.0 for d in despesas])
+    fixo = np.array([0.0 if d['Tipo'] == '% do PL' else d['Valor'] for d in despesas])
+    return pct_pl, fixo
+
+
+def agregar_fundo(parametros, cronogramas, despesas, aportes, amortizacoes, taxas=None, nomes_ativos=None):
+    """Combina os cronogramas dos ativos (grupo ativos x meses) com caixa, despesas e dividendos do fundo."""
+    meses_total = parametros.meses_total
+    n_meses = meses_total + 1
+    n_ativos = len(cronogramas.volume)
+    nomes_ativos = list(nomes_ativos) if nomes_ativos is not None else [f"Ativo {i + 1}" for i in range(n_ativos)]
+    investimentos = cronogramas.investimento.sum(axis=0) if n_ativos else np.zeros(n_meses)
+    resultado = ResultadoProjecao.alocar(parametros, nomes_ativos, [d['Nome'] for d in despesas], investimentos)
+    resultado.ativos_volume[:] = cronogramas.volume.T
+    resultado.ativos_rend[:] = cronogramas.rendimento.T
+    if n_ativos:
+        resultado.perdas[:] = cronogramas.perda.sum(axis=0)
+
+    vetor_aportes = eventos_por_mes(aportes, meses_total)
+    vetor_amortizacoes = eventos_por_mes(amortizacoes, meses_total)
+    pct_pl, fixo = _coeficientes_despesas(despesas)
+    taxas = taxas if taxas is not None else taxas_mensais(parametros)
+    taxa_cdi = taxas['CDI'].tolist()
+    meses_frequencia = FREQUENCIA_MESES.get(parametros.dist_frequencia, 12)
+    fracao_dist = parametros.dist_percentual / 100.0
+
+    rend_total = resultado.ativos_rend.sum(axis=1).tolist()
+    volume_total = resultado.ativos_volume.sum(axis=1).tolist()
+    perdas_lista = resultado.perdas.tolist()
+    inv_lista = investimentos.tolist()
+    ap_lista = vetor_aportes.tolist()
+    am_lista = vetor_amortizacoes.tolist()
+    coef_pl, total_fixo = float(pct_pl.sum()), float(fixo.sum())
+
+    pl_pos_aportes = np.zeros(n_meses)
+    caixa = [0.0] * n_meses
+    caixa_rend = [0.0] * n_meses
+    dividendos = [0.0] * n_meses
+    total_despesas_lista = [0.0] * n_meses
+    pl_final = [0.0] * n_meses
+    caixa[0] = pl_final[0] = parametros.aporte_inicial
+
+    # Parte dependente do caminho: caixa, despesas sobre PL e dividendos
+    lucro_caixa_acumulado = 0.0
+    with etapa('laço mensal de caixa', linhas=meses_total):
+        for mes in range(1, n_meses):
+            pl_pos = pl_final[mes - 1] + ap_lista[mes]
+            caixa_pos_investimento = caixa[mes - 1] + ap_lista[mes] - inv_lista[mes]
+            rend_caixa = max(0, caixa_pos_investimento) * taxa_cdi[mes]
+            total_despesas = pl_pos * coef_pl + total_fixo
+            lucro_caixa_acumulado += rend_total[mes] + rend_caixa - total_despesas - perdas_lista[mes]
+            dividendo = 0.0
+            if parametros.calc_dividendos and (mes % meses_frequencia == 0 or mes == meses_total):
+                dividendo = max(0, lucro_caixa_acumulado * fracao_dist)
+                lucro_caixa_acumulado = 0.0
+            caixa[mes] = caixa_pos_investimento + rend_caixa - total_despesas - am_lista[mes] - dividendo
+            caixa_rend[mes] = rend_caixa
+            dividendos[mes] = dividendo
+            total_despesas_lista[mes] = total_despesas
+            pl_pos_aportes[mes] = pl_pos
+            pl_final[mes] = volume_total[mes] + caixa[mes]
+
+    # Despesas com o mesmo nome ocupam uma coluna, com o valor da última
+    ultima_por_nome = {d['Nome']: j for j, d in enumerate(despesas)}
+    colunas_despesas = list(ultima_por_nome.values())
+    resultado.despesas[1:] = np.outer(pl_pos_aportes[1:], pct_pl[colunas_despesas]) + fixo[colunas_despesas]
+    resultado.aportes[:] = vetor_aportes
+    resultado.aportes[0] = parametros.aporte_inicial
+    resultado.amortizacoes[:] = vetor_amortizacoes
+    resultado.dividendos[:] = dividendos
+    resultado.caixa_volume[:] = caixa
+    resultado.caixa_rend[:] = caixa_rend
+    resultado.total_despesas[:] = total_despesas_lista
+    resultado.pl_final[:] = pl_final
+    resultado.pl_inicio[1:] = pl_final[:-1]
+    resultado.calcular_derivadas()
+    # O resultado pode ficar num cache compartilhado e os DataFrames o embrulham sem cópia
+    resultado.tabela.flags.writeable = False
+    return resultado
+
+
+@dataclass
+class ResultadoLote:
+    """Saída do motor em lote: séries (cenários, meses_total + 1) dependentes das taxas."""
+    aportes: np.ndarray
+    amortizacoes: np.ndarray
+    dividendos: np.ndarray
+    caixa_volume: np.ndarray
+    pl_final: np.ndarray
+
+
+def agregar_cenarios(parametros, volume_total, rend_total, perdas, investimentos, despesas, aportes, amortizacoes, taxa_cdi):
+    """Versão em lote de `agregar_fundo` sobre o eixo de cenários.
+
+    Recebe as somas dos ativos em matrizes (cenários, meses_total + 1) e roda o laço
+    mensal de caixa e dividendos com operações vetoriais entre cenários.
+    """
+    meses_total = parametros.meses_total
+    n_cenarios = volume_total.shape[0]
+    vetor_aportes = eventos_por_mes(aportes, meses_total)
+    vetor_amortizacoes = eventos_por_mes(amortizacoes, meses_total)
+    pct_pl, fixo = _coeficientes_despesas(despesas)
+    coef_pl, total_fixo = float(pct_pl.sum()), float(fixo.sum())
+    meses_frequencia = FREQUENCIA_MESES.get(parametros.dist_frequencia, 12)
+    fracao_dist = parametros.dist_percentual / 100.0
+
+    caixa = np.zeros((n_cenarios, meses_total + 1))
+    dividendos = np.zeros((n_cenarios, meses_total + 1))
+    pl_final = np.zeros((n_cenarios, meses_total + 1))
+    caixa[:, 0] = pl_final[:, 0] = parametros.aporte_inicial
+    lucro_caixa_acumulado = np.zeros(n_cenarios)
+    with etapa('laço mensal de caixa (lote)', linhas=meses_total, colunas=n_cenarios):
+        for mes in range(1, meses_total + 1):
+            pl_pos = pl_final[:, mes - 1] + vetor_aportes[mes]
+            caixa_pos_investimento = caixa[:, mes - 1] + (vetor_aportes[mes] - investimentos[mes])
+            rend_caixa = np.maximum(caixa_pos_investimento, 0) * taxa_cdi[:, mes]
+            total_despesas = pl_pos * coef_pl + total_fixo
+            lucro_caixa_acumulado += rend_total[:, mes] + rend_caixa - total_despesas - perdas[:, mes]
+            if parametros.calc_dividendos and (mes % meses_frequencia == 0 or mes == meses_total):
+                dividendos[:, mes] = np.maximum(lucro_caixa_acumulado * fracao_dist, 0)
+                lucro_caixa_acumulado[:] = 0.0
+            caixa[:, mes] = caixa_pos_investimento + rend_caixa - total_despesas - vetor_amortizacoes[mes] - dividendos[:, mes]
+            pl_final[:, mes] = volume_total[:, mes] + caixa[:, mes]
+
+    vetor_aportes[0] = parametros.aporte_inicial
+    return ResultadoLote(vetor_aportes, vetor_amortizacoes, dividendos, caixa, pl_final)
+
+
+def projetar_lote(parametros, ativos, despesas, aportes, amortizacoes, taxas, max_elementos=2_000_000):
+    """Projeta o fundo para vários cenários de taxas (matrizes cenários x meses) de uma vez.
+
+    Cada cenário pode ser um conjunto de curvas (ver `fundos.curvas.taxas_de_curvas`); as tabelas de
+    fatores dos índices são montadas uma vez para todos os blocos de ativos.
+    """
+    taxas = TabelaIndices.de(taxas)
+    forma = taxas['CDI'].shape
+    volume_total, rend_total, perdas = np.zeros(forma), np.zeros(forma), np.zeros(forma)
+    investimentos = np.zeros(forma[-1])
+    # Blocos de ativos da mesma classe, com no máximo `max_elementos` por matriz cenários x ativos x meses
+    tamanho = max(1, max_elementos // int(np.prod(forma)))
+    for tipo, arrays in arrays_por_classe(ativos).items():
+        for inicio in range(0, len(arrays['posicao']), tamanho):
+            bloco = {campo: valores[inicio:inicio + tamanho] for campo, valores in arrays.items()}
+            with etapa(f"cronogramas: {tipo}", linhas=len(bloco['posicao']), colunas=forma[-1], cenarios=int(np.prod(forma[:-1]))):
+                cronograma = CRONOGRAMAS_POR_TIPO[tipo](bloco, taxas)
+            volume_total += cronograma.volume.sum(axis=-2)
+            rend_total += cronograma.rendimento.sum(axis=-2)
+            perdas += cronograma.perda.sum(axis=-2)
+            investimentos += cronograma.investimento.sum(axis=0)
+    return agregar_cenarios(parametros, volume_total, rend_total, perdas, investimentos,
+                            despesas, aportes, amortizacoes, taxas['CDI'])
+
+
+def projetar_fundo(parametros, ativos, despesas, aportes=(), amortizacoes=(), taxas=None):
+    """Roda a projeção completa do fundo e devolve um `ResultadoProjecao`."""
+    with etapa('projeção', linhas=parametros.meses_total + 1, colunas=len(ativos)):
+        taxas = taxas if taxas is not None else taxas_mensais(parametros)
+        carteira = Carteira.de(ativos)
+        return agregar_fundo(parametros, cronogramas_carteira(carteira, taxas), despesas, aportes, amortizacoes, taxas,
+                             nomes_ativos=carteira.dados['Nome'])
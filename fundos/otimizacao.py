@@ -0,0 +1,346 @@
+"""Busca de metas e otimização de entradas sobre a projeção completa.
+
+`buscar_meta` acha o valor de uma entrada (qualquer caminho aceito pela
+sensibilidade, como `ativos[0].Valor Compra` ou `dist_percentual`) que leva um
+indicador ao alvo: parte do valor atual, expande um intervalo até o indicador
+cruzar o alvo e refina por falsa posição com a correção de Illinois, com
+bissecção como salvaguarda. Cada avaliação passa pelo `CacheProjecao`, então só
+os cronogramas dos ativos alterados são recalculados, e a TIR de cada passo
+parte da TIR do passo anterior.
+
+`otimizar` maximiza (ou minimiza) uma métrica sobre várias entradas com
+limites, sujeita a faixas em outras métricas (ex.: TIR mínima e caixa mínimo),
+por busca de padrões: a cada passo sonda ±passo em cada entrada e fica com o
+melhor ponto; sem melhora, o passo cai à metade. Pontos inviáveis só ganham de
+pontos com violação maior. Buscas independentes (`buscar_metas`) e os pontos de
+cada sondagem rodam em paralelo num pool de processos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from fundos.cache import CacheProjecao
+from fundos.indicadores import indicadores_investidor, tir_investidor
+from fundos.perfil import etapa
+from fundos.sensibilidade import INDICADORES, aplicar_valores, ler_valor
+
+METRICAS = INDICADORES + ('Total Distribuído', 'Dividendos', 'PL Final', 'Caixa Mínimo')
+
+CONVERGIU = "Convergiu"
+SEM_INTERVALO = "O indicador não cruza o alvo dentro dos limites"
+INDEFINIDO = "Indicador indefinido (ex.: TIR sem solução) no intervalo"
+LIMITE_AVALIACOES = "Limite de avaliações atingido"
+MAX_EXPANSOES = 16  # dobras do passo por sentido: até ~6500x o passo inicial
+
+
+def metricas(resultado, chute_tir=None):
+    """Indicadores do investidor e métricas do fundo de uma projeção, e a TIR mensal (partida do próximo passo)."""
+    series = (resultado.aportes, resultado.amortizacoes, resultado.dividendos, resultado.pl_final)
+    solucao = tir_investidor(*series, chute_tir=chute_tir)
+    valores = {nome: float(v[0]) for nome, v in indicadores_investidor(*series, solucao_tir=solucao).items()}
+    valores.update({
+        'Total Distribuído': float((resultado.amortizacoes + resultado.dividendos).sum()),
+        'Dividendos': float(resultado.dividendos.sum()),
+        'PL Final': float(resultado.pl_final[-1]),
+        'Caixa Mínimo': float(resultado.caixa_volume.min()),
+    })
+    return valores, float(solucao.taxa[0])
+
+
+class Avaliador:
+    """Avalia pontos ({caminho: valor}) sobre uma definição base, com cache de cronogramas e TIR a quente."""
+
+    def __init__(self, definicao, cache=None):
+        self.definicao = definicao
+        self.cache = cache if cache is not None else CacheProjecao()
+        self.chute_tir = None
+        self.avaliacoes = 0
+
+    def __call__(self, valores):
+        """Métricas do ponto, ou None se a projeção rejeitar os valores (ex.: prazo menor que a carência)."""
+        self.avaliacoes += 1
+        with etapa('avaliação de meta', 'otimização', colunas=len(valores)):
+            try:
+                resultado = self.cache.projetar(*aplicar_valores(self.definicao, valores).entradas())
+            except ValueError:
+                return None
+            valores_metricas, tir_mensal = metricas(resultado, self.chute_tir)
+        if np.isfinite(tir_mensal):
+            self.chute_tir = tir_mensal
+        return valores_metricas
+
+
+@dataclass
+class ResultadoMeta:
+    """Solução de uma busca de meta; `historico` traz cada valor testado e o indicador obtido."""
+    caminho: str
+    indicador: str
+    alvo: float
+    valor: float
+    obtido: float
+    status: str
+    avaliacoes: int
+    historico: pd.DataFrame = field(repr=False)
+
+    @property
+    def convergiu(self):
+        return self.status == CONVERGIU
+
+
+def _sinal(valor):
+    return np.sign(valor) if valor != 0 else 0.0
+
+
+def buscar_meta(definicao, caminho, alvo, indicador='TIR', limites=(None, None), chute=None, passo=None,
+                tolerancia=1e-6, max_avaliacoes=60, avaliador=None):
+    """Valor de `caminho` com o qual `indicador` fica a `tolerancia` de `alvo`.
+
+    `limites` restringe a busca (padrão: de 0 a infinito para entradas não
+    negativas); `chute` substitui o valor atual como ponto de partida e `passo`
+    o primeiro passo da expansão (padrão: 10% do valor de partida). Entradas
+    inteiras (meses, prazos) são buscadas só em inteiros.
+    """
+    avaliador = avaliador if avaliador is not None else Avaliador(definicao)
+    base = ler_valor(definicao, caminho)
+    inteiro = isinstance(base, (int, np.integer)) and not isinstance(base, bool)
+    minimo = limites[0] if limites[0] is not None else (0.0 if base >= 0 else -np.inf)
+    maximo = limites[1] if limites[1] is not None else np.inf
+    inicio = avaliador.avaliacoes
+    historico, diferencas = [], {}
+
+    def ajustar(x):
+        x = min(max(x, minimo), maximo)
+        return int(round(x)) if inteiro else float(x)
+
+    def diferenca(x):
+        if x not in diferencas:
+            valores = avaliador({caminho: x})
+            obtido = np.nan if valores is None else valores[indicador]
+            historico.append({'Valor': x, indicador: obtido})
+            diferencas[x] = obtido - alvo
+        return diferencas[x]
+
+    def resultado(x, status):
+        obtido = np.nan if x is None else diferencas[x] + alvo
+        return ResultadoMeta(caminho, indicador, alvo, np.nan if x is None else x, obtido, status,
+                             avaliador.avaliacoes - inicio, pd.DataFrame(historico, columns=['Valor', indicador]))
+
+    def esgotou():
+        return avaliador.avaliacoes - inicio >= max_avaliacoes
+
+    x0 = ajustar(chute if chute is not None else base)
+    f0 = diferenca(x0)
+    passo_inicial = passo or max(abs(x0) * 0.1, 1.0 if inteiro else 1e-3)
+    # Sem indicador no ponto de partida (ex.: TIR sem solução), parte do primeiro ponto definido ao redor dele
+    for k in range(MAX_EXPANSOES):
+        if not np.isnan(f0) or esgotou():
+            break
+        for x in (ajustar(x0 + passo_inicial * 2**k), ajustar(x0 - passo_inicial * 2**k)):
+            if not np.isnan(diferenca(x)):
+                x0, f0 = x, diferencas[x]
+                break
+    if np.isnan(f0):
+        return resultado(None, INDEFINIDO)
+    if abs(f0) <= tolerancia:
+        return resultado(x0, CONVERGIU)
+
+    # Expansão: passos dobrando a partir de x0, primeiro para cima; se o primeiro passo
+    # afasta do alvo sem cruzá-lo, tenta o outro sentido
+    intervalo = None
+    for sentido in (1, -1):
+        a, fa, h = x0, f0, passo_inicial
+        for _ in range(MAX_EXPANSOES):
+            if esgotou():
+                break
+            b = ajustar(a + sentido * h)
+            if b == a:
+                break
+            fb = diferenca(b)
+            if np.isnan(fb):
+                break
+            if _sinal(fb) != _sinal(fa):
+                intervalo = (a, fa, b, fb)
+                break
+            if a == x0 and abs(fb) > abs(fa):
+                break
+            a, fa, h = b, fb, h * 2
+        if intervalo is not None:
+            break
+    if intervalo is None:
+        melhor = min(diferencas, key=lambda x: abs(diferencas[x]) if not np.isnan(diferencas[x]) else np.inf)
+        return resultado(melhor, LIMITE_AVALIACOES if esgotou() else SEM_INTERVALO)
+
+    # Refino por falsa posição (Illinois) dentro do intervalo com troca de sinal
+    a, fa, b, fb = intervalo
+    tolerancia_x = 1e-12 * max(1.0, abs(a), abs(b))
+    while not esgotou():
+        if fb == 0 or abs(fb) <= tolerancia:
+            return resultado(b, CONVERGIU)
+        if abs(b - a) <= (1 if inteiro else tolerancia_x):
+            break
+        c = b - fb * (b - a) / (fb - fa)
+        if not min(a, b) < c < max(a, b):
+            c = (a + b) / 2
+        c = ajustar(c)
+        if c in (a, b):
+            c = ajustar((a + b) / 2)
+            if c in (a, b):
+                break
+        fc = diferenca(c)
+        if np.isnan(fc):
+            c = ajustar((a + b) / 2)
+            fc = diferenca(c)
+            if np.isnan(fc):
+                return resultado(b if abs(fb) < abs(fa) else a, INDEFINIDO)
+        if _sinal(fc) != _sinal(fb):
+            a, fa = b, fb
+        else:
+            fa /= 2
+        b, fb = c, fc
+    melhor = b if abs(fb) <= abs(fa) else a
+    if inteiro and abs(b - a) <= 1:
+        return resultado(melhor, CONVERGIU)
+    return resultado(melhor, CONVERGIU if abs(diferencas[melhor]) <= tolerancia or abs(b - a) <= tolerancia_x
+                     else LIMITE_AVALIACOES)
+
+
+_BASE = None
+_AVALIADOR = None
+
+
+def _iniciar_trabalhador(definicao):
+    global _BASE, _AVALIADOR
+    _BASE, _AVALIADOR = definicao, Avaliador(definicao)
+
+
+def _buscar_no_trabalhador(argumentos):
+    return buscar_meta(_BASE, avaliador=_AVALIADOR, **argumentos)
+
+
+def _avaliar_no_trabalhador(valores):
+    return _AVALIADOR(valores)
+
+
+def buscar_metas(definicao, buscas, processos=None):
+    """Várias buscas independentes, em paralelo; cada busca é um dict de argumentos de `buscar_meta`.
+
+    Ex.: [{'caminho': 'ativos[0].Valor Compra', 'alvo': 0.12}, {'caminho': 'dist_percentual', 'alvo': 0.12}].
+    Devolve os `ResultadoMeta` na ordem das buscas.
+    """
+    processos = min(processos or os.cpu_count() or 1, len(buscas))
+    if processos <= 1:
+        avaliador = Avaliador(definicao)
+        return [buscar_meta(definicao, avaliador=avaliador, **argumentos) for argumentos in buscas]
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_trabalhador, initargs=(definicao,)) as pool:
+        return list(pool.map(_buscar_no_trabalhador, buscas))
+
+
+@dataclass
+class ResultadoOtimizacao:
+    """Melhor ponto encontrado, as suas métricas e cada ponto avaliado em `historico`."""
+    valores: dict
+    metricas: dict
+    viavel: bool
+    status: str
+    avaliacoes: int
+    historico: pd.DataFrame = field(repr=False)
+
+
+def _violacao(valores, restricoes):
+    """Soma das violações das faixas, cada uma relativa ao módulo do limite (ou 1, se o limite for 0)."""
+    if valores is None:
+        return np.inf
+    total = 0.0
+    for nome, (minimo, maximo) in restricoes.items():
+        valor = valores[nome]
+        if np.isnan(valor):
+            return np.inf
+        if minimo is not None and valor < minimo:
+            total += (minimo - valor) / (abs(minimo) or 1.0)
+        if maximo is not None and valor > maximo:
+            total += (valor - maximo) / (abs(maximo) or 1.0)
+    return total
+
+
+def otimizar(definicao, variaveis, objetivo='Dividendos', maximizar=True, restricoes=None, passo_inicial=0.25,
+             tolerancia=1e-3, max_avaliacoes=400, processos=None):
+    """Melhor combinação das entradas em `variaveis` ({caminho: (mínimo, máximo)}) para `objetivo`.
+
+    `restricoes` mapeia métricas de `METRICAS` para faixas (mínimo, máximo), com
+    None para um lado livre; ex.: {'TIR': (0.12, None), 'Caixa Mínimo': (0, None)}.
+    `passo_inicial` e `tolerancia` são frações da faixa de cada entrada. Os
+    pontos de cada sondagem são avaliados em paralelo em `processos` processos
+    (padrão: um por CPU, até o número de pontos da sondagem); com 1, em série.
+    """
+    restricoes = restricoes or {}
+    caminhos = list(variaveis)
+    minimos = np.array([variaveis[c][0] for c in caminhos], dtype=float)
+    maximos = np.array([variaveis[c][1] for c in caminhos], dtype=float)
+    faixas = maximos - minimos
+    inteiros = [isinstance(ler_valor(definicao, c), (int, np.integer)) for c in caminhos]
+    historico = []
+
+    def como_valores(x):
+        return {c: int(round(v)) if inteiro else float(v) for c, v, inteiro in zip(caminhos, x, inteiros)}
+
+    def chave(valores):
+        # Menor é melhor: primeiro a violação das restrições, depois o objetivo
+        violacao = _violacao(valores, restricoes)
+        valor = np.nan if valores is None else valores[objetivo]
+        if np.isnan(valor):
+            return (violacao, np.inf)
+        return (violacao, -valor if maximizar else valor)
+
+    def registrar(pontos, resultados):
+        for valores, metricas_ponto in zip(pontos, resultados):
+            historico.append({**valores, **(metricas_ponto or dict.fromkeys(METRICAS, np.nan)), 'Violação': _violacao(metricas_ponto, restricoes)})
+
+    # Cada sondagem tem até dois pontos por entrada
+    processos = min(processos or os.cpu_count() or 1, 2 * len(caminhos))
+    pool = avaliador = None
+    if processos > 1:
+        pool = ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_trabalhador, initargs=(definicao,))
+    else:
+        avaliador = Avaliador(definicao)
+
+    def avaliar_lote(pontos):
+        if pool is not None:
+            return list(pool.map(_avaliar_no_trabalhador, pontos))
+        return [avaliador(p) for p in pontos]
+
+    try:
+        x = np.clip(np.array([float(ler_valor(definicao, c)) for c in caminhos]), minimos, maximos)
+        atual = como_valores(x)
+        metricas_atual = avaliar_lote([atual])[0]
+        registrar([atual], [metricas_atual])
+        vistos = {tuple(atual.values())}
+        passo = passo_inicial
+        while passo > tolerancia and len(historico) < max_avaliacoes:
+            sondagem = []
+            for i in range(len(caminhos)):
+                for sentido in (1, -1):
+                    y = x.copy()
+                    y[i] = np.clip(x[i] + sentido * max(passo * faixas[i], 1.0 if inteiros[i] else 0.0), minimos[i], maximos[i])
+                    valores = como_valores(y)
+                    if tuple(valores.values()) not in vistos:
+                        vistos.add(tuple(valores.values()))
+                        sondagem.append((y, valores))
+            sondagem = sondagem[:max_avaliacoes - len(historico)]
+            resultados = avaliar_lote([valores for _, valores in sondagem]) if sondagem else []
+            registrar([valores for _, valores in sondagem], resultados)
+            melhor = min(range(len(sondagem)), key=lambda k: chave(resultados[k]), default=None)
+            if melhor is not None and chave(resultados[melhor]) < chave(metricas_atual):
+                x, atual = sondagem[melhor]
+                metricas_atual = resultados[melhor]
+            else:
+                passo /= 2
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    viavel = _violacao(metricas_atual, restricoes) == 0
+    status = CONVERGIU if passo <= tolerancia else LIMITE_AVALIACOES
+    return ResultadoOtimizacao(atual, metricas_atual or {}, viavel, status, len(historico), pd.DataFrame(historico))
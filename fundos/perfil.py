@@ -0,0 +1,172 @@
+"""Medição por etapa das execuções: tempo, linhas/colunas processadas e, opcionalmente, pico de memória.
+
+O motor, as tabelas e a interface marcam as suas etapas com `etapa(...)`. Sem
+um `Perfil` ativo isso devolve um contexto nulo compartilhado, e o custo é o
+de uma consulta a uma `ContextVar`. Com um perfil ativo, cada etapa vira um
+registro exportável em JSON ou no formato de trace do Chrome
+(chrome://tracing, Perfetto):
+
+    with Perfil(memoria=True) as perfil:
+        resultado = projetar_fundo(...)
+    perfil.resumo()
+    perfil.gravar('perfil.json', formato='chrome')
+"""
+import contextvars
+import json
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+_PERFIL_ATIVO = contextvars.ContextVar('perfil_ativo', default=None)
+
+
+class _EtapaNula:
+    """Etapa usada sem perfil ativo: não mede nada."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        return False
+
+    def contar(self, linhas=None, colunas=None, **detalhes):
+        pass
+
+
+_ETAPA_NULA = _EtapaNula()
+
+
+class _Etapa:
+    def __init__(self, perfil, nome, categoria, linhas, colunas, detalhes):
+        self.perfil, self.nome, self.categoria = perfil, nome, categoria
+        self.registro = {'nome': nome, 'categoria': categoria, 'linhas': linhas, 'colunas': colunas, **detalhes}
+        self.pico_filhos = 0
+
+    def contar(self, linhas=None, colunas=None, **detalhes):
+        """Informa (ou corrige) as contagens quando elas só são conhecidas dentro da etapa."""
+        if linhas is not None:
+            self.registro['linhas'] = linhas
+        if colunas is not None:
+            self.registro['colunas'] = colunas
+        self.registro.update(detalhes)
+
+    def __enter__(self):
+        pilha = self.perfil._pilha()
+        self.registro['nivel'] = len(pilha)
+        pilha.append(self)
+        if self.perfil.memoria:
+            self._memoria_inicial = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        fim = time.perf_counter()
+        pilha = self.perfil._pilha()
+        pilha.pop()
+        if self.perfil.memoria:
+            # `reset_peak` das etapas internas apaga o pico visto até ali; ele volta pelo `pico_filhos`
+            pico = max(tracemalloc.get_traced_memory()[1], self.pico_filhos)
+            self.registro['memoria_pico'] = pico - self._memoria_inicial
+            if pilha:
+                pilha[-1].pico_filhos = max(pilha[-1].pico_filhos, pico)
+        self.registro.update(inicio=self._inicio - self.perfil.origem, duracao=fim - self._inicio,
+                             thread=threading.get_ident())
+        if excecao[0] is not None:
+            self.registro['erro'] = excecao[0].__name__
+        self.perfil.registros.append(self.registro)
+        return False
+
+
+def etapa(nome, categoria='motor', linhas=None, colunas=None, **detalhes):
+    """Contexto que mede `nome` no perfil ativo; sem perfil, um contexto nulo."""
+    perfil = _PERFIL_ATIVO.get()
+    if perfil is None:
+        return _ETAPA_NULA
+    return _Etapa(perfil, nome, categoria, linhas, colunas, detalhes)
+
+
+class Perfil:
+    """Registros das etapas medidas enquanto o perfil está ativo (`with Perfil() as perfil:`).
+
+    Com `memoria=True`, liga o `tracemalloc` durante o perfil e anota o pico de
+    memória alocada em cada etapa, acima do que já estava alocado no início
+    dela. O `tracemalloc` deixa o código bem mais lento; os tempos medidos com
+    memória servem para comparar etapas entre si, não com execuções sem ela.
+    """
+
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        self.registros = []
+        self.origem = time.perf_counter()
+        self._local = threading.local()
+        self._token = None
+        self._parar_tracemalloc = False
+
+    def _pilha(self):
+        if not hasattr(self._local, 'pilha'):
+            self._local.pilha = []
+        return self._local.pilha
+
+    def __enter__(self):
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._parar_tracemalloc = True
+        self.origem = time.perf_counter()
+        self._token = _PERFIL_ATIVO.set(self)
+        return self
+
+    def __exit__(self, *excecao):
+        _PERFIL_ATIVO.reset(self._token)
+        if self._parar_tracemalloc:
+            tracemalloc.stop()
+            self._parar_tracemalloc = False
+        return False
+
+    def para_dataframe(self):
+        """Um registro por etapa executada, na ordem de início."""
+        colunas = ['nome', 'categoria', 'nivel', 'inicio', 'duracao', 'linhas', 'colunas', 'memoria_pico']
+        df = pd.DataFrame(self.registros)
+        if df.empty:
+            return pd.DataFrame(columns=colunas)
+        return df.reindex(columns=colunas + [c for c in df.columns if c not in colunas]).sort_values('inicio', ignore_index=True)
+
+    def resumo(self):
+        """Totais por etapa: chamadas, tempo total e médio (ms), linhas/colunas e pico de memória (MB)."""
+        df = self.para_dataframe()
+        grupos = df.groupby(['categoria', 'nome'], sort=False)
+        resumo = pd.DataFrame({
+            'Chamadas': grupos.size(),
+            'Total (ms)': grupos['duracao'].sum() * 1000,
+            'Média (ms)': grupos['duracao'].mean() * 1000,
+            'Linhas': grupos['linhas'].max(),
+            'Colunas': grupos['colunas'].max(),
+            'Pico de Memória (MB)': grupos['memoria_pico'].max() / 1024**2,
+        })
+        return resumo.sort_values('Total (ms)', ascending=False)
+
+    def para_json(self):
+        return {'memoria': self.memoria, 'registros': self.registros}
+
+    def para_chrome_trace(self):
+        """Eventos completos ('X') do formato Trace Event, em microssegundos."""
+        eventos = []
+        for registro in self.registros:
+            argumentos = {k: v for k, v in registro.items()
+                          if k not in ('nome', 'categoria', 'inicio', 'duracao', 'thread', 'nivel') and v is not None}
+            eventos.append({'name': registro['nome'], 'cat': registro['categoria'], 'ph': 'X', 'pid': 1,
+                            'tid': registro['thread'], 'ts': registro['inicio'] * 1e6, 'dur': registro['duracao'] * 1e6,
+                            'args': argumentos})
+        return {'traceEvents': sorted(eventos, key=lambda e: e['ts']), 'displayTimeUnit': 'ms'}
+
+    def serializar(self, formato='json'):
+        """Texto JSON dos registros (`formato='json'`) ou do trace do Chrome (`formato='chrome'`)."""
+        dados = self.para_chrome_trace() if formato == 'chrome' else self.para_json()
+        return json.dumps(dados, ensure_ascii=False, default=float)
+
+    def gravar(self, caminho, formato='json'):
+        Path(caminho).write_text(self.serializar(formato), encoding='utf-8')
+        return Path(caminho)
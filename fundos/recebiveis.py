@@ -0,0 +1,241 @@
+"""Lastro pulverizado dos CRIs: fita de recebíveis contrato a contrato, pré-pagamento, inadimplência e cascata.
+
+A fita tem um contrato por linha, com as colunas:
+
+    Saldo, Taxa (% a.a.), Prazo (meses remanescentes), Amortizacao (SAC/Price),
+    Indexador (IPCA/IGP-M/Pré-fixado) e Idade (meses desde a originação)
+
+Saldo, taxa e prazo são obrigatórios. Cada contrato é projetado em unidades do
+seu indexador (o saldo é corrigido pelo índice e os juros incidem sobre o saldo
+corrigido), então o cronograma de todos os contratos não depende das taxas e é
+calculado em forma fechada, contratos x meses, em blocos: o pré-pagamento (CPR)
+e a inadimplência (CDR) reduzem o saldo pela sobrevivência acumulada, e a
+amortização programada é reparcelada sobre o saldo que sobra. O resultado é
+somado por indexador, e só então entram os índices e o eixo de cenários.
+
+Com CPR e CDR em % a.a. e uma `rampa` em meses, as taxas de cada contrato crescem
+linearmente com a idade dele até a rampa (como nas curvas PSA/SDA). O saldo
+inadimplente é recuperado no mesmo mês, menos a `severidade`.
+"""
+import functools
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from fundos.carteira import _assinatura_arquivo, _chave_coluna, ler_planilha
+
+COLUNAS_RECEBIVEIS = ['Saldo', 'Taxa', 'Prazo', 'Amortizacao', 'Indexador', 'Idade']
+INDEXADORES = ('IPCA', 'IGP-M', 'Pré-fixado')
+AMORTIZACOES = ('SAC', 'Price')
+PADROES_RECEBIVEIS = {'Amortizacao': 'Price', 'Indexador': 'IPCA', 'Idade': 0}
+TRANCHES = ('Sênior', 'Subordinada')
+
+_SINONIMOS = {'saldodevedor': 'Saldo', 'prazoremanescente': 'Prazo', 'indice': 'Indexador', 'taxajuros': 'Taxa'}
+_COLUNAS_POR_CHAVE = {**{_chave_coluna(c): c for c in COLUNAS_RECEBIVEIS}, **_SINONIMOS}
+
+
+@dataclass
+class FluxoLastro:
+    """Fluxo do lastro por indexador, em unidades do índice: matrizes (indexadores, meses + 1).
+
+    `saldo` é o saldo adimplente ao fim de cada mês; `inadimplencia` o saldo que
+    entrou em default no mês, antes da recuperação.
+    """
+    indexadores: tuple
+    saldo: np.ndarray
+    juros: np.ndarray
+    amortizacao: np.ndarray
+    pre_pagamento: np.ndarray
+    inadimplencia: np.ndarray
+
+
+class Recebiveis:
+    """Fita de recebíveis em arrays por coluna, um contrato por posição."""
+
+    def __init__(self, dados):
+        dados = dados.rename(columns=lambda c: _COLUNAS_POR_CHAVE.get(_chave_coluna(c), c)).reset_index(drop=True)
+        colunas = {}
+        for coluna in COLUNAS_RECEBIVEIS:
+            valores = dados[coluna] if coluna in dados.columns else pd.Series(np.nan, index=dados.index)
+            if coluna in ('Amortizacao', 'Indexador'):
+                colunas[coluna] = valores.map(lambda v: str(v).strip() if v == v and v is not None else None)
+            else:
+                colunas[coluna] = pd.to_numeric(valores, errors='coerce')
+        self.dados = pd.DataFrame(colunas)
+        for coluna, padrao in PADROES_RECEBIVEIS.items():
+            self.dados[coluna] = self.dados[coluna].fillna(padrao)
+        self._memo = {}
+
+    @classmethod
+    def de_arquivo(cls, arquivo, nome=None):
+        """Lê uma fita de recebíveis em CSV (separador detectado) ou Excel."""
+        return cls(ler_planilha(arquivo, nome))
+
+    def __len__(self):
+        return len(self.dados)
+
+    def validar(self):
+        """Erros de validação (linha, coluna, mensagem), verificados coluna a coluna."""
+        erros = []
+        dados = self.dados
+
+        def registrar(mascara, coluna, mensagem):
+            for linha in np.flatnonzero(mascara):
+                erros.append({'Linha': int(linha) + 1, 'Coluna': coluna, 'Mensagem': mensagem})
+
+        for coluna in ('Saldo', 'Taxa', 'Prazo'):
+            registrar(dados[coluna].isna().to_numpy(), coluna, "obrigatório")
+        registrar(~dados['Amortizacao'].isin(AMORTIZACOES).to_numpy(), 'Amortizacao', f"deve ser um de {list(AMORTIZACOES)}")
+        registrar(~dados['Indexador'].isin(INDEXADORES).to_numpy(), 'Indexador', f"deve ser um de {list(INDEXADORES)}")
+        for coluna in ('Prazo', 'Idade'):
+            valores = dados[coluna].to_numpy(dtype=float)
+            registrar(~np.isnan(valores) & (valores != np.round(valores)), coluna, "deve ser inteiro")
+        registrar(dados['Saldo'].to_numpy() < 0, 'Saldo', "deve ser maior ou igual a 0")
+        registrar(dados['Prazo'].to_numpy() < 1, 'Prazo', "deve ser maior ou igual a 1")
+        registrar(dados['Idade'].to_numpy() < 0, 'Idade', "deve ser maior ou igual a 0")
+        registrar(dados['Taxa'].to_numpy() <= -100, 'Taxa', "deve ser maior que -100")
+        return pd.DataFrame(erros, columns=['Linha', 'Coluna', 'Mensagem'])
+
+    def resumo(self):
+        """Quantidade de contratos, saldo total e médias ponderadas pelo saldo."""
+        saldo = self.dados['Saldo'].to_numpy(dtype=float)
+        total = float(saldo.sum())
+
+        def media(coluna):
+            if total <= 0:
+                return np.nan
+            return float(np.average(self.dados[coluna].to_numpy(dtype=float), weights=saldo))
+
+        return {'Contratos': len(self), 'Saldo': total, 'Taxa Média (% a.a.)': media('Taxa'),
+                'Prazo Médio (meses)': media('Prazo'), 'Idade Média (meses)': media('Idade')}
+
+    def projetar(self, meses, cpr=0.0, cdr=0.0, rampa=0, max_elementos=250_000):
+        """Fluxo do lastro nos próximos `meses`, em unidades de cada indexador (ver `FluxoLastro`).
+
+        Os contratos são processados em blocos de até `max_elementos` células
+        contratos x meses; o fluxo é memorizado pelos parâmetros.
+        """
+        chave = (int(meses), float(cpr), float(cdr), int(rampa))
+        if chave not in self._memo:
+            if len(self._memo) >= 64:
+                self._memo.clear()
+            self._memo[chave] = self._projetar(*chave, max_elementos)
+        return self._memo[chave]
+
+    def _projetar(self, meses, cpr, cdr, rampa, max_elementos):
+        dados = self.dados
+        indexadores = tuple(i for i in INDEXADORES if (dados['Indexador'] == i).any())
+        grupo = pd.Categorical(dados['Indexador'], categories=indexadores).codes
+        saldo0 = dados['Saldo'].to_numpy(dtype=float)
+        taxa = (1 + dados['Taxa'].to_numpy(dtype=float) / 100.0)**(1/12) - 1
+        prazo = dados['Prazo'].to_numpy(dtype=float)
+        idade = dados['Idade'].to_numpy(dtype=float)
+        price = (dados['Amortizacao'] == 'Price').to_numpy()
+
+        campos = ('saldo', 'juros', 'amortizacao', 'pre_pagamento', 'inadimplencia')
+        somas = {campo: np.zeros((len(indexadores), meses + 1)) for campo in campos}
+        k = np.arange(meses + 1, dtype=float)
+        tamanho = max(1, max_elementos // (meses + 1))
+        for inicio in range(0, len(dados), tamanho):
+            bloco = slice(inicio, inicio + tamanho)
+            fluxo = _fluxo_contratos(saldo0[bloco, np.newaxis], taxa[bloco, np.newaxis], prazo[bloco, np.newaxis],
+                                     idade[bloco, np.newaxis], price[bloco, np.newaxis], k, cpr, cdr, rampa)
+            for g in range(len(indexadores)):
+                linhas = grupo[bloco] == g
+                for campo in campos:
+                    somas[campo][g] += fluxo[campo][linhas].sum(axis=0)
+        return FluxoLastro(indexadores, **somas)
+
+
+def _fluxo_contratos(saldo0, taxa, prazo, idade, price, k, cpr, cdr, rampa):
+    """Fluxo em forma fechada de um bloco de contratos: matrizes (contratos, meses + 1).
+
+    Sem pré-pagamento e inadimplência, a fração do saldo original que resta no
+    mês k é `programado`; com eles, o saldo é `programado * sobrevivencia`, em que
+    a sobrevivência acumula (1 - inadimplência mensal) * (1 - pré-pagamento mensal).
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # Fração programada do saldo: Price pela razão dos fatores de capitalização, SAC linear
+        log_fator = np.log1p(taxa)
+        price_fracao = (np.expm1(prazo * log_fator) - np.expm1(k * log_fator)) / np.expm1(prazo * log_fator)
+        linear = 1 - k / prazo
+        programado = np.where(price & (taxa != 0), price_fracao, linear)
+        programado = np.where(k < prazo, np.clip(programado, 0.0, 1.0), 0.0)
+
+        # Curvas pela idade do contrato: frações anuais viram mensais depois da rampa
+        escala = np.minimum(1.0, (idade + k) / rampa) if rampa > 0 else np.ones((1, len(k)))
+        smm = 1 - (1 - np.minimum(cpr / 100.0 * escala, 1.0))**(1/12)
+        mdr = 1 - (1 - np.minimum(cdr / 100.0 * escala, 1.0))**(1/12)
+        smm[:, 0] = mdr[:, 0] = 0.0
+        sobrevivencia = np.cumprod((1 - mdr) * (1 - smm), axis=-1)
+
+        saldo = saldo0 * programado * sobrevivencia
+        anterior = np.zeros(saldo.shape)
+        anterior[:, 1:] = saldo[:, :-1]
+        inadimplencia = anterior * mdr
+        adimplente = anterior - inadimplencia
+        razao = np.zeros(programado.shape)
+        razao[:, 1:] = np.where(programado[:, :-1] > 0, programado[:, 1:] / programado[:, :-1], 0.0)
+    juros = adimplente * taxa
+    amortizacao = adimplente * (1 - razao)
+    pre_pagamento = adimplente * razao * smm
+    return {'saldo': saldo, 'juros': juros, 'amortizacao': amortizacao, 'pre_pagamento': pre_pagamento,
+            'inadimplencia': inadimplencia}
+
+
+@functools.lru_cache(maxsize=16)
+def _carregar(caminho, _assinatura):
+    recebiveis = Recebiveis.de_arquivo(caminho)
+    erros = recebiveis.validar()
+    if len(erros):
+        primeiro = erros.iloc[0]
+        raise ValueError(f"Fita de recebíveis '{caminho}': {len(erros)} erro(s), o primeiro na linha {primeiro['Linha']}, "
+                         f"coluna '{primeiro['Coluna']}': {primeiro['Mensagem']}")
+    return recebiveis
+
+
+def carregar_recebiveis(caminho):
+    """Fita de recebíveis de um arquivo, lida uma vez enquanto o arquivo não mudar."""
+    assinatura = _assinatura_arquivo(caminho)
+    if not assinatura:
+        raise ValueError(f"Fita de recebíveis '{caminho}' não encontrada")
+    return _carregar(os.path.abspath(caminho), assinatura)
+
+
+def cascata(saldo, juros, principal, inadimplencia, severidade, subordinacao, taxa_senior):
+    """Cascata sequencial do lastro entre as tranches Sênior e Subordinada.
+
+    Recebe o fluxo nominal do lastro em (..., meses + 1), a severidade e a
+    subordinação em % e a remuneração mensal da Sênior em (..., meses + 1). A cada mês
+    o caixa do lastro (juros, amortizações e recuperações) paga primeiro os juros
+    da Sênior (o que faltar é incorporado ao saldo dela) e depois amortiza a
+    Sênior até que ela volte a `1 - subordinação` do saldo do lastro; o que sobra
+    vai para a Subordinada. As perdas atingem primeiro a Subordinada, e a Sênior
+    só é baixada quando passa do saldo do lastro.
+
+    Devolve {tranche: (saldo, recebido, perda)}, cada um em (..., meses + 1).
+    """
+    fracao_senior = 1 - subordinacao / 100.0
+    recuperacao = inadimplencia * (1 - severidade / 100.0)
+    perda_lastro = inadimplencia - recuperacao
+    disponivel_total = juros + principal + recuperacao
+    saidas = {tranche: (np.zeros(saldo.shape), np.zeros(saldo.shape), np.zeros(saldo.shape)) for tranche in TRANCHES}
+    (saldo_sen, recebido_sen, perda_sen), (saldo_sub, recebido_sub, perda_sub) = saidas['Sênior'], saidas['Subordinada']
+    senior = saldo[..., 0] * fracao_senior
+    saldo_sen[..., 0], saldo_sub[..., 0] = senior, saldo[..., 0] - senior
+    # Só a cascata depende do mês anterior; cada passo é vetorial no eixo de cenários
+    for mes in range(1, saldo.shape[-1]):
+        disponivel = disponivel_total[..., mes]
+        devido = senior * taxa_senior[..., mes]
+        juros_pagos = np.minimum(devido, disponivel)
+        senior = senior + devido - juros_pagos
+        amortizado = np.clip(senior - fracao_senior * saldo[..., mes], 0.0, disponivel - juros_pagos)
+        baixa = np.maximum(senior - amortizado - saldo[..., mes], 0.0)
+        senior = senior - amortizado - baixa
+        saldo_sen[..., mes], recebido_sen[..., mes], perda_sen[..., mes] = senior, juros_pagos + amortizado, baixa
+        saldo_sub[..., mes] = saldo[..., mes] - senior
+        recebido_sub[..., mes] = disponivel - juros_pagos - amortizado
+        perda_sub[..., mes] = np.minimum(perda_lastro[..., mes], saldo_sub[..., mes - 1])
+    return saidas
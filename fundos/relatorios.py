@@ -0,0 +1,58 @@
+"""Tabelas derivadas da projeção: DRE anual e indicadores do investidor."""
+import numpy as np
+import pandas as pd
+
+from fundos.indicadores import indicadores_investidor, tir_investidor
+from fundos.perfil import etapa
+from fundos.tir import DESCRICAO_STATUS
+
+LINHAS_RECEITA = ["(+) Receita de Ativos", "(+) Receita de Caixa", "(=) Receita Bruta", "--- Despesas ---"]
+LINHAS_RESULTADO = ["(-) Taxa de Performance", "(=) Total Despesas", "(=) Resultado Operacional (Lucro Caixa)",
+                    "(-) Dividendos Distribuídos", "(=) Resultado Líquido Retido"]
+
+
+def linhas_dre(nomes_despesas):
+    return LINHAS_RECEITA + [f"(-) {nome}" for nome in dict.fromkeys(nomes_despesas)] + LINHAS_RESULTADO
+
+
+def montar_dre(df, nomes_despesas):
+    """DRE anual (anos x linhas) a partir do fluxo mensal, sem o ano da data de início."""
+    if df.empty:
+        return pd.DataFrame(columns=linhas_dre(nomes_despesas))
+    with etapa("DRE: groupby('Ano')", 'tabelas', linhas=len(df), colunas=df.shape[1]):
+        df_anual = df.groupby('Ano').sum()
+    df_anual = df_anual[df_anual.index != df['Ano'].min()]
+    receita_bruta = df_anual['Ativos_Rend_R$'] + df_anual['Caixa_Rend_R$']
+    resultado_operacional = receita_bruta - df_anual['Total Despesas']
+    colunas = {
+        "(+) Receita de Ativos": df_anual['Ativos_Rend_R$'],
+        "(+) Receita de Caixa": df_anual['Caixa_Rend_R$'],
+        "(=) Receita Bruta": receita_bruta,
+        "--- Despesas ---": np.nan,
+    }
+    for nome in dict.fromkeys(nomes_despesas):
+        colunas[f"(-) {nome}"] = df_anual[f"(-) {nome}"]
+    colunas.update({
+        "(-) Taxa de Performance": df_anual['(-) Taxa de Performance'],
+        "(=) Total Despesas": df_anual['Total Despesas'],
+        "(=) Resultado Operacional (Lucro Caixa)": resultado_operacional,
+        "(-) Dividendos Distribuídos": df_anual['(-) Dividendos'],
+        "(=) Resultado Líquido Retido": resultado_operacional - df_anual['(-) Dividendos'],
+    })
+    return pd.DataFrame(colunas, index=df_anual.index.rename(None))
+
+
+def resumo_investidor(resultado):
+    """Indicadores escalares do investidor para uma projeção, com o diagnóstico da TIR."""
+    series = (resultado.aportes, resultado.amortizacoes, resultado.dividendos, resultado.pl_final)
+    solucao = tir_investidor(*series)
+    indicadores = indicadores_investidor(*series, solucao_tir=solucao)
+    resumo = {nome: float(valores[0]) for nome, valores in indicadores.items()}
+    resumo.update({
+        'TIR Status': DESCRICAO_STATUS[int(solucao.status[0])],
+        'TIR Ambígua': bool(solucao.ambigua[0]),
+        'Total Investido': float(resultado.aportes.sum()),
+        'Total Distribuído': float((resultado.amortizacoes + resultado.dividendos).sum()),
+        'PL Final': float(resultado.pl_final[-1]),
+    })
+    return resumo
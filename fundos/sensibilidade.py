@@ -0,0 +1,274 @@
+"""Sensibilidade dos indicadores do investidor a qualquer entrada numérica.
+
+As entradas são endereçadas por caminhos como `projecao_cdi`,
+`ativos[2].Cap Rate Saida` ou `despesas[0].Valor`. Grades que só variam
+CDI/IPCA rodam no motor em lote (um cenário de taxas por ponto); as demais são
+distribuídas num pool de processos, cada um com o seu cache de cronogramas, de
+forma que variar um único ativo só recalcula aquele ativo.
+"""
+import copy
+import dataclasses
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from fundos.cache import CacheProjecao
+from fundos.carteira import COLUNAS_INTEIRAS, MAXIMOS, MINIMOS, Carteira
+from fundos.indicadores import indicadores_investidor
+from fundos.motor import ParametrosFundo, projetar_lote, taxas_mensais
+
+LISTAS = ('ativos', 'despesas', 'aportes', 'amortizacoes')
+VARIAVEIS_TAXAS = {'projecao_cdi', 'projecao_ipca'}
+INDICADORES = ('TIR', 'MOIC', 'DPI', 'RVPI', 'Payback (meses)')
+_CAMINHO_LISTA = re.compile(r'^(\w+)\[(\d+)\]\.(.+)$')
+# Faixas válidas (mínimo, máximo) dos parâmetros gerais; None deixa o lado livre
+LIMITES_PARAMETROS = {'duracao_anos': (1, None), 'aporte_inicial': (0, None), 'projecao_cdi': (-99.99, None),
+                      'projecao_ipca': (-99.99, None), 'dist_percentual': (0, 100), 'perf_percentual': (0, 100),
+                      'perf_carencia': (0, None)}
+LIMITES_EVENTOS = {'Mês': (1, None), 'Valor': (0, None)}
+CAMPOS_INTEIROS = {*COLUNAS_INTEIRAS, 'duracao_anos', 'perf_carencia', 'Mês'}
+
+
+def _separar(caminho):
+    encontrado = _CAMINHO_LISTA.match(caminho)
+    if encontrado:
+        lista, indice, campo = encontrado.groups()
+        if lista not in LISTAS:
+            raise KeyError(f"Lista desconhecida em '{caminho}'")
+        return lista, int(indice), campo
+    if caminho not in {f.name for f in dataclasses.fields(ParametrosFundo)}:
+        raise KeyError(f"Parâmetro desconhecido: '{caminho}'")
+    return None, None, caminho
+
+
+def ler_valor(definicao, caminho):
+    lista, indice, campo = _separar(caminho)
+    if lista is None:
+        return getattr(definicao.parametros, campo)
+    return getattr(definicao, lista)[indice][campo]
+
+
+def limites(definicao, caminho):
+    """(mínimo, máximo) válidos de uma entrada, com None no lado sem limite."""
+    lista, indice, campo = _separar(caminho)
+    if lista is None:
+        return LIMITES_PARAMETROS.get(campo, (None, None))
+    if lista == 'ativos':
+        return MINIMOS.get(campo), MAXIMOS.get(campo)
+    if lista == 'despesas':
+        return (0, 100 if getattr(definicao, lista)[indice].get('Tipo') == '% do PL' else None) if campo == 'Valor' else (None, None)
+    return LIMITES_EVENTOS.get(campo, (None, None))
+
+
+def limitar(definicao, caminho, valor):
+    """O valor trazido para a faixa válida da entrada (inteiros arredondados) e se bateu num dos extremos."""
+    minimo, maximo = limites(definicao, caminho)
+    ajustado = valor
+    if minimo is not None:
+        ajustado = max(ajustado, minimo)
+    if maximo is not None:
+        ajustado = min(ajustado, maximo)
+    # Só conta como limitado o que bateu num extremo; o arredondamento dos inteiros não
+    limitado = ajustado != valor
+    if _separar(caminho)[2] in CAMPOS_INTEIROS:
+        ajustado = type(ajustado)(round(ajustado))
+    return ajustado, limitado
+
+
+def aplicar_valores(definicao, valores):
+    """Cópia da definição com os caminhos de `valores` substituídos; a original não muda."""
+    nova = copy.copy(definicao)
+    alteracoes_parametros = {}
+    listas_copiadas = {}
+    alteracoes_carteira = []
+    for caminho, valor in valores.items():
+        lista, indice, campo = _separar(caminho)
+        if lista is None:
+            alteracoes_parametros[campo] = valor
+            continue
+        if isinstance(getattr(definicao, lista), Carteira):
+            alteracoes_carteira.append((indice, campo, valor))
+            continue
+        if lista not in listas_copiadas:
+            listas_copiadas[lista] = list(getattr(definicao, lista))
+        itens = listas_copiadas[lista]
+        itens[indice] = {**itens[indice], campo: valor}
+    if alteracoes_parametros:
+        nova.parametros = dataclasses.replace(definicao.parametros, **alteracoes_parametros)
+    for lista, itens in listas_copiadas.items():
+        setattr(nova, lista, itens)
+    if alteracoes_carteira:
+        nova.ativos = definicao.ativos.com_valores(alteracoes_carteira)
+    return nova
+
+
+def variaveis_numericas(definicao):
+    """Caminhos e rótulos de todas as entradas numéricas da definição."""
+    variaveis = {}
+    for f in dataclasses.fields(ParametrosFundo):
+        valor = getattr(definicao.parametros, f.name)
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            variaveis[f.name] = f.name
+    for lista in LISTAS:
+        for i, item in enumerate(getattr(definicao, lista)):
+            nome = item.get('Nome', f"{lista} {i + 1}")
+            for campo, valor in item.items():
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    variaveis[f"{lista}[{i}].{campo}"] = f"{nome} · {campo}"
+    return variaveis
+
+
+def avaliar(definicao, cache=None):
+    """Indicadores escalares do investidor para uma definição."""
+    entradas = definicao.entradas()
+    resultado = cache.projetar(*entradas) if cache is not None else definicao.projetar()
+    indicadores = indicadores_investidor(resultado.aportes, resultado.amortizacoes, resultado.dividendos, resultado.pl_final)
+    return {nome: float(valores[0]) for nome, valores in indicadores.items()}
+
+
+_BASE = None
+_CACHE = None
+
+
+def _iniciar_trabalhador(definicao):
+    global _BASE, _CACHE
+    _BASE, _CACHE = definicao, CacheProjecao()
+
+
+def _avaliar_bloco(bloco):
+    return [(i, avaliar(aplicar_valores(_BASE, valores), _CACHE)) for i, valores in bloco]
+
+
+def _avaliar_taxas_em_lote(definicao, pontos, tamanho_lote=500):
+    """Cada ponto vira um cenário de taxas e o bloco roda de uma vez no motor em lote.
+
+    As taxas de cada ponto saem das mesmas curvas da projeção isolada: um índice
+    com curva própria não muda com a projeção plana dele.
+    """
+    parametros = definicao.parametros
+    for inicio in range(0, len(pontos), tamanho_lote):
+        bloco = pontos[inicio:inicio + tamanho_lote]
+        por_ponto = [taxas_mensais(dataclasses.replace(parametros, **p)) for p in bloco]
+        taxas = {indice: np.stack([t[indice] for t in por_ponto]) for indice in ('CDI', 'IPCA')}
+        taxas['IGP-M'] = taxas['IPCA'] if 'IGP-M' not in (parametros.curvas or {}) else np.stack([t['IGP-M'] for t in por_ponto])
+        lote = projetar_lote(parametros, definicao.ativos, definicao.despesas, definicao.aportes, definicao.amortizacoes, taxas)
+        indicadores = indicadores_investidor(lote.aportes, lote.amortizacoes, lote.dividendos, lote.pl_final)
+        yield [(inicio + j, {nome: float(v[j]) for nome, v in indicadores.items()}) for j in range(len(bloco))]
+
+
+def avaliar_pontos(definicao, pontos, processos=None, ao_concluir=None):
+    """Avalia uma lista de pontos ({caminho: valor}) e devolve os indicadores na mesma ordem.
+
+    `ao_concluir(parciais, concluidos, total)` é chamado a cada bloco terminado,
+    com a lista [(índice do ponto, indicadores)] do bloco, para exibição progressiva.
+    """
+    total = len(pontos)
+    resultados = [None] * total
+    processos = processos or os.cpu_count() or 1
+
+    def registrar(parciais):
+        for i, indicadores in parciais:
+            resultados[i] = indicadores
+        if ao_concluir is not None:
+            ao_concluir(parciais, sum(r is not None for r in resultados), total)
+
+    if pontos and all(set(p) <= VARIAVEIS_TAXAS for p in pontos):
+        for parciais in _avaliar_taxas_em_lote(definicao, pontos):
+            registrar(parciais)
+        return resultados
+
+    indexados = list(enumerate(pontos))
+    if processos == 1 or total < 4 * processos:
+        _iniciar_trabalhador(definicao)
+        tamanho = max(1, total // 20)
+        for inicio in range(0, total, tamanho):
+            registrar(_avaliar_bloco(indexados[inicio:inicio + tamanho]))
+        return resultados
+
+    tamanho = max(1, int(np.ceil(total / (processos * 4))))
+    blocos = [indexados[i:i + tamanho] for i in range(0, total, tamanho)]
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_trabalhador, initargs=(definicao,)) as pool:
+        for futuro in as_completed([pool.submit(_avaliar_bloco, bloco) for bloco in blocos]):
+            registrar(futuro.result())
+    return resultados
+
+
+@dataclass
+class ResultadoGrade:
+    """Superfícies dos indicadores: matrizes (len(valores_y), len(valores_x)) ou vetores em 1D."""
+    variavel_x: str
+    valores_x: np.ndarray
+    variavel_y: str
+    valores_y: np.ndarray
+    superficies: dict
+
+    def para_dataframe(self, indicador='TIR'):
+        superficie = self.superficies[indicador]
+        if self.variavel_y is None:
+            return pd.DataFrame({indicador: superficie}, index=pd.Index(self.valores_x, name=self.variavel_x))
+        return pd.DataFrame(superficie, index=pd.Index(self.valores_y, name=self.variavel_y),
+                            columns=pd.Index(self.valores_x, name=self.variavel_x))
+
+
+def grade_sensibilidade(definicao, variavel_x, valores_x, variavel_y=None, valores_y=None,
+                        processos=None, ao_concluir=None):
+    """Varre uma (ou duas) entradas numa grade e devolve a superfície de todos os indicadores.
+
+    `ao_concluir(grade_parcial, concluidos, total)` recebe um `ResultadoGrade` com
+    NaN nos pontos ainda pendentes, para atualizar um mapa de calor durante a execução.
+    """
+    valores_x = np.asarray(valores_x, dtype=float)
+    valores_y = None if variavel_y is None else np.asarray(valores_y, dtype=float)
+    forma = (len(valores_x),) if variavel_y is None else (len(valores_y), len(valores_x))
+    superficies = {nome: np.full(forma, np.nan) for nome in INDICADORES}
+    grade = ResultadoGrade(variavel_x, valores_x, variavel_y, valores_y, superficies)
+
+    if variavel_y is None:
+        posicoes = [(i,) for i in range(len(valores_x))]
+        pontos = [{variavel_x: float(x)} for x in valores_x]
+    else:
+        posicoes = [(j, i) for j in range(len(valores_y)) for i in range(len(valores_x))]
+        pontos = [{variavel_x: float(valores_x[i]), variavel_y: float(valores_y[j])} for j, i in posicoes]
+
+    def acumular(parciais, concluidos, total):
+        for indice, indicadores in parciais:
+            for nome, valor in indicadores.items():
+                superficies[nome][posicoes[indice]] = valor
+        if ao_concluir is not None:
+            ao_concluir(grade, concluidos, total)
+
+    avaliar_pontos(definicao, pontos, processos, acumular)
+    return grade
+
+
+def tornado(definicao, variaveis, variacao=0.10, faixas=None, indicador='TIR', processos=None):
+    """Impacto de cada variável no indicador ao movê-la para baixo e para cima.
+
+    Por padrão cada variável varia ±`variacao` em torno do valor base; `faixas`
+    permite informar (baixo, alto) explícitos por caminho. Extremos fora da faixa
+    válida da entrada (ver `limites`) são trazidos para ela e marcados na coluna
+    'Limitado'. O resultado vem ordenado da maior para a menor amplitude.
+    """
+    faixas = faixas or {}
+    extremos = {}
+    limitados = {}
+    for caminho in variaveis:
+        base = ler_valor(definicao, caminho)
+        pedidos = faixas.get(caminho, (base * (1 - variacao), base * (1 + variacao)))
+        ajustes = [limitar(definicao, caminho, valor) for valor in pedidos]
+        extremos[caminho] = tuple(valor for valor, _ in ajustes)
+        limitados[caminho] = any(ajustado for _, ajustado in ajustes)
+    pontos = [{}] + [{caminho: valor} for caminho in variaveis for valor in extremos[caminho]]
+    resultados = avaliar_pontos(definicao, pontos, processos)
+    base = resultados[0][indicador]
+    linhas = []
+    for k, caminho in enumerate(variaveis):
+        baixo, alto = resultados[1 + 2 * k][indicador], resultados[2 + 2 * k][indicador]
+        linhas.append({'Variável': caminho, 'Valor Baixo': extremos[caminho][0], 'Valor Alto': extremos[caminho][1],
+                       f'{indicador} Baixo': baixo, f'{indicador} Alto': alto,
+                       'Amplitude': abs(alto - baixo), 'Base': base, 'Limitado': limitados[caminho]})
+    return pd.DataFrame(linhas).sort_values('Amplitude', ascending=False, ignore_index=True)
@@ -0,0 +1,262 @@
+"""Cálculo de TIR/XTIR em lote sobre matrizes de fluxos (linhas x períodos).
+
+Cada linha é resolvida por Newton protegido por intervalo (passo de bissecção
+sempre que o Newton sai do intervalo com troca de sinal), com todas as linhas
+ativas avançando juntas. O custo por iteração é O(linhas x períodos), em vez da
+decomposição em autovalores O(n³) de `numpy_financial.irr`.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+CONVERGIU = 0
+SEM_TROCA_DE_SINAL = 1
+SEM_INTERVALO = 2
+NAO_CONVERGIU = 3
+FORA_DA_FAIXA = 4
+FLUXO_INVALIDO = 5
+
+DESCRICAO_STATUS = {
+    CONVERGIU: "Convergiu",
+    SEM_TROCA_DE_SINAL: "Fluxo sem troca de sinal: não existe TIR",
+    SEM_INTERVALO: "Nenhuma taxa com troca de sinal do VPL no intervalo pesquisado",
+    NAO_CONVERGIU: "Limite de iterações atingido",
+    FORA_DA_FAIXA: "TIR fora da faixa: o VPL não troca de sinal entre a menor taxa representável e a maior pesquisada",
+    FLUXO_INVALIDO: "Fluxo com valores não finitos (NaN ou infinito)",
+}
+
+# Taxas por período usadas para localizar intervalos quando não há chute inicial; fora da
+# grade a busca se expande geometricamente em (1 + taxa) até a menor taxa representável
+# e até `TAXA_MAXIMA`
+GRADE_TAXAS = np.array([-0.5, -0.3, -0.2, -0.1, -0.05, -0.02, -0.01, 0.0, 0.005, 0.01,
+                        0.02, 0.03, 0.05, 0.1, 0.2, 0.5, 1.0, 3.0])
+TAXA_MAXIMA = 1e9
+
+
+@dataclass
+class ResultadoTIR:
+    """TIR por linha (por período dos fluxos) e diagnóstico da solução.
+
+    `ambigua` marca as linhas cujo fluxo pode ter mais de uma TIR: mais de uma
+    troca de sinal sem que o saldo acumulado troque de sinal uma única vez
+    (critério de Norstrom), ou mais de um intervalo com raiz encontrado na grade.
+    Nesses casos a taxa devolvida é a raiz mais próxima do chute inicial.
+    """
+    taxa: np.ndarray
+    status: np.ndarray
+    iteracoes: np.ndarray
+    trocas_sinal: np.ndarray
+    ambigua: np.ndarray
+
+    @property
+    def convergiu(self):
+        return self.status == CONVERGIU
+
+    def descricao(self, linha=0):
+        return DESCRICAO_STATUS[int(self.status[linha])]
+
+
+def _limite_representavel(periodos):
+    # Mantém (1 + r)^-t representável para o maior expoente dos fluxos
+    return max(-1 + 1e-9, float(np.expm1(-600.0 / max(float(np.max(periodos)), 1.0))))
+
+
+def _limite_inferior(periodos):
+    return max(-0.5, _limite_representavel(periodos))
+
+
+def _vpl_e_derivada(fluxos, taxas, periodos):
+    log_desconto = -np.log1p(taxas)[:, np.newaxis] * periodos
+    descontados = fluxos * np.exp(log_desconto)
+    vpl = descontados.sum(axis=1)
+    derivada = -(descontados * periodos).sum(axis=1) / (1 + taxas)
+    return vpl, derivada
+
+
+def vpl_lote(fluxos, taxas, periodos=None):
+    """VPL de cada linha de `fluxos` descontada pela taxa correspondente."""
+    fluxos = np.atleast_2d(np.asarray(fluxos, dtype=float))
+    periodos = np.arange(fluxos.shape[1]) if periodos is None else np.asarray(periodos, dtype=float)
+    taxas = np.broadcast_to(np.asarray(taxas, dtype=float), fluxos.shape[:1])
+    return _vpl_e_derivada(fluxos, taxas, periodos)[0]
+
+
+def _trocas_de_sinal(fluxos):
+    sinais = np.sign(fluxos)
+    contagem = np.zeros(fluxos.shape[0], dtype=int)
+    anterior = np.zeros(fluxos.shape[0])
+    for coluna in sinais.T:
+        nao_nulo = coluna != 0
+        contagem += nao_nulo & (anterior != 0) & (coluna != anterior)
+        anterior = np.where(nao_nulo, coluna, anterior)
+    return contagem
+
+
+def _saldo_troca_uma_vez(fluxos):
+    acumulado = np.cumsum(fluxos, axis=1)
+    return (_trocas_de_sinal(acumulado) == 1) & (acumulado[:, -1] != 0)
+
+
+def _intervalo_local(fluxos, periodos, chute, minimo, maximo, expansoes=10):
+    """Expande [chute - d, chute + d] geometricamente até haver troca de sinal do VPL."""
+    n = fluxos.shape[0]
+    baixo, alto = np.empty(n), np.empty(n)
+    achou = np.zeros(n, dtype=bool)
+    delta = 1e-3
+    vpl_chute = _vpl_e_derivada(fluxos, chute, periodos)[0]
+    for _ in range(expansoes):
+        pendentes = np.flatnonzero(~achou)
+        if len(pendentes) == 0:
+            break
+        c = chute[pendentes]
+        lados = (np.maximum(c - delta, minimo), np.minimum(c + delta, maximo))
+        for lado in lados:
+            pendentes_lado = pendentes[~achou[pendentes]]
+            if len(pendentes_lado) == 0:
+                break
+            posicao = np.searchsorted(pendentes, pendentes_lado)
+            vpl_lado = _vpl_e_derivada(fluxos[pendentes_lado], lado[posicao], periodos)[0]
+            troca = np.sign(vpl_lado) != np.sign(vpl_chute[pendentes_lado])
+            linhas = pendentes_lado[troca]
+            extremo = lado[posicao][troca]
+            inferior = extremo < chute[linhas]
+            baixo[linhas] = np.where(inferior, extremo, chute[linhas])
+            alto[linhas] = np.where(inferior, chute[linhas], extremo)
+            achou[linhas] = True
+        delta *= 4
+    return baixo, alto, achou
+
+
+def _intervalo_grade(fluxos, periodos, chute, minimo, maximo):
+    """Procura na grade de taxas o intervalo com troca de sinal mais próximo do chute."""
+    grade = GRADE_TAXAS[(GRADE_TAXAS >= minimo) & (GRADE_TAXAS <= maximo)]
+    grade = np.unique(np.r_[minimo, grade, maximo])
+    vpls = np.stack([_vpl_e_derivada(fluxos, np.full(fluxos.shape[0], taxa), periodos)[0] for taxa in grade], axis=1)
+    trocas = np.sign(vpls[:, :-1]) * np.sign(vpls[:, 1:]) <= 0
+    trocas &= ~((vpls[:, :-1] == 0) & (vpls[:, 1:] == 0))
+    centros = (grade[:-1] + grade[1:]) / 2
+    distancia = np.where(trocas, np.abs(centros - chute[:, np.newaxis]), np.inf)
+    escolhido = distancia.argmin(axis=1)
+    achou = trocas.any(axis=1)
+    return grade[escolhido], grade[escolhido + 1], achou, trocas.sum(axis=1) > 1
+
+
+def _intervalo_expandido(fluxos, periodos, minimo, maximo, piso):
+    """Fora de [minimo, maximo], eleva (1 + taxa) ao quadrado a cada passo, para cima até
+    `TAXA_MAXIMA` e para baixo até `piso`, parando na primeira troca de sinal do VPL de cada lado."""
+    n = fluxos.shape[0]
+    baixo, alto = np.full(n, np.nan), np.full(n, np.nan)
+
+    def acima(r):
+        return min((1 + r)**2 - 1, TAXA_MAXIMA)
+
+    def abaixo(r):
+        return max((1 + r)**2 - 1, piso)
+
+    for inicio, fim, passo in ((maximo, TAXA_MAXIMA, acima), (minimo, piso, abaixo)):
+        anterior = inicio
+        vpl_anterior = _vpl_e_derivada(fluxos, np.full(n, anterior), periodos)[0]
+        # Acima da grade procura-se primeiro; abaixo, só as linhas que ainda não têm intervalo
+        pendentes = np.isnan(baixo)
+        while anterior != fim and pendentes.any():
+            taxa = passo(anterior)
+            vpl = _vpl_e_derivada(fluxos, np.full(n, taxa), periodos)[0]
+            troca = pendentes & (np.sign(vpl) != np.sign(vpl_anterior))
+            baixo[troca] = min(anterior, taxa)
+            alto[troca] = max(anterior, taxa)
+            pendentes &= ~troca
+            anterior, vpl_anterior = taxa, vpl
+    return baixo, alto, ~np.isnan(baixo)
+
+
+def tir_lote(fluxos, periodos=None, chute=None, tolerancia=1e-12, max_iter=100):
+    """TIR de cada linha de `fluxos` (linhas x períodos), na unidade dos períodos.
+
+    `periodos` dá o instante de cada coluna (padrão 0, 1, 2, ...), podendo ser
+    fracionário; `chute` (escalar ou por linha) serve de partida a quente e,
+    quando informado, limita a busca a uma vizinhança que cresce até achar a raiz.
+    Sem raiz na grade, a busca se expande até a menor taxa representável e até
+    `TAXA_MAXIMA`; se nem assim o VPL trocar de sinal, o status é `FORA_DA_FAIXA`.
+    Linhas com NaN ou infinito não são resolvidas e saem com `FLUXO_INVALIDO`.
+    """
+    fluxos = np.atleast_2d(np.asarray(fluxos, dtype=float))
+    n = fluxos.shape[0]
+    periodos = np.arange(fluxos.shape[1], dtype=float) if periodos is None else np.asarray(periodos, dtype=float)
+    minimo, maximo = _limite_inferior(periodos), float(GRADE_TAXAS[-1])
+    taxa = np.full(n, np.nan)
+    status = np.full(n, SEM_INTERVALO)
+    iteracoes = np.zeros(n, dtype=int)
+    validas = np.isfinite(fluxos).all(axis=1)
+    trocas = _trocas_de_sinal(fluxos)
+    ambigua = (trocas > 1) & ~_saldo_troca_uma_vez(fluxos) & validas
+    status[trocas == 0] = SEM_TROCA_DE_SINAL
+    status[~validas] = FLUXO_INVALIDO
+
+    candidatas = np.flatnonzero((trocas > 0) & validas)
+    partida = np.clip(np.broadcast_to(np.asarray(0.01 if chute is None else chute, dtype=float), (n,)),
+                      minimo, maximo)
+    baixo, alto = np.full(n, minimo), np.full(n, maximo)
+    achou = np.zeros(n, dtype=bool)
+    if chute is not None and len(candidatas):
+        b, a, ok = _intervalo_local(fluxos[candidatas], periodos, partida[candidatas], minimo, maximo)
+        baixo[candidatas], alto[candidatas], achou[candidatas] = b, a, ok
+    restantes = candidatas[~achou[candidatas]]
+    if len(restantes):
+        b, a, ok, varias = _intervalo_grade(fluxos[restantes], periodos, partida[restantes], minimo, maximo)
+        baixo[restantes], alto[restantes], achou[restantes] = b, a, ok
+        # Com uma só troca de sinal a raiz é única; dois intervalos vêm de uma raiz sobre um ponto da grade
+        ambigua[restantes] |= varias & (trocas[restantes] > 1)
+    restantes = candidatas[~achou[candidatas]]
+    if len(restantes):
+        b, a, ok = _intervalo_expandido(fluxos[restantes], periodos, minimo, maximo, _limite_representavel(periodos))
+        baixo[restantes[ok]], alto[restantes[ok]], achou[restantes] = b[ok], a[ok], ok
+        status[restantes[~ok]] = FORA_DA_FAIXA
+
+    # Newton protegido: o intervalo [baixo, alto] sempre contém a troca de sinal
+    ativas = np.flatnonzero(achou)
+    status[ativas] = NAO_CONVERGIU
+    r = np.clip(partida, baixo, alto)
+    vpl_baixo = np.full(n, np.nan)
+    if len(ativas):
+        vpl_baixo[ativas] = _vpl_e_derivada(fluxos[ativas], baixo[ativas], periodos)[0]
+    for iteracao in range(1, max_iter + 1):
+        if len(ativas) == 0:
+            break
+        ra = r[ativas]
+        vpl, derivada = _vpl_e_derivada(fluxos[ativas], ra, periodos)
+        mesmo_lado = np.sign(vpl) == np.sign(vpl_baixo[ativas])
+        baixo[ativas] = np.where(mesmo_lado, ra, baixo[ativas])
+        vpl_baixo[ativas] = np.where(mesmo_lado, vpl, vpl_baixo[ativas])
+        alto[ativas] = np.where(mesmo_lado, alto[ativas], ra)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = ra - vpl / derivada
+        dentro = np.isfinite(newton) & (newton >= baixo[ativas]) & (newton <= alto[ativas])
+        nova = np.where(dentro, newton, (baixo[ativas] + alto[ativas]) / 2)
+        r[ativas] = nova
+        iteracoes[ativas] = iteracao
+
+        escala = 1 + np.abs(nova)
+        pronta = (np.abs(nova - ra) <= tolerancia * escala) | (alto[ativas] - baixo[ativas] <= tolerancia * escala) | (vpl == 0)
+        r[ativas[vpl == 0]] = ra[vpl == 0]
+        status[ativas[pronta]] = CONVERGIU
+        ativas = ativas[~pronta]
+
+    taxa[status == CONVERGIU] = r[status == CONVERGIU]
+    return ResultadoTIR(taxa, status, iteracoes, trocas, ambigua)
+
+
+def xtir_lote(fluxos, datas, chute=None, base_dias=365.0, **kwargs):
+    """TIR anual de fluxos em datas irregulares (XIRR), com as mesmas opções de `tir_lote`."""
+    datas = np.asarray(datas, dtype='datetime64[D]')
+    periodos = (datas - datas[0]).astype(float) / base_dias
+    return tir_lote(fluxos, periodos=periodos, chute=chute, **kwargs)
+
+
+def tir(fluxo, chute=None):
+    """TIR por período de um único fluxo; NaN quando não há solução."""
+    return float(tir_lote(fluxo, chute=chute).taxa[0])
+
+
+def anualizar(tir_mensal):
+    return (1 + tir_mensal)**12 - 1
@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+import pytest
+
+from fundos.banco import BancoCenarios
+from fundos.benchmark import fundo_sintetico
+from fundos.motor import DefinicaoFundo
+
+
+@pytest.fixture(scope='module')
+def definicao():
+    return fundo_sintetico(anos=3, ativos=5, despesas=2, eventos=2)
+
+
+@pytest.fixture
+def banco(tmp_path):
+    with BancoCenarios(tmp_path / 'cenarios.db') as banco:
+        yield banco
+
+
+def _copia(definicao):
+    """Mesmo fundo montado de novo, com listas e carteira independentes da original."""
+    return DefinicaoFundo(copy.deepcopy(definicao.parametros), list(definicao.ativos), copy.deepcopy(definicao.despesas),
+                          copy.deepcopy(definicao.aportes), copy.deepcopy(definicao.amortizacoes))
+
+
+def test_chave_estavel_para_definicoes_identicas(definicao):
+    assert BancoCenarios.chave(definicao) == BancoCenarios.chave(_copia(definicao))
+    outra = _copia(definicao)
+    outra.parametros.projecao_cdi += 1
+    assert BancoCenarios.chave(outra) != BancoCenarios.chave(definicao)
+
+
+def test_ida_e_volta(banco, definicao):
+    resultado = definicao.projetar()
+    chave = banco.salvar(definicao, resultado, nome='Base')
+    assert chave in banco and len(banco) == 1
+    assert banco.nome(chave) == 'Base'
+
+    lido = banco.carregar(chave)
+    np.testing.assert_array_equal(lido.tabela, resultado.tabela)
+    assert list(lido.nomes_ativos) == list(resultado.nomes_ativos)
+    assert lido.parametros == resultado.parametros
+    assert BancoCenarios.chave(banco.carregar_definicao(chave)) == chave
+    assert banco.carregar('inexistente') is None
+
+
+def test_cenarios_repetidos_sao_lidos_do_banco(banco, definicao):
+    resultado, do_banco = banco.projetar(definicao, nome='Primeiro')
+    assert not do_banco
+    repetido, do_banco = banco.projetar(_copia(definicao), nome='Segundo')
+    assert do_banco
+    np.testing.assert_array_equal(repetido.tabela, resultado.tabela)
+    # Gravar de novo o mesmo cenário não duplica nem renomeia
+    banco.salvar(definicao, resultado, nome='Terceiro')
+    assert len(banco) == 1
+    assert banco.listar()['Nome'].tolist() == ['Primeiro']
+
+
+def test_renomear_listar_e_remover(banco, definicao):
+    outra = _copia(definicao)
+    outra.parametros.dist_percentual = 50.0
+    chaves = banco.salvar_lote([(definicao, definicao.projetar(), 'A'), (outra, outra.projetar(), 'B')])
+    banco.renomear(chaves[1], 'Distribuição menor')
+    assert banco.listar(busca='menor')['Hash'].tolist() == [chaves[1]]
+    series = banco.series(chaves)
+    assert list(series['PL Final'].columns) == ['A', 'Distribuição menor']
+    banco.remover(chaves[:1])
+    assert len(banco) == 1 and chaves[0] not in banco
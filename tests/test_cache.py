@@ -0,0 +1,115 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from fundos.benchmark import fundo_sintetico
+from fundos.cache import CacheLRU, CacheProjecao, chave_taxas, hash_canonico
+from fundos.carteira import Carteira
+from fundos.cenarios import ModeloTaxas, simular_cenarios
+from fundos.motor import projetar_fundo
+
+
+@pytest.fixture(scope='module')
+def definicao():
+    return fundo_sintetico(anos=3, ativos=6, despesas=2, eventos=2)
+
+
+def test_hash_canonico_trata_inteiro_e_float_igual():
+    assert hash_canonico({'a': 12, 'b': [1, 2]}) == hash_canonico({'b': [1.0, 2.0], 'a': 12.0})
+    assert hash_canonico(12) != hash_canonico(13)
+
+
+def test_contadores_de_acertos_e_falhas():
+    cache = CacheLRU()
+    assert cache.obter('a') is None
+    cache.guardar('a', 1)
+    assert cache.obter('a') == 1
+    assert cache.obter_ou_calcular('b', lambda: 2) == 2
+    assert cache.obter_ou_calcular('b', lambda: pytest.fail("não deveria recalcular")) == 2
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['falhas'], estatisticas['entradas']) == (2, 2, 2)
+    assert estatisticas['taxa_acerto'] == 0.5
+
+
+def test_remocao_por_numero_de_entradas_segue_o_uso():
+    cache = CacheLRU(max_entradas=2)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    cache.obter('a')
+    cache.guardar('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.remocoes == 1
+
+
+def test_remocao_por_bytes():
+    cache = CacheLRU(max_entradas=100, max_bytes=2000)
+    for chave in 'abc':
+        cache.guardar(chave, np.zeros(100))  # 800 bytes cada
+    assert 'a' not in cache and len(cache) == 2
+    assert cache.estatisticas()['bytes'] == 1600
+    # Um valor maior que o limite inteiro é devolvido, mas não guardado
+    grande = np.zeros(1000)
+    assert cache.guardar('grande', grande) is grande
+    assert 'grande' not in cache and len(cache) == 2
+
+
+def test_projecao_com_cache_igual_a_sem_cache(definicao):
+    cache = CacheProjecao()
+    entradas = (definicao.parametros, definicao.ativos, definicao.despesas, definicao.aportes, definicao.amortizacoes)
+    primeiro = cache.projetar(*entradas)
+    assert cache.projetar(*entradas) is primeiro
+    assert cache.resultados.acertos == 1
+    np.testing.assert_array_equal(primeiro.tabela, projetar_fundo(*entradas).tabela)
+
+
+def test_editar_um_ativo_recalcula_so_ele(definicao):
+    cache = CacheProjecao()
+    carteira = Carteira.de(definicao.ativos)
+    cache.projetar(definicao.parametros, carteira, definicao.despesas)
+    falhas = cache.cronogramas_ativos.falhas
+    coluna = 'Valor Compra' if carteira[0].get('Valor Compra') is not None else \
+        'Principal' if carteira[0].get('Principal') is not None else 'Valor'
+    editada = carteira.com_valores([(0, coluna, carteira[0][coluna] * 2)])
+    resultado = cache.projetar(definicao.parametros, editada, definicao.despesas)
+    assert cache.cronogramas_ativos.falhas == falhas + 1
+    np.testing.assert_allclose(resultado.tabela, projetar_fundo(definicao.parametros, editada, definicao.despesas).tabela)
+
+
+@pytest.mark.parametrize('alteracao', [{'projecao_cdi': 11.0}, {'projecao_ipca': 5.0}, {'duracao_anos': 4},
+                                       {'curvas': {'CDI': {'tipo': 'forward', 'pontos': [[1, 12.0]]}}}])
+def test_chave_taxas_muda_com_as_entradas_das_taxas(definicao, alteracao):
+    parametros = definicao.parametros
+    alterados = dataclasses.replace(parametros, **alteracao)
+    assert chave_taxas(alterados) != chave_taxas(parametros)
+    assert chave_taxas(dataclasses.replace(parametros, dist_percentual=50.0)) == chave_taxas(parametros)
+
+    cache = CacheProjecao()
+    cache.projetar(parametros, definicao.ativos, definicao.despesas)
+    falhas = cache.cronogramas_ativos.falhas
+    resultado = cache.projetar(alterados, definicao.ativos, definicao.despesas)
+    # Nenhum cronograma com as taxas antigas é reaproveitado
+    assert cache.cronogramas_ativos.falhas == falhas + len(definicao.ativos)
+    np.testing.assert_allclose(resultado.tabela, projetar_fundo(alterados, definicao.ativos, definicao.despesas).tabela)
+
+
+def test_cache_de_monte_carlo_separado_das_projecoes(definicao):
+    # Como na interface: um LRU próprio, indexado pelas entradas, pelo modelo, pelo tamanho e pela semente
+    projecoes = CacheProjecao()
+    monte_carlo = CacheLRU(max_entradas=8, max_bytes=64 * 1024**2)
+    entradas = (definicao.parametros, definicao.ativos, definicao.despesas, definicao.aportes, definicao.amortizacoes)
+    projecoes.projetar(*entradas)
+    chamadas = []
+
+    def simular(modelo, semente):
+        chave = hash_canonico('monte_carlo', *entradas, modelo, 50, semente)
+        return monte_carlo.obter_ou_calcular(chave, lambda: chamadas.append(semente) or simular_cenarios(
+            *entradas, modelo=modelo, n_cenarios=50, semente=semente))
+
+    primeiro = simular(ModeloTaxas(), 1)
+    assert simular(ModeloTaxas(), 1) is primeiro
+    simular(ModeloTaxas(), 2)
+    simular(ModeloTaxas(vol_cdi=3.0), 1)
+    assert chamadas == [1, 2, 1]
+    assert monte_carlo.estatisticas()['acertos'] == 1
+    assert projecoes.resultados.estatisticas()['entradas'] == 1
@@ -0,0 +1,104 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fundos.arquivos import carregar_definicoes, definicao_de_dict
+from fundos.carteira import TIPO_CRI, TIPO_GENERICO, TIPO_IMOVEL, Carteira
+
+
+def _ativos(n):
+    return [{'tipo': TIPO_GENERICO, 'Nome': f"G{i}", 'Valor': 1000.0 * (i + 1), 'Mês Investimento': 1 + i % 12}
+            for i in range(n)]
+
+
+def test_normaliza_nomes_de_colunas_tipos_e_padroes():
+    carteira = Carteira(pd.DataFrame({'TIPO': ['imovel', 'cri'], 'valor compra': [1e6, None], 'mes compra': [1, None],
+                                      'Receita Aluguel': [8e3, None], 'principal': [None, 5e5],
+                                      'Mês Investimento': [None, 2], 'Benchmark': [None, 'CDI'], 'Taxa': [None, 2.0],
+                                      'Prazo': [None, 24], 'Amortizacao': [None, 'SAC']}))
+    imovel, cri = carteira[0], carteira[1]
+    assert imovel['tipo'] == TIPO_IMOVEL and imovel['Indice Reajuste'] == 'IPCA' and imovel['Mês Compra'] == 1
+    assert cri['tipo'] == TIPO_CRI and cri['Tranche'] == 'Sênior' and cri['Carencia'] == 0
+    assert cri['Nome'] == 'Ativo 2'
+    assert list(carteira) == [imovel, cri]
+    assert len(carteira.validar()) == 0
+
+
+def test_validacao_aponta_linha_e_coluna():
+    ativos = _ativos(3)
+    ativos[1]['Valor'] = -1.0
+    ativos[2]['Mês Investimento'] = 1.5
+    ativos.append({'tipo': 'Ação', 'Nome': 'X'})
+    erros = Carteira.de(ativos).validar()
+    assert set(zip(erros['Linha'], erros['Coluna'])) == {(2, 'Valor'), (3, 'Mês Investimento'), (4, 'tipo')}
+
+
+def test_definicao_rejeita_ativo_listado_invalido():
+    ativos = _ativos(2)
+    del ativos[1]['Valor']
+    with pytest.raises(ValueError, match="linha 2, coluna 'Valor'"):
+        definicao_de_dict({'ativos': ativos}, origem='teste')
+    # Sem validação (definições já projetadas, vindas do banco) o ativo passa
+    assert len(definicao_de_dict({'ativos': ativos}, validar=False).ativos) == 2
+
+
+def test_definicao_junta_fita_e_ativos_listados(tmp_path):
+    pd.DataFrame(_ativos(3)).to_csv(tmp_path / 'fita.csv', sep=';', index=False)
+    dados = {'arquivo_ativos': 'fita.csv', 'ativos': [{'tipo': TIPO_GENERICO, 'Nome': 'Extra', 'Valor': 5.0,
+                                                         'Mês Investimento': 3}]}
+    (tmp_path / 'fundo.json').write_text(json.dumps(dados), encoding='utf-8')
+    definicao, = carregar_definicoes(tmp_path / 'fundo.json')
+    assert [a['Nome'] for a in definicao.ativos] == ['G0', 'G1', 'G2', 'Extra']
+
+    dados['ativos'][0]['Valor'] = None
+    (tmp_path / 'fundo.json').write_text(json.dumps(dados), encoding='utf-8')
+    with pytest.raises(ValueError, match="linha 4"):
+        carregar_definicoes(tmp_path / 'fundo.json')
+
+
+def _editar_lista(ativos, inicio, tamanho, edicoes):
+    """O que o editor da página deve produzir, aplicado à lista de dicionários."""
+    pagina = [dict(a) for a in ativos[inicio:inicio + tamanho]]
+    for posicao, campos in edicoes.get('edited_rows', {}).items():
+        pagina[posicao].update(campos)
+    removidas = set(edicoes.get('deleted_rows', []))
+    pagina = [a for i, a in enumerate(pagina) if i not in removidas] + list(edicoes.get('added_rows', []))
+    return ativos[:inicio] + pagina + ativos[inicio + tamanho:]
+
+
+@pytest.mark.parametrize('inicio, tamanho', [(0, 10), (10, 10), (20, 10), (25, 50)])
+def test_edicoes_paginadas_ida_e_volta(inicio, tamanho):
+    ativos = _ativos(25)
+    carteira = Carteira.de(ativos)
+    pagina = carteira.pagina(inicio, tamanho)
+    assert list(pagina['Nome']) == [a['Nome'] for a in ativos[inicio:inicio + tamanho]]
+
+    n = len(pagina)
+    edicoes = {'edited_rows': {0: {'Valor': 42.0}} if n else {},
+               'deleted_rows': [n - 1] if n > 1 else [],
+               'added_rows': [{'tipo': TIPO_GENERICO, 'Nome': 'Novo', 'Valor': 7.0, 'Mês Investimento': 2}]}
+    editada = carteira.aplicar_edicoes(inicio, tamanho, edicoes)
+    assert editada == Carteira.de(_editar_lista(ativos, inicio, tamanho, edicoes))
+    # A carteira original não muda
+    assert carteira == Carteira.de(ativos)
+
+
+def test_edicoes_vazias_mantem_a_carteira():
+    carteira = Carteira.de(_ativos(12))
+    assert carteira.aplicar_edicoes(5, 5, {}) == carteira
+    vazia = Carteira.de(_ativos(1)).aplicar_edicoes(0, 10, {'deleted_rows': [0]})
+    assert len(vazia) == 0
+
+
+def test_arrays_por_tipo_e_hashes_por_linha():
+    ativos = _ativos(4)
+    carteira = Carteira.de(ativos)
+    arrays = carteira.arrays(TIPO_GENERICO)
+    np.testing.assert_array_equal(arrays['posicao'], np.arange(4))
+    np.testing.assert_array_equal(arrays['Valor'], [1000.0, 2000.0, 3000.0, 4000.0])
+    assert arrays['Benchmark'].tolist() == ['IPCA'] * 4
+    hashes = carteira.hashes_linhas()
+    alterada = carteira.com_valores([(2, 'Valor', 1.0)]).hashes_linhas()
+    assert (hashes != alterada).tolist() == [False, False, True, False]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from fundos.benchmark import fundo_sintetico
+from fundos.cenarios import CENARIOS_POR_SEMENTE, ModeloTaxas, _taxas_cenarios, simular_cenarios
+from fundos.motor import ParametrosFundo
+
+
+@pytest.fixture(scope='module')
+def entradas():
+    definicao = fundo_sintetico(anos=2, ativos=4, despesas=2, eventos=2)
+    return definicao.parametros, definicao.ativos, definicao.despesas, definicao.aportes, definicao.amortizacoes
+
+
+def _iguais(a, b):
+    for nome in a.indicadores:
+        if nome == 'TIR':
+            # A partida a quente vem do lote anterior: a mesma raiz, mas não necessariamente o mesmo último bit
+            np.testing.assert_allclose(a.indicadores[nome], b.indicadores[nome], rtol=1e-12, atol=1e-14)
+        else:
+            np.testing.assert_array_equal(a.indicadores[nome], b.indicadores[nome])
+
+
+def test_caminhos_iguais_em_qualquer_recorte(entradas):
+    parametros = entradas[0]
+    sementes = np.random.SeedSequence(11).spawn(3)
+    inteiro = _taxas_cenarios(ModeloTaxas(), parametros, sementes, 0, 3 * CENARIOS_POR_SEMENTE)
+    for inicio, fim in ((0, 1), (37, 160), (99, 101), (250, 300)):
+        parte = _taxas_cenarios(ModeloTaxas(), parametros, sementes, inicio, fim)
+        for indice in ('CDI', 'IPCA', 'IGP-M'):
+            np.testing.assert_array_equal(parte[indice], inteiro[indice][inicio:fim])
+
+
+def test_mesma_semente_qualquer_tamanho_de_lote(entradas):
+    n = 2 * CENARIOS_POR_SEMENTE + 30
+    referencia = simular_cenarios(*entradas, n_cenarios=n, tamanho_lote=500, semente=7)
+    for lote in (1 + CENARIOS_POR_SEMENTE // 3, CENARIOS_POR_SEMENTE, 77):
+        _iguais(simular_cenarios(*entradas, n_cenarios=n, tamanho_lote=lote, semente=7), referencia)
+
+
+def test_cenario_nao_depende_do_total(entradas):
+    curto = simular_cenarios(*entradas, n_cenarios=150, tamanho_lote=40, semente=3)
+    longo = simular_cenarios(*entradas, n_cenarios=320, tamanho_lote=64, semente=3)
+    _iguais(curto, type(longo)({nome: valores[:150] for nome, valores in longo.indicadores.items()}))
+
+
+def test_sementes_diferentes_sorteiam_caminhos_diferentes(entradas):
+    a = simular_cenarios(*entradas, n_cenarios=50, semente=1)
+    b = simular_cenarios(*entradas, n_cenarios=50, semente=2)
+    assert not np.array_equal(a.indicadores['MOIC'], b.indicadores['MOIC'])
+
+
+def _anual(mensal):
+    return ((1 + mensal)**12 - 1) * 100
+
+
+def test_media_e_variancia_do_processo():
+    modelo = ModeloTaxas(vol_cdi=2.0, vol_ipca=1.5, correlacao=0.3, reversao=0.5)
+    parametros = ParametrosFundo(duracao_anos=5, projecao_cdi=10.0, projecao_ipca=4.5)
+    taxas = modelo.gerar(parametros, 20000, np.random.default_rng(0))
+    cdi, ipca = _anual(taxas['CDI']), _anual(taxas['IPCA'])
+    assert taxas['IGP-M'] is taxas['IPCA']
+    np.testing.assert_allclose(cdi[:, 0], 10.0)
+
+    persistencia = np.exp(-modelo.reversao / 12)
+    for mes in (6, 24, 60):
+        # Variância exata do AR(1) discretizado após `mes` passos
+        fator = (1 - persistencia**(2 * mes)) / (2 * modelo.reversao)
+        assert cdi[:, mes].mean() == pytest.approx(10.0, abs=0.05)
+        assert ipca[:, mes].mean() == pytest.approx(4.5, abs=0.05)
+        assert cdi[:, mes].var() == pytest.approx(modelo.vol_cdi**2 * fator, rel=0.05)
+        assert ipca[:, mes].var() == pytest.approx(modelo.vol_ipca**2 * fator, rel=0.05)
+    assert np.corrcoef(cdi[:, 60], ipca[:, 60])[0, 1] == pytest.approx(0.3, abs=0.03)
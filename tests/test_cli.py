@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+from fundos.arquivos import definicao_para_dict
+from fundos.banco import BancoCenarios
+from fundos.benchmark import fundo_sintetico
+from fundos.cli import main
+
+
+@pytest.fixture(scope='module')
+def entradas(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp('entradas')
+    fundos = []
+    for i, nome in enumerate(['Fundo Alfa', 'Fundo Ômega']):
+        definicao = fundo_sintetico(anos=2, ativos=3, despesas=1, eventos=1, semente=i)
+        definicao.parametros.nome_fundo = nome
+        fundos.append(definicao_para_dict(definicao))
+    (pasta / 'fundos.json').write_text(json.dumps({'fundos': fundos}, default=str), encoding='utf-8')
+    return pasta
+
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet', 'xlsx'])
+def test_grava_as_tabelas_de_cada_fundo(entradas, tmp_path, formato):
+    saida = tmp_path / 'resultados'
+    assert main([str(entradas), '--saida', str(saida), '--formato', formato, '--processos', '1', '--silencioso']) == 0
+    arquivos = {'xlsx': ['fundo.xlsx']}.get(formato, [f'{tabela}.{formato}' for tabela in ('fluxo', 'dre', 'indicadores')])
+    for pasta in ('Fundo_Alfa', 'Fundo_Omega'):
+        for arquivo in arquivos:
+            assert (saida / pasta / arquivo).is_file()
+    resumo = pd.read_excel(saida / 'resumo.xlsx') if formato == 'xlsx' else \
+        getattr(pd, f'read_{formato}')(saida / f'resumo.{formato}')
+    assert sorted(resumo['Fundo']) == ['Fundo Alfa', 'Fundo Ômega']
+    assert (resumo['Status'] == 'ok').all()
+    if formato == 'csv':
+        fluxo = pd.read_csv(saida / 'Fundo_Alfa' / 'fluxo.csv')
+        assert fluxo['Data'].notna().all() and 'PL Final' in fluxo.columns
+
+
+def test_banco_nao_projeta_de_novo(entradas, tmp_path):
+    banco = tmp_path / 'cenarios.db'
+    argumentos = [str(entradas), '--formato', 'csv', '--banco', str(banco), '--processos', '2', '--silencioso']
+    assert main(argumentos + ['--saida', str(tmp_path / 'primeira')]) == 0
+    assert main(argumentos + ['--saida', str(tmp_path / 'segunda')]) == 0
+    primeira = pd.read_csv(tmp_path / 'primeira' / 'resumo.csv')
+    segunda = pd.read_csv(tmp_path / 'segunda' / 'resumo.csv')
+    assert not primeira['Do Banco'].any() and segunda['Do Banco'].all()
+    pd.testing.assert_series_equal(primeira['TIR'], segunda['TIR'])
+    with BancoCenarios(banco) as cenarios:
+        assert len(cenarios) == 2
+
+
+def test_fundo_invalido_nao_derruba_o_lote(entradas, tmp_path):
+    (tmp_path / 'invalido.json').write_text(json.dumps({'parametros': {'taxa_magica': 1}}), encoding='utf-8')
+    saida = tmp_path / 'resultados'
+    assert main([str(entradas / 'fundos.json'), str(tmp_path / 'invalido.json'), '--saida', str(saida),
+                 '--processos', '1', '--silencioso']) == 1
+    resumo = pd.read_csv(saida / 'resumo.csv')
+    assert (resumo['Status'] == 'ok').sum() == 2
+    assert resumo['Status'].str.contains('taxa_magica').sum() == 1
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from fundos.curvas import TabelaIndices, curva_mensal, taxas_das_curvas, taxas_de_curvas, validar_curvas
+from fundos.motor import ParametrosFundo
+
+
+def _mensal(anual):
+    return (1 + anual / 100.0)**(1/12) - 1
+
+
+def _acumulado(mensal):
+    """Fator acumulado do mês 0 a cada mês (o mês 0 não rende)."""
+    return np.concatenate([[1.0], np.cumprod(1 + mensal[1:])])
+
+
+@pytest.mark.parametrize('tipo', ['estrutura', 'forward'])
+def test_curva_plana_igual_a_projecao_constante(tipo):
+    plana = ParametrosFundo(duracao_anos=4, projecao_cdi=11.0, projecao_ipca=4.0)
+    curvas = ParametrosFundo(duracao_anos=4, projecao_cdi=0.0, projecao_ipca=0.0, curvas={
+        'CDI': {'tipo': tipo, 'pontos': [[12, 11.0], [36, 11.0]]},
+        'IPCA': {'tipo': tipo, 'pontos': [[6, 4.0]]}})
+    esperado, obtido = taxas_das_curvas(plana), taxas_das_curvas(curvas)
+    for indice in ('CDI', 'IPCA', 'IGP-M'):
+        np.testing.assert_allclose(obtido[indice], esperado[indice], rtol=1e-12)
+    assert obtido['IGP-M'] is obtido['IPCA']
+
+
+def test_estrutura_reproduz_as_taxas_a_vista_nos_vertices():
+    pontos = [[6, 10.75], [12, 10.4], [36, 9.9]]
+    mensal = curva_mensal({'tipo': 'estrutura', 'pontos': pontos}, 48)
+    fator = _acumulado(mensal)
+    for mes, taxa in pontos:
+        assert fator[mes] == pytest.approx((1 + taxa / 100)**(mes / 12), rel=1e-12)
+    # Forward constante entre os vértices e a última forward repetida depois do último
+    forward_12_36 = ((1 + 0.099)**3 / (1 + 0.104))**(1 / 24) - 1
+    np.testing.assert_allclose(mensal[13:37], forward_12_36, rtol=1e-12)
+    np.testing.assert_allclose(mensal[37:], forward_12_36, rtol=1e-12)
+    np.testing.assert_allclose(mensal[:7], _mensal(10.75), rtol=1e-12)
+    # Entre vértices, a taxa à vista fica entre as dos vértices vizinhos
+    a_vista_24 = fator[24]**(12 / 24) - 1
+    assert 0.099 < a_vista_24 < 0.104
+
+
+def test_forward_interpola_linear_entre_os_pontos():
+    mensal = curva_mensal({'tipo': 'forward', 'pontos': [[1, 12.0], [25, 6.0]]}, 36)
+    anual = ((1 + mensal)**12 - 1) * 100
+    assert anual[1] == pytest.approx(12.0)
+    assert anual[13] == pytest.approx(9.0)
+    assert anual[25] == pytest.approx(6.0)
+    np.testing.assert_allclose(anual[25:], 6.0)
+    assert anual[0] == pytest.approx(12.0)
+
+
+@pytest.mark.parametrize('curva', [{'tipo': 'spline', 'pontos': [[1, 10.0]]}, {'pontos': []},
+                                   {'pontos': [[1, 10.0], [1, 11.0]]}, {'pontos': [[-1, 10.0]]}])
+def test_curvas_invalidas(curva):
+    with pytest.raises(ValueError):
+        validar_curvas({'CDI': curva})
+
+
+def test_indice_desconhecido():
+    with pytest.raises(ValueError):
+        validar_curvas({'SELIC': {'pontos': [[1, 10.0]]}})
+
+
+def test_tabela_calcula_derivadas_uma_vez():
+    tabela = TabelaIndices({'CDI': np.full(13, _mensal(10.0))})
+    tabela['IPCA'] = tabela['IGP-M'] = np.full(13, _mensal(4.0))
+    log_fator = tabela.log_fator('CDI')
+    assert tabela.log_fator('CDI') is log_fator
+    assert log_fator[0] == 0.0 and np.exp(log_fator[12]) == pytest.approx(1.10)
+    # O IGP-M aponta para o mesmo array do IPCA e divide as tabelas com ele
+    assert tabela.log_fator('IGP-M') is tabela.log_fator('IPCA')
+    np.testing.assert_allclose(tabela.anual('IPCA'), 0.04)
+
+
+def test_trocar_a_curva_invalida_as_derivadas():
+    tabela = TabelaIndices({'CDI': np.full(13, _mensal(10.0))})
+    antes = tabela.log_fator('CDI').copy()
+    anual = tabela.anual('CDI')
+    tabela['CDI'] = np.full(13, _mensal(12.0))
+    assert np.exp(tabela.log_fator('CDI')[12]) == pytest.approx(1.12)
+    np.testing.assert_allclose(tabela.anual('CDI'), 0.12)
+    assert not np.allclose(tabela.log_fator('CDI'), antes)
+    assert anual is not tabela.anual('CDI')
+
+
+def test_taxas_de_curvas_empilha_um_cenario_por_conjunto():
+    parametros = ParametrosFundo(duracao_anos=2, projecao_cdi=10.0, projecao_ipca=4.0,
+                                 curvas={'IPCA': {'tipo': 'forward', 'pontos': [[1, 5.0]]}})
+    conjuntos = [{}, {'CDI': {'tipo': 'forward', 'pontos': [[1, 8.0]]}}]
+    taxas = taxas_de_curvas(parametros, conjuntos)
+    assert taxas['CDI'].shape == (2, 25)
+    np.testing.assert_allclose(taxas['CDI'][0], _mensal(10.0))
+    np.testing.assert_allclose(taxas['CDI'][1], _mensal(8.0))
+    # A curva de IPCA do fundo vale nos dois cenários, e o IGP-M segue o IPCA
+    np.testing.assert_allclose(taxas['IPCA'], _mensal(5.0))
+    assert taxas['IGP-M'] is taxas['IPCA']
+    assert taxas.log_fator('CDI').shape == (2, 25)
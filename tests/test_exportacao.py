@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fundos.benchmark import fundo_sintetico
+from fundos.exportacao import exportar_excel, exportar_parquet
+from fundos.motor import DefinicaoFundo
+from fundos.relatorios import resumo_investidor
+
+
+@pytest.fixture(scope='module')
+def cenarios():
+    base = fundo_sintetico(anos=2, ativos=3, despesas=1, eventos=1)
+    # O segundo cenário tira o primeiro ativo: as posições mudam, os nomes não
+    sem_primeiro = DefinicaoFundo(base.parametros, list(base.ativos)[1:], base.despesas, base.aportes, base.amortizacoes)
+    return {'Base': base.projetar(), 'Sem o primeiro': sem_primeiro.projetar()}
+
+
+def test_parquet_com_colunas_por_nome_de_ativo(cenarios, tmp_path):
+    exportar_parquet(tmp_path, cenarios)
+    fluxo = pd.read_parquet(tmp_path / 'fluxo.parquet')
+    assert list(fluxo['Cenário'].unique()) == list(cenarios)
+    assert not any(c.startswith('Ativo_') for c in fluxo.columns)
+
+    base, sem_primeiro = cenarios['Base'], cenarios['Sem o primeiro']
+    for cenario, resultado in cenarios.items():
+        linhas = fluxo[fluxo['Cenário'] == cenario]
+        df = resultado.para_dataframe()
+        for i, nome in enumerate(resultado.nomes_ativos, start=1):
+            np.testing.assert_array_equal(linhas[f'Ativo: {nome}_Volume'], df[f'Ativo_{i}_Volume'])
+    # O ativo que só existe na base fica vazio no outro cenário
+    removido = f'Ativo: {base.nomes_ativos[0]}_Volume'
+    assert fluxo.loc[fluxo['Cenário'] == 'Sem o primeiro', removido].isna().all()
+    assert base.nomes_ativos[0] not in sem_primeiro.nomes_ativos
+
+    indicadores = pd.read_parquet(tmp_path / 'indicadores.parquet')
+    assert indicadores.set_index('Cenário').loc['Base', 'TIR'] == pytest.approx(resumo_investidor(base)['TIR'])
+    dre = pd.read_parquet(tmp_path / 'dre.parquet')
+    assert set(dre['Cenário']) == set(cenarios)
+
+
+def test_nomes_de_ativos_repetidos_nao_se_misturam(tmp_path):
+    definicao = fundo_sintetico(anos=1, ativos=2, despesas=1, eventos=0)
+    carteira = definicao.ativos.com_valores([(1, 'Nome', definicao.ativos[0]['Nome'])])
+    resultado = DefinicaoFundo(definicao.parametros, carteira, definicao.despesas).projetar()
+    exportar_parquet(tmp_path, resultado)
+    fluxo = pd.read_parquet(tmp_path / 'fluxo.parquet')
+    nome = carteira[0]['Nome']
+    df = resultado.para_dataframe()
+    np.testing.assert_array_equal(fluxo[f'Ativo: {nome}_Volume'], df['Ativo_1_Volume'])
+    np.testing.assert_array_equal(fluxo[f'Ativo: {nome} (2)_Volume'], df['Ativo_2_Volume'])
+
+
+def test_excel_com_abas_por_cenario(cenarios):
+    destino = exportar_excel(io.BytesIO(), cenarios)
+    destino.seek(0)
+    abas = pd.read_excel(destino, sheet_name=None, header=None)
+    assert list(abas) == ['Indicadores', '1 Fluxo Base', '1 DRE Base', '2 Fluxo Sem o primeiro', '2 DRE Sem o primeiro']
+    # Uma linha de dados por mês, abaixo dos dois níveis de cabeçalho
+    assert len(abas['1 Fluxo Base']) - 2 == len(cenarios['Base'].tabela)
+
+
+def test_excel_de_um_cenario(cenarios, tmp_path):
+    exportar_excel(tmp_path / 'fundo.xlsx', cenarios['Base'])
+    assert pd.ExcelFile(tmp_path / 'fundo.xlsx').sheet_names == ['Indicadores', 'Fluxo', 'DRE']
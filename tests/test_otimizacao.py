@@ -0,0 +1,60 @@
+import pytest
+
+from fundos.benchmark import fundo_sintetico
+from fundos.otimizacao import CONVERGIU, SEM_INTERVALO, Avaliador, buscar_meta, buscar_metas, otimizar
+
+
+@pytest.fixture(scope='module')
+def definicao():
+    return fundo_sintetico(anos=3, ativos=4, despesas=2, eventos=2)
+
+
+def test_buscar_meta_reencontra_o_valor(definicao):
+    alvo = Avaliador(definicao)({'dist_percentual': 80.0})['Dividendos']
+    meta = buscar_meta(definicao, 'dist_percentual', alvo, indicador='Dividendos', tolerancia=1e-3)
+    assert meta.status == CONVERGIU
+    assert meta.valor == pytest.approx(80.0, rel=1e-6)
+    assert meta.obtido == pytest.approx(alvo, abs=1e-3)
+    assert len(meta.historico) == meta.avaliacoes
+
+
+def test_buscar_meta_inteira_so_testa_inteiros(definicao):
+    meta = buscar_meta(definicao, 'duracao_anos', 0.0, indicador='DPI', limites=(1, 6), max_avaliacoes=20)
+    assert all(float(v).is_integer() for v in meta.historico['Valor'])
+
+
+def test_buscar_meta_sem_intervalo(definicao):
+    # Dividendos não passam do que uma distribuição de 100% entrega
+    meta = buscar_meta(definicao, 'dist_percentual', 1e12, indicador='Dividendos', limites=(0, 100))
+    assert meta.status == SEM_INTERVALO
+    assert meta.valor == 100
+
+
+def test_buscar_metas_em_paralelo_igual_em_serie(definicao):
+    avaliador = Avaliador(definicao)
+    buscas = [{'caminho': 'dist_percentual', 'alvo': avaliador({'dist_percentual': 70.0})['Dividendos'], 'indicador': 'Dividendos'},
+              {'caminho': 'aporte_inicial', 'alvo': 0.5, 'indicador': 'DPI'}]
+    serie = buscar_metas(definicao, buscas, processos=1)
+    paralelo = buscar_metas(definicao, buscas, processos=2)
+    assert [(m.valor, m.status) for m in serie] == [(m.valor, m.status) for m in paralelo]
+
+
+def test_otimizar_respeita_limites_e_restricoes(definicao):
+    livre = otimizar(definicao, {'dist_percentual': (50.0, 100.0)}, objetivo='Dividendos', processos=1)
+    assert livre.viavel and livre.valores['dist_percentual'] == pytest.approx(100.0)
+
+    teto = Avaliador(definicao)({'dist_percentual': 75.0})['Dividendos']
+    restrito = otimizar(definicao, {'dist_percentual': (50.0, 100.0)}, objetivo='Dividendos',
+                        restricoes={'Dividendos': (None, teto)}, processos=1)
+    assert restrito.viavel
+    assert restrito.metricas['Dividendos'] <= teto
+    assert restrito.valores['dist_percentual'] == pytest.approx(75.0, abs=0.1)
+    assert (restrito.historico['Violação'] >= 0).all()
+
+
+def test_otimizar_em_paralelo_igual_em_serie(definicao):
+    variaveis = {'dist_percentual': (50.0, 100.0), 'aporte_inicial': (1e7, 3e7)}
+    serie = otimizar(definicao, variaveis, objetivo='DPI', max_avaliacoes=40, processos=1)
+    paralelo = otimizar(definicao, variaveis, objetivo='DPI', max_avaliacoes=40, processos=2)
+    assert serie.valores == paralelo.valores
+    assert serie.avaliacoes == paralelo.avaliacoes
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fundos.recebiveis import Recebiveis, cascata
+
+
+def _fita(n=40, semente=0):
+    rng = np.random.default_rng(semente)
+    return Recebiveis(pd.DataFrame({
+        'Saldo': rng.uniform(1e5, 5e5, n), 'Taxa': rng.uniform(6.0, 12.0, n), 'Prazo': rng.integers(12, 120, n),
+        'Amortizacao': rng.choice(['SAC', 'Price'], n), 'Indexador': rng.choice(['IPCA', 'Pré-fixado'], n),
+        'Idade': rng.integers(0, 24, n)}))
+
+
+def test_saldo_e_programado_vezes_sobrevivencia():
+    fita = Recebiveis(pd.DataFrame({'Saldo': [1000.0, 600.0], 'Taxa': [12.0, 9.0], 'Prazo': [24, 36],
+                                    'Amortizacao': ['Price', 'SAC'], 'Indexador': ['IPCA', 'Pré-fixado']}))
+    cpr, cdr, meses = 10.0, 3.0, 48
+    fluxo = fita.projetar(meses, cpr, cdr)
+    k = np.arange(meses + 1)
+    sobrevivencia = ((1 - cpr / 100) * (1 - cdr / 100))**(k / 12)
+
+    fator, prazo = 1.12**(1 / 12), 24
+    price = np.clip((fator**prazo - fator**k) / (fator**prazo - 1), 0, None)
+    sac = np.clip(1 - k / 36, 0, None)
+    assert fluxo.indexadores == ('IPCA', 'Pré-fixado')
+    np.testing.assert_allclose(fluxo.saldo[0], 1000.0 * price * sobrevivencia, rtol=1e-10, atol=1e-9)
+    np.testing.assert_allclose(fluxo.saldo[1], 600.0 * sac * sobrevivencia, rtol=1e-10, atol=1e-9)
+
+
+@pytest.mark.parametrize('cpr, cdr, rampa', [(0.0, 0.0, 0), (8.0, 2.0, 0), (15.0, 5.0, 30)])
+def test_saidas_somam_o_saldo_inicial(cpr, cdr, rampa):
+    fita = _fita()
+    fluxo = fita.projetar(150, cpr, cdr, rampa)
+    saidas = fluxo.amortizacao + fluxo.pre_pagamento + fluxo.inadimplencia
+    # Mês a mês, o saldo cai exatamente pelo que saiu; no total, as saídas e o saldo final somam o saldo inicial
+    np.testing.assert_allclose(fluxo.saldo[:, :-1] - fluxo.saldo[:, 1:], saidas[:, 1:], rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(saidas.sum(axis=1) + fluxo.saldo[:, -1], fluxo.saldo[:, 0], rtol=1e-12)
+    assert fluxo.saldo[:, 0].sum() == pytest.approx(fita.dados['Saldo'].sum())
+    assert (fluxo.saldo >= 0).all() and (fluxo.juros >= 0).all()
+    if cpr == 0 and cdr == 0:
+        assert not fluxo.pre_pagamento.any() and not fluxo.inadimplencia.any()
+
+
+def test_blocos_nao_mudam_o_resultado():
+    fita = _fita(n=75, semente=3)
+    inteiro = fita._projetar(100, 12.0, 3.0, 18, max_elementos=10**9)
+    for max_elementos in (1, 101 * 7, 101 * 40):
+        em_blocos = fita._projetar(100, 12.0, 3.0, 18, max_elementos=max_elementos)
+        for campo in ('saldo', 'juros', 'amortizacao', 'pre_pagamento', 'inadimplencia'):
+            np.testing.assert_allclose(getattr(em_blocos, campo), getattr(inteiro, campo), rtol=1e-12, atol=1e-9)
+
+
+def test_projecao_memorizada_pelos_parametros():
+    fita = _fita(n=5)
+    assert fita.projetar(60, 5.0) is fita.projetar(60.0, 5)
+    assert fita.projetar(60, 6.0) is not fita.projetar(60, 5.0)
+
+
+def test_validacao_aponta_linha_e_coluna():
+    fita = Recebiveis(pd.DataFrame({'saldo devedor': [100.0, -1.0], 'Taxa': [10.0, None], 'Prazo': [12, 6.5],
+                                    'Amortizacao': ['SAC', 'Bullet']}))
+    erros = fita.validar()
+    assert set(zip(erros['Linha'], erros['Coluna'])) == {(2, 'Saldo'), (2, 'Taxa'), (2, 'Prazo'), (2, 'Amortizacao')}
+
+
+def _lastro(meses=12, saldo_inicial=1000.0, juros=0.01):
+    saldo = saldo_inicial * (1 - np.arange(meses + 1) / meses)
+    principal = np.zeros(meses + 1)
+    principal[1:] = saldo[:-1] - saldo[1:]
+    juros_lastro = np.zeros(meses + 1)
+    juros_lastro[1:] = saldo[:-1] * juros
+    return saldo, juros_lastro, principal
+
+
+def test_cascata_paga_a_senior_antes_da_subordinada():
+    saldo, juros, principal = _lastro()
+    taxa_senior = np.full(saldo.shape, 0.008)
+    tranches = cascata(saldo, juros, principal, np.zeros(saldo.shape), 0.0, 20.0, taxa_senior)
+    (saldo_sen, recebido_sen, perda_sen), (saldo_sub, recebido_sub, perda_sub) = tranches['Sênior'], tranches['Subordinada']
+
+    # Sem perdas, a Sênior segue em 80% do lastro e recebe juros mais a amortização que a mantém lá
+    np.testing.assert_allclose(saldo_sen, 0.8 * saldo)
+    np.testing.assert_allclose(saldo_sen + saldo_sub, saldo)
+    np.testing.assert_allclose(recebido_sen[1:], saldo_sen[:-1] * 0.008 + saldo_sen[:-1] - saldo_sen[1:])
+    # Todo o caixa do lastro é distribuído, e a Subordinada fica com o excesso de juros
+    np.testing.assert_allclose(recebido_sen + recebido_sub, juros + principal)
+    np.testing.assert_allclose(recebido_sub[1:], saldo_sub[:-1] * 0.01 + saldo_sub[:-1] - saldo_sub[1:]
+                               + saldo_sen[:-1] * (0.01 - 0.008))
+    assert not perda_sen.any() and not perda_sub.any()
+
+
+def test_cascata_falta_de_caixa_e_perdas():
+    saldo, juros, principal = _lastro(meses=6)
+    taxa_senior = np.full(saldo.shape, 0.02)
+    inadimplencia = np.zeros(saldo.shape)
+    # Um mês sem caixa: os juros da Sênior são incorporados e a Subordinada não recebe nada
+    juros[2] = principal[2] = 0.0
+    saldo[2:] += saldo[1] - saldo[2]
+    tranches = cascata(saldo, juros, principal, inadimplencia, 100.0, 20.0, taxa_senior)
+    saldo_sen, recebido_sen, _ = tranches['Sênior']
+    assert recebido_sen[2] == 0.0 and tranches['Subordinada'][1][2] == 0.0
+    assert saldo_sen[2] == pytest.approx(saldo_sen[1] * 1.02)
+
+    # Uma perda menor que a Subordinada não toca a Sênior
+    saldo, juros, principal = _lastro(meses=6)
+    inadimplencia[3] = 100.0
+    saldo[3:] = np.maximum(saldo[3:] - 100.0, 0.0)
+    tranches = cascata(saldo, juros, principal, inadimplencia, 100.0, 20.0, np.zeros(saldo.shape))
+    assert not tranches['Sênior'][2].any()
+    assert tranches['Subordinada'][2][3] == pytest.approx(100.0)
+
+    # Uma perda maior que a Subordinada baixa a Sênior até o saldo do lastro
+    saldo, juros, principal = _lastro(meses=6)
+    inadimplencia[3] = 500.0
+    saldo[3:] = np.maximum(saldo[3:] - 500.0, 0.0)
+    tranches = cascata(saldo, juros, principal, inadimplencia, 100.0, 20.0, np.zeros(saldo.shape))
+    saldo_sen, _, perda_sen = tranches['Sênior']
+    assert perda_sen[3] > 0
+    assert saldo_sen[3] == pytest.approx(saldo[3])
+    assert tranches['Subordinada'][0][3] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_cascata_vetorial_no_eixo_de_cenarios():
+    saldo, juros, principal = _lastro()
+    fatores = np.array([[1.0], [1.5]])
+    taxa_senior = np.full((2,) + saldo.shape, 0.008)
+    lote = cascata(saldo * fatores, juros * fatores, principal * fatores, np.zeros((2,) + saldo.shape), 0.0, 20.0,
+                   taxa_senior)
+    for i, fator in enumerate(fatores[:, 0]):
+        um = cascata(saldo * fator, juros * fator, principal * fator, np.zeros(saldo.shape), 0.0, 20.0, taxa_senior[i])
+        for tranche in um:
+            for serie_lote, serie in zip(lote[tranche], um[tranche]):
+                np.testing.assert_allclose(serie_lote[i], serie)
@@ -0,0 +1,51 @@
+"""Saídas douradas do motor e dos indicadores do investidor nos fundos sintéticos do benchmark.
+
+Regravar com `python -m fundos.benchmark --atualizar-douradas` só quando a mudança
+nos números for intencional.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fundos.benchmark import CENARIOS, calcular_douradas, comparar, main
+
+DOURADAS = json.loads((Path(__file__).resolve().parents[1] / 'benchmarks' / 'saidas_douradas.json').read_text(encoding='utf-8'))
+
+
+def test_douradas_cobrem_todos_os_cenarios():
+    assert set(DOURADAS) == set(CENARIOS)
+    for nome, configuracao in CENARIOS.items():
+        assert DOURADAS[nome]['configuracao'] == configuracao
+
+
+@pytest.mark.parametrize('nome', list(CENARIOS))
+def test_saidas_douradas(nome):
+    atuais = calcular_douradas([nome])[nome]['saidas']
+    for chave, esperado in DOURADAS[nome]['saidas'].items():
+        np.testing.assert_allclose(np.asarray(atuais[chave], dtype=float), np.asarray(esperado, dtype=float),
+                                   rtol=1e-9, atol=1e-6, equal_nan=True, err_msg=f"{nome}: '{chave}'")
+
+
+def _relatorio(medianas):
+    return {'cenarios': {'x': {'configuracao': {}, 'tempos': {etapa: {'mediana': m} for etapa, m in medianas.items()}}}}
+
+
+def test_comparar_ignora_etapas_rapidas():
+    referencia = _relatorio({'rapida': 0.005, 'lenta': 0.100})
+    assert comparar(_relatorio({'rapida': 0.015, 'lenta': 0.110}), referencia) == []
+    falhas = comparar(_relatorio({'rapida': 0.005, 'lenta': 0.200}), referencia)
+    assert len(falhas) == 1 and falhas[0].startswith('x/lenta')
+
+
+def test_tempos_so_comparados_com_referencia(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rodada = ['--cenarios', 'curto', '--repeticoes', '1']
+    # Sem --referencia só mede, mesmo sem referência gravada
+    assert main(rodada) == 0
+    assert main(rodada + ['--referencia', 'inexistente.json']) == 1
+    assert main(rodada + ['--atualizar-referencia']) == 0
+    assert (tmp_path / 'benchmarks' / 'referencia.json').is_file()
+    assert main(rodada + ['--atualizar-referencia', '--referencia', 'minha.json']) == 0
+    assert main(rodada + ['--referencia', 'minha.json', '--limite', '1000']) == 0
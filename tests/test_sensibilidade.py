@@ -0,0 +1,29 @@
+import pytest
+
+from fundos.benchmark import fundo_sintetico
+from fundos.sensibilidade import limitar, tornado
+
+
+@pytest.fixture(scope='module')
+def definicao():
+    return fundo_sintetico(anos=3, ativos=4, despesas=2, eventos=2)
+
+
+def test_limitar_percentual(definicao):
+    assert limitar(definicao, 'dist_percentual', 104.5) == (100, True)
+    assert limitar(definicao, 'dist_percentual', 85.5) == (85.5, False)
+
+
+def test_arredondar_inteiro_nao_conta_como_limitado(definicao):
+    caminho = next(f"ativos[{i}].{campo}" for i, ativo in enumerate(definicao.ativos)
+                   for campo in ('Mês Compra', 'Mês Investimento') if campo in ativo)
+    valor, limitado = limitar(definicao, caminho, 13.2)
+    assert valor == 13 and not limitado
+    assert limitar(definicao, caminho, -0.4) == (1, True)
+
+
+def test_tornado_marca_so_as_variaveis_limitadas(definicao):
+    resultado = tornado(definicao, ['dist_percentual', 'projecao_cdi'], 0.10, processos=1).set_index('Variável')
+    assert resultado.loc['dist_percentual', 'Valor Alto'] == 100
+    assert resultado.loc['dist_percentual', 'Limitado']
+    assert not resultado.loc['projecao_cdi', 'Limitado']
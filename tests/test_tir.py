@@ -0,0 +1,95 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from fundos.tir import (CONVERGIU, FLUXO_INVALIDO, FORA_DA_FAIXA, SEM_TROCA_DE_SINAL, anualizar, tir, tir_lote,
+                        vpl_lote, xtir_lote)
+
+
+def _fluxos_convencionais(rng, linhas=200, periodos=60):
+    """Um aporte seguido de retornos positivos: uma troca de sinal, TIR única."""
+    fluxos = rng.uniform(0, 3, (linhas, periodos))
+    fluxos[:, 0] = -rng.uniform(20, 120, linhas)
+    return fluxos
+
+
+def test_tir_confere_com_npf_irr():
+    fluxos = _fluxos_convencionais(np.random.default_rng(0))
+    resultado = tir_lote(fluxos)
+    esperado = np.array([npf.irr(f) for f in fluxos])
+    assert (resultado.status == CONVERGIU).all()
+    np.testing.assert_allclose(resultado.taxa, esperado, rtol=1e-8, atol=1e-10)
+
+
+def test_tir_de_fluxos_com_varias_trocas_zera_o_vpl():
+    rng = np.random.default_rng(1)
+    fluxos = rng.normal(0, 1, (200, 36))
+    fluxos[:, 0] = -10
+    resultado = tir_lote(fluxos)
+    ok = resultado.status == CONVERGIU
+    assert ok.any()
+    # VPL nulo relativo à soma dos fluxos descontados em módulo
+    escala = vpl_lote(np.abs(fluxos[ok]), resultado.taxa[ok])
+    assert (np.abs(vpl_lote(fluxos[ok], resultado.taxa[ok])) <= 1e-9 * escala).all()
+
+
+@pytest.mark.parametrize('fluxo, esperado', [([-1, 10], 9.0), ([-100, 1], -0.99), ([-1, 1e6], 999999.0)])
+def test_tir_fora_da_grade(fluxo, esperado):
+    assert tir(fluxo) == pytest.approx(esperado, rel=1e-9)
+    assert tir(fluxo) == pytest.approx(npf.irr(fluxo), rel=1e-9)
+
+
+def test_status_sem_troca_de_sinal():
+    resultado = tir_lote([[1, 2, 3], [-1, -2, 0]])
+    assert (resultado.status == SEM_TROCA_DE_SINAL).all()
+    assert np.isnan(resultado.taxa).all()
+
+
+def test_status_fora_da_faixa():
+    # O VPL troca de sinal só perto de -100% ao período, abaixo da menor taxa representável
+    resultado = tir_lote([[-1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1e-300]])
+    assert resultado.status[0] == FORA_DA_FAIXA
+    assert np.isnan(resultado.taxa[0])
+
+
+@pytest.mark.parametrize('fluxo', [[np.nan, 1], [-1, np.inf], [-1, 2, np.nan]])
+def test_fluxo_invalido(fluxo):
+    resultado = tir_lote(fluxo)
+    assert resultado.status[0] == FLUXO_INVALIDO
+    assert np.isnan(resultado.taxa[0])
+    assert not resultado.ambigua[0]
+
+
+def test_ambiguidade():
+    # -1, +5, -6: duas trocas de sinal e raízes em 100% e 200%
+    resultado = tir_lote([[-1, 5, -6], [-1, 2, 0]])
+    assert resultado.ambigua[0]
+    assert resultado.taxa[0] == pytest.approx(1.0) or resultado.taxa[0] == pytest.approx(2.0)
+    # Uma só troca de sinal nunca é ambígua, mesmo com a raiz sobre um ponto da grade
+    assert not resultado.ambigua[1]
+    assert resultado.taxa[1] == pytest.approx(1.0)
+
+
+def test_chute_a_quente_leva_a_mesma_raiz():
+    fluxos = _fluxos_convencionais(np.random.default_rng(2))
+    frio = tir_lote(fluxos)
+    quente = tir_lote(fluxos, chute=np.nanmedian(frio.taxa))
+    por_linha = tir_lote(fluxos, chute=frio.taxa + 1e-4)
+    np.testing.assert_allclose(quente.taxa, frio.taxa, rtol=1e-9)
+    np.testing.assert_allclose(por_linha.taxa, frio.taxa, rtol=1e-9)
+    assert por_linha.iteracoes.mean() <= frio.iteracoes.mean()
+
+
+def test_xtir_com_periodos_em_dias():
+    datas = np.array(['2024-01-01', '2025-01-01', '2025-07-02'], dtype='datetime64[D]')
+    fluxos = np.array([[-1000, 60, 1050], [-100, 110, 0]])
+    resultado = xtir_lote(fluxos, datas)
+    assert (resultado.status == CONVERGIU).all()
+    periodos = (datas - datas[0]).astype(float) / 365
+    np.testing.assert_allclose(vpl_lote(fluxos, resultado.taxa, periodos), 0, atol=1e-8)
+    # 2024 é bissexto: 366 dias até o segundo fluxo
+    assert resultado.taxa[1] == pytest.approx(1.1 ** (365 / 366) - 1, rel=1e-9)
+
+
+def test_anualizar():
+    assert anualizar(0.01) == pytest.approx(1.01 ** 12 - 1)